@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Module de contrôle d'admission des appels LLM
+Borne le nombre d'analyses envoyées simultanément au LLM avec une limite
+adaptative (AIMD): la limite augmente d'une unité par fenêtre d'appels
+réussis et diminue de façon multiplicative quand le backend sature (limite
+de débit Groq, délai dépassé, latence au-delà de la cible). Les demandes en
+surplus attendent dans une file FIFO; celles dont l'attente prévue dépasse
+leur échéance sont refusées tout de suite (503 avec Retry-After) plutôt que
+d'échouer au bout du délai.
+"""
+
+import os
+import math
+import time
+import threading
+from collections import deque
+from typing import Callable, Dict, Optional
+from dotenv import load_dotenv
+
+load_dotenv(dotenv_path='../.env')
+
+# Configuration
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+ADMISSION_INITIAL_LIMIT = float(os.getenv("ADMISSION_INITIAL_LIMIT", "4"))
+ADMISSION_MIN_LIMIT = float(os.getenv("ADMISSION_MIN_LIMIT", "1"))
+ADMISSION_MAX_LIMIT = float(os.getenv("ADMISSION_MAX_LIMIT", "16"))
+ADMISSION_BACKOFF_RATIO = float(os.getenv("ADMISSION_BACKOFF_RATIO", "0.7"))
+# Latence d'un appel LLM au-delà de laquelle le backend est considéré saturé (secondes)
+ADMISSION_LATENCY_TARGET = float(os.getenv("ADMISSION_LATENCY_TARGET", "30"))
+# Latence supposée avant la première mesure (secondes)
+ADMISSION_INITIAL_LATENCY = float(os.getenv("ADMISSION_INITIAL_LATENCY", "10"))
+# Échéance d'une analyse, depuis l'arrivée de la requête (secondes)
+ADMISSION_DEADLINE = float(os.getenv("ADMISSION_DEADLINE", "45"))
+ADMISSION_BATCH_DEADLINE = float(os.getenv("ADMISSION_BATCH_DEADLINE", "300"))
+
+LATENCY_SMOOTHING = 0.2  # Poids d'une nouvelle mesure dans la moyenne mobile exponentielle
+
+# Échecs d'appel LLM signalant une saturation du backend
+OVERLOAD_FAILURES = ("rate_limited", "timeout")
+
+
+class AdmissionRejected(Exception):
+    """Analyse refusée: attente prévue supérieure à l'échéance"""
+
+    def __init__(self, retry_after: float):
+        super().__init__("Service d'analyse saturé")
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class AdmissionController:
+    """Limite de concurrence adaptative (AIMD) avec file d'attente à échéance"""
+
+    def __init__(self, initial_limit: float, min_limit: float, max_limit: float):
+        self.limit = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.in_flight = 0
+        self.waiting = deque()
+        self.latency = ADMISSION_INITIAL_LATENCY
+        self.last_decrease = 0.0
+        self.changed = threading.Condition(threading.Lock())
+        self.stats = {"admitted": 0, "rejected": 0, "expired": 0, "overloads": 0, "decreases": 0}
+
+    def slots(self) -> int:
+        return max(1, int(self.limit))
+
+    def projected_wait(self, ahead: int) -> float:
+        """
+        Attente prévue d'une demande derrière `ahead` demandes en file
+
+        Chaque vague de `slots` demandes dure environ une latence moyenne.
+        """
+        if not ahead and self.in_flight < self.slots():
+            return 0.0
+        return (ahead // self.slots() + 1) * self.latency
+
+    def check(self, deadline: float):
+        """
+        Refuse au plus tôt une demande qui ne pourrait pas être servie à temps
+        (avant les étapes locales: extraction, anonymisation)
+
+        Raises:
+            AdmissionRejected: Si l'attente prévue dépasse l'échéance
+        """
+        with self.changed:
+            wait = self.projected_wait(len(self.waiting))
+            if time.monotonic() + wait > deadline:
+                self.stats["rejected"] += 1
+                raise AdmissionRejected(wait)
+
+    def acquire(self, deadline: float):
+        """
+        Attend une place (ordre d'arrivée) jusqu'à l'échéance
+
+        Raises:
+            AdmissionRejected: Si l'attente prévue ou effective dépasse l'échéance
+        """
+        with self.changed:
+            wait = self.projected_wait(len(self.waiting))
+            if time.monotonic() + wait > deadline:
+                self.stats["rejected"] += 1
+                raise AdmissionRejected(wait)
+
+            ticket = object()
+            self.waiting.append(ticket)
+            try:
+                while self.waiting[0] is not ticket or self.in_flight >= self.slots():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.stats["expired"] += 1
+                        raise AdmissionRejected(self.projected_wait(self.waiting.index(ticket)))
+                    self.changed.wait(remaining)
+                self.waiting.popleft()
+                self.in_flight += 1
+                self.stats["admitted"] += 1
+            except BaseException:
+                if ticket in self.waiting:
+                    self.waiting.remove(ticket)
+                raise
+            finally:
+                self.changed.notify_all()  # La demande suivante peut être en tête
+
+    def release(self, latency: float, overloaded: bool):
+        """
+        Libère une place et ajuste la limite
+
+        Args:
+            latency: Durée de l'appel LLM (secondes)
+            overloaded: Le backend a signalé une saturation
+        """
+        with self.changed:
+            self.in_flight -= 1
+            self.latency += LATENCY_SMOOTHING * (latency - self.latency)
+            now = time.monotonic()
+            if overloaded or latency > ADMISSION_LATENCY_TARGET:
+                self.stats["overloads"] += 1
+                # Une seule baisse par latence moyenne: les appels concurrents
+                # d'une même salve de saturation ne comptent qu'une fois
+                if now - self.last_decrease >= self.latency:
+                    self.limit = max(self.min_limit, self.limit * ADMISSION_BACKOFF_RATIO)
+                    self.last_decrease = now
+                    self.stats["decreases"] += 1
+            elif self.in_flight + 1 >= self.limit / 2:
+                # Hausse seulement si la limite est sollicitée: pas de dérive en charge faible
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self.changed.notify_all()
+
+    def run(self, call: Callable[[], Dict], deadline: float) -> Dict:
+        """
+        Exécute un appel LLM dans une place de la limite de concurrence
+
+        Args:
+            call: Appel LLM (retourne le résultat d'analyse, avec "failure" en cas d'échec)
+            deadline: Échéance (horloge monotonic)
+
+        Returns:
+            Résultat de l'appel
+
+        Raises:
+            AdmissionRejected: Si la demande ne peut pas être servie avant l'échéance
+        """
+        self.acquire(deadline)
+        started_at = time.perf_counter()
+        overloaded = False
+        try:
+            result = call()
+            overloaded = result.get("failure") in OVERLOAD_FAILURES
+            return result
+        finally:
+            self.release(time.perf_counter() - started_at, overloaded)
+
+    def retry_after(self) -> int:
+        """Délai conseillé à un client refusé pour cause de saturation"""
+        with self.changed:
+            return max(1, math.ceil(self.projected_wait(len(self.waiting))))
+
+    def snapshot(self) -> Dict:
+        with self.changed:
+            stats = dict(self.stats)
+            stats.update({
+                "limit": round(self.limit, 2),
+                "inFlight": self.in_flight,
+                "queued": len(self.waiting),
+                "latencyMs": int(self.latency * 1000)
+            })
+        return stats
+
+
+_controller = AdmissionController(ADMISSION_INITIAL_LIMIT, ADMISSION_MIN_LIMIT, ADMISSION_MAX_LIMIT)
+
+
+def request_deadline(batch: bool = False) -> float:
+    """Échéance d'une analyse arrivant maintenant"""
+    return time.monotonic() + (ADMISSION_BATCH_DEADLINE if batch else ADMISSION_DEADLINE)
+
+
+def check_admission(deadline: float):
+    """Refus anticipé d'une analyse qui ne serait pas servie avant l'échéance"""
+    if ADMISSION_ENABLED:
+        _controller.check(deadline)
+
+
+def run_admitted(call: Callable[[], Dict], deadline: Optional[float] = None) -> Dict:
+    """
+    Exécute un appel LLM sous contrôle d'admission
+
+    Args:
+        call: Appel LLM
+        deadline: Échéance (par défaut ADMISSION_DEADLINE à partir de maintenant)
+
+    Returns:
+        Résultat de l'appel
+    """
+    if not ADMISSION_ENABLED:
+        return call()
+    return _controller.run(call, deadline if deadline is not None else request_deadline())
+
+
+def overload_retry_after() -> int:
+    """Délai conseillé après un échec de saturation du backend LLM"""
+    return _controller.retry_after()
+
+
+def get_admission_stats() -> Dict:
+    """État du contrôle d'admission (pour /api/health)"""
+    stats = _controller.snapshot()
+    stats["enabled"] = ADMISSION_ENABLED
+    return stats
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Pipeline d'analyse d'un document PDF
+Enchaîne extraction, anonymisation, pré-synthèse extractive, appel LLM et
+ré-identification; partagé par l'upload simple et l'upload par lot
+"""
+
+from datetime import datetime
+from typing import Dict, Optional
+from bson import ObjectId
+
+from pdf_utils import extract_text_with_stats
+from pdf_preflight import inspect_pdf, ROUTE_REJECT
+from upload_utils import SpooledUpload
+from llm_summary import summarize_text, REVISION_SYSTEM_PROMPT
+from extractive_summary import extract_key_content
+from pii_anonymizer import anonymize_document_text, deanonymize_analysis, RULES_VERSION
+from pdf_utils import extraction_version
+from artifact_cache import cache_get, cache_put
+from near_duplicates import (
+    compute_signature, signature_bands, find_near_duplicate, NEAR_DUPLICATE_REUSE_THRESHOLD
+)
+from analysis_store import encode_analysis
+from admission_control import AdmissionRejected, OVERLOAD_FAILURES, run_admitted, overload_retry_after
+from document_profiles import PROFILES, CHUNKING_EXTRACTIVE, classify_document, get_profile
+from document_revisions import (
+    page_fingerprints, pack_text, load_previous_analysis, plan_revision, build_revision_prefix, REVISION_AUTO
+)
+
+
+class AnalysisError(Exception):
+    """Erreur d'une étape du pipeline, avec le code HTTP à retourner"""
+
+    def __init__(self, message: str, status_code: int = 400, code: str = None, details: Dict = None,
+                 retry_after: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.code = code
+        self.details = details
+        self.retry_after = retry_after  # En-tête Retry-After (secondes)
+
+    def to_response(self) -> Dict:
+        """Corps JSON de l'erreur (format ApiError du frontend)"""
+        body = {"error": str(self)}
+        if self.code:
+            body["code"] = self.code
+        if self.details is not None:
+            body["details"] = self.details
+        return body
+
+
+def prepare_document(file, filename: str, profile_name: Optional[str] = None) -> Dict:
+    """
+    Étapes locales (CPU) du pipeline: extraction, anonymisation, pré-synthèse
+
+    Le profil du document (facture, contrat, rapport long, note courte) fixe
+    les détecteurs PII et le découpage avant le LLM.
+
+    Args:
+        file: SpooledUpload (ou objet fichier lisible)
+        filename: Nom du document
+        profile_name: Profil imposé (sinon déduit de la première page)
+
+    Returns:
+        Document préparé pour l'appel LLM
+
+    Raises:
+        AnalysisError: Si le document est refusé à l'inspection ou si le texte ne peut pas être extrait
+    """
+    content_hash = getattr(file, "sha256", None)
+    extract_version = extraction_version()
+
+    # Texte déjà extrait pour ce contenu: inspection et extraction évitées
+    cached_extraction = cache_get("extraction", content_hash, extract_version)
+    if cached_extraction is not None:
+        text, extraction_stats = cached_extraction["text"], cached_extraction["stats"]
+    else:
+        # Inspection préalable: rejeter au plus tôt les documents voués à l'échec
+        if isinstance(file, SpooledUpload):
+            report = inspect_pdf(file)
+            if report["route"] == ROUTE_REJECT:
+                reason = report["reasons"][0]
+                raise AnalysisError(reason["message"], status_code=422, code=reason["code"], details=report)
+
+        # Extraire le texte du PDF
+        try:
+            text, extraction_stats = extract_text_with_stats(file)
+            if not text.strip():
+                raise AnalysisError("Le PDF semble vide ou le texte n'a pas pu être extrait")
+        except AnalysisError:
+            raise
+        except Exception as e:
+            raise AnalysisError(f"Erreur lors de l'extraction du texte: {str(e)}")
+        cache_put("extraction", content_hash, extract_version, {"text": text, "stats": extraction_stats})
+
+    # Profil de traitement: imposé, sinon déduit de la première page et du nombre de pages
+    profile = get_profile(profile_name) or classify_document(text, extraction_stats.get("page_count", 0))
+
+    # Anonymiser le texte avant l'analyse (conformité RGPD)
+    anonymization_version = f"{RULES_VERSION}:{extract_version}:{profile.detectors_version()}"
+    cached_anonymization = cache_get("anonymization", content_hash, anonymization_version)
+    if cached_anonymization is not None:
+        anonymized_text, anonymization_stats = cached_anonymization["text"], cached_anonymization["stats"]
+    else:
+        try:
+            anonymized_text, anonymization_stats = anonymize_document_text(
+                text, strict_mode=True, detectors=profile.detectors
+            )
+            print(f"Anonymisation PII: {anonymization_stats['total_pii_detected']} éléments détectés")
+            cache_put("anonymization", content_hash, anonymization_version,
+                      {"text": anonymized_text, "stats": anonymization_stats})
+        except Exception as e:
+            print(f"Erreur lors de l'anonymisation: {e}")
+            # En cas d'erreur d'anonymisation, utiliser le texte original
+            anonymized_text = text
+            anonymization_stats = {'total_pii_detected': 0, 'types_detected': [], 'anonymization_map': {}}
+
+    # Réduire le document à son contenu le plus représentatif avant le LLM
+    # (les documents courts ou denses sont transmis en pages entières)
+    llm_input = anonymized_text
+    if profile.chunking == CHUNKING_EXTRACTIVE:
+        try:
+            llm_input, _ = extract_key_content(anonymized_text, target_tokens=profile.extractive_target_tokens)
+        except Exception as e:
+            print(f"Erreur lors de la pré-synthèse extractive: {e}")
+
+    return {
+        "filename": filename,
+        "profile": profile.name,
+        "content_hash": content_hash,
+        "text": text,
+        "page_hashes": page_fingerprints(text),
+        "anonymized_text": anonymized_text,
+        "llm_input": llm_input,
+        "minhash": compute_signature(text),
+        "extraction_stats": extraction_stats,
+        "anonymization_map": anonymization_stats.get('anonymization_map', {})
+    }
+
+
+def reuse_previous(previous: Dict, **extra) -> Dict:
+    """Résultat repris d'une analyse précédente, sans appel LLM"""
+    result = {
+        "summary": previous.get("summary", ""),
+        "keyPoints": previous.get("keyPoints", []),
+        "actions": previous.get("actions", []),
+        "usage": {}
+    }
+    # Forme anonymisée reprise telle quelle: base d'une future révision
+    if previous.get("anonymizedAnalysis") and previous.get("anonymizationMap") is not None:
+        result["anonymized"] = {"analysis": previous["anonymizedAnalysis"], "map": previous["anonymizationMap"]}
+    result.update(extra)
+    return result
+
+
+def stored_anonymization(analysis_result: Dict, anonymization_map: Dict) -> Dict:
+    """
+    Analyse anonymisée et mapping réduit (original, type), conservés avec
+    l'analyse ré-identifiée pour construire sans fuite le prompt d'une révision
+    """
+    return {
+        "analysis": {field: analysis_result.get(field, default)
+                     for field, default in (("summary", ""), ("keyPoints", []), ("actions", []))},
+        "map": {placeholder: {"original": entity["original"], "type": entity.get("type")}
+                for placeholder, entity in anonymization_map.items()}
+    }
+
+
+def overloaded_error(retry_after: int) -> AnalysisError:
+    """Erreur 503 d'un service d'analyse saturé, à réessayer après retry_after secondes"""
+    return AnalysisError(
+        "Service d'analyse saturé, veuillez réessayer plus tard",
+        status_code=503,
+        code="overloaded",
+        details={"retryAfter": retry_after},
+        retry_after=retry_after
+    )
+
+
+def analyze_prepared(prepared: Dict, authorized: bool, db=None, user_id: Optional[str] = None,
+                     previous_analysis_id: Optional[str] = None, deadline: Optional[float] = None) -> Dict:
+    """
+    Appel LLM sur un document préparé
+
+    Si l'utilisateur a déjà analysé une version quasi identique du document,
+    cette analyse est réutilisée sans appel LLM; une similarité plus faible
+    est signalée (similarTo). Pour une révision d'un document déjà analysé
+    (previous_analysis_id, ou quasi-doublon détecté), seules les pages
+    modifiées sont envoyées au LLM avec l'analyse précédente à mettre à jour.
+
+    Args:
+        prepared: Résultat de prepare_document
+        authorized: Ré-identifier les entités (utilisateur authentifié)
+        db: Base MongoDB (recherche des quasi-doublons, optionnelle)
+        user_id: Identifiant de l'utilisateur connecté
+        previous_analysis_id: Analyse de la version précédente du document (optionnel)
+        deadline: Échéance de l'appel LLM (horloge monotonic, voir admission_control)
+
+    Returns:
+        Résultat brut du LLM (summary, keyPoints, actions, usage)
+
+    Raises:
+        AnalysisError: Si l'appel LLM échoue (503 si le service est saturé)
+    """
+    similar = None
+    if db is not None:
+        try:
+            similar = find_near_duplicate(db, prepared.get("minhash"), user_id)
+        except Exception as e:
+            print(f"Erreur lors de la recherche de quasi-doublons: {e}")
+
+    similar_to = None
+    if similar is not None:
+        similar_to = {key: similar[key] for key in ("analysisId", "fileName", "similarity")}
+        if similar["similarity"] >= NEAR_DUPLICATE_REUSE_THRESHOLD:
+            print(f"Analyse réutilisée ({similar['similarity']:.0%} similaire à {similar['analysisId']})")
+            return reuse_previous(similar["analysis"], similarTo=similar_to, reusedFrom=similar["analysisId"])
+
+    # Mode révision: analyse précédente explicite ou quasi-doublon détecté
+    previous = None
+    revision = None
+    if db is not None and user_id:
+        if not previous_analysis_id and similar is not None and REVISION_AUTO:
+            previous_analysis_id = similar["analysisId"]
+        try:
+            previous = load_previous_analysis(db, previous_analysis_id, user_id)
+            if previous is not None:
+                revision = plan_revision(prepared, previous)
+        except Exception as e:
+            print(f"Erreur lors de la préparation de la révision: {e}")
+            revision = None
+
+    if revision is not None and not revision["changed_pages"]:
+        print(f"Révision sans changement de contenu: analyse {previous['_id']} réutilisée")
+        return reuse_previous(previous, similarTo=similar_to, reusedFrom=str(previous["_id"]))
+
+    profile = get_profile(prepared.get("profile")) or PROFILES["default"]
+    anonymization_map = prepared["anonymization_map"]
+    if revision is not None:
+        print(f"Révision de l'analyse {previous['_id']}: pages modifiées {revision['changed_pages']}")
+        llm_text = revision["changes_text"]
+        # Mapping complété des entités de l'analyse précédente absentes du nouveau document
+        user_prefix, anonymization_map = build_revision_prefix(previous, revision, anonymization_map)
+        prompts = {"system_prompt": REVISION_SYSTEM_PROMPT, "user_prefix": user_prefix}
+    else:
+        llm_text = prepared["llm_input"]
+        prompts = {"user_prefix": profile.user_prefix()}
+
+    try:
+        # Appel LLM sous contrôle d'admission: file d'attente bornée par l'échéance
+        analysis_result = run_admitted(
+            lambda: summarize_text(
+                llm_text,
+                max_output_tokens=profile.max_output_tokens,
+                temperature=profile.temperature,
+                **prompts
+            ),
+            deadline
+        )
+    except AdmissionRejected as e:
+        raise overloaded_error(e.retry_after)
+    except Exception as e:
+        raise AnalysisError(f"Erreur lors de l'analyse IA: {str(e)}", status_code=500)
+
+    # Backend saturé (limite de débit, délai dépassé): 503 à réessayer plutôt qu'un résumé d'erreur
+    if analysis_result.pop("failure", None) in OVERLOAD_FAILURES:
+        raise overloaded_error(overload_retry_after())
+    if revision is not None:
+        analysis_result["revisionOf"] = str(previous["_id"])
+        analysis_result["changedPages"] = revision["changed_pages"]
+
+    # Ré-identifier les entités pour les utilisateurs authentifiés uniquement
+    if authorized:
+        anonymized = stored_anonymization(analysis_result, anonymization_map)
+        analysis_result = deanonymize_analysis(analysis_result, anonymization_map)
+        analysis_result["anonymized"] = anonymized
+    if similar_to is not None:
+        analysis_result["similarTo"] = similar_to
+    analysis_result["profile"] = profile.name
+    return analysis_result
+
+
+def format_result(analysis_result: Dict) -> Dict:
+    """Structurer la réponse selon les attentes du frontend"""
+    result = {
+        "summary": analysis_result.get("summary", ""),
+        "keyPoints": analysis_result.get("keyPoints", []),
+        "actions": analysis_result.get("actions", [])
+    }
+    if analysis_result.get("similarTo"):
+        result["similarTo"] = analysis_result["similarTo"]
+    if analysis_result.get("revisionOf"):
+        result["revisionOf"] = analysis_result["revisionOf"]
+        result["changedPages"] = analysis_result.get("changedPages", [])
+    if analysis_result.get("profile"):
+        result["profile"] = analysis_result["profile"]
+    return result
+
+
+def build_analysis_document(prepared: Dict, analysis_result: Dict, user_id: Optional[str]) -> Dict:
+    """
+    Construit le document MongoDB d'une analyse
+
+    Args:
+        prepared: Résultat de prepare_document
+        analysis_result: Résultat de analyze_prepared
+        user_id: Identifiant de l'utilisateur connecté (optionnel)
+
+    Returns:
+        Document à insérer dans db.analyses (format compact)
+    """
+    result = format_result(analysis_result)
+    signature = prepared.get("minhash")
+    doc = {
+        "filename": prepared["filename"],
+        "summary": result["summary"],
+        "keyPoints": result["keyPoints"],
+        "actions": result["actions"],
+        "uploadDate": datetime.utcnow(),
+        "originalText": prepared["text"][:1000],  # Garder juste un extrait
+        "fullText": pack_text(prepared["text"]),  # Texte complet compressé (révisions)
+        "pageHashes": prepared["page_hashes"],
+        "contentHash": prepared.get("content_hash"),
+        "profile": prepared.get("profile"),
+        "usage": analysis_result.get("usage", {}),
+        "extractionStats": prepared["extraction_stats"]
+    }
+    if signature is not None:
+        doc["minhash"] = signature
+        doc["minhashBands"] = signature_bands(signature)
+    if analysis_result.get("reusedFrom"):
+        doc["reusedFrom"] = ObjectId(analysis_result["reusedFrom"])
+    if analysis_result.get("revisionOf"):
+        doc["revisionOf"] = ObjectId(analysis_result["revisionOf"])
+        doc["changedPages"] = analysis_result.get("changedPages", [])
+    if user_id and analysis_result.get("anonymized"):
+        # Base des révisions ultérieures (stockée dans le bloc compressé)
+        doc["anonymizedAnalysis"] = analysis_result["anonymized"]["analysis"]
+        doc["anonymizationMap"] = analysis_result["anonymized"]["map"]
+
+    # Associer à l'utilisateur si connecté
+    if user_id:
+        doc["userId"] = ObjectId(user_id)
+    return encode_analysis(doc)
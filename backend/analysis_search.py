@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Module de recherche plein texte dans l'historique des analyses
+Utilise un index texte MongoDB pondéré, préfixé par l'utilisateur, et à
+défaut (base sans $text, tests) un index inversé local construit à la demande
+"""
+
+import os
+import re
+import math
+import time
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+from dotenv import load_dotenv
+
+load_dotenv(dotenv_path='../.env')
+
+# Configuration
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "auto").lower()  # auto, mongo ou local
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", "20"))
+SEARCH_MAX_PAGE_SIZE = int(os.getenv("SEARCH_MAX_PAGE_SIZE", "50"))
+SEARCH_LOCAL_CACHE_USERS = int(os.getenv("SEARCH_LOCAL_CACHE_USERS", "64"))
+# Délai avant de retenter l'index texte MongoDB après un refus (secondes)
+SEARCH_TEXT_RETRY_SECONDS = float(os.getenv("SEARCH_TEXT_RETRY_SECONDS", "300"))
+
+# Poids des champs (index MongoDB et index local)
+FIELD_WEIGHTS = {
+    "filename": 10,
+    "searchIndex.keyPoints": 5,
+    "searchIndex.actions": 3,
+    "searchIndex.summary": 2,
+}
+TEXT_INDEX_NAME = "analysis_search"
+# Pas de racinisation MongoDB: les champs indexés et la requête passent tous
+# deux par normalize_terms, une seconde racinisation (française) les
+# désaccorderait ("prix" stocké "pri", puis requête "prix" racinisée "prix")
+TEXT_INDEX_LANGUAGE = "none"
+# Codes d'erreur MongoDB signifiant que $text n'est pas utilisable sur cette base:
+# IndexNotFound (index texte requis), CommandNotSupported, opération non supportée (DocumentDB)
+TEXT_SEARCH_UNSUPPORTED_CODES = {27, 115, 303}
+# Index texte déjà présent avec d'autres options ou un autre nom: utilisé tel quel
+INDEX_CONFLICT_CODES = {85, 86}
+
+WORD_PATTERN = re.compile(r'\w+')
+STOPWORDS = {
+    "le", "la", "les", "un", "une", "des", "de", "du", "et", "ou", "en", "au", "aux", "a",
+    "ce", "ces", "cet", "cette", "est", "sont", "pour", "par", "sur", "dans", "avec", "sans",
+    "que", "qui", "se", "sa", "son", "ses", "il", "elle", "ils", "elles", "ne", "pas", "plus",
+    "the", "of", "and", "or", "to", "in", "on", "for", "is", "are", "with", "by", "an",
+}
+
+_indexes_ready = False
+_indexes_lock = threading.Lock()
+_mongo_text_retry_at = 0.0  # Horloge monotonic: recherche locale jusqu'à cette date
+_local_indexes = OrderedDict()
+_local_lock = threading.Lock()
+
+
+def plain_words(text: str) -> List[str]:
+    """
+    Découpe un texte en mots en minuscules, sans accents ni mots vides
+
+    Args:
+        text: Texte à découper
+
+    Returns:
+        Mots, dans l'ordre du texte
+    """
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return [word for word in WORD_PATTERN.findall(text) if len(word) >= 2 and word not in STOPWORDS]
+
+
+def normalize_terms(text: str) -> List[str]:
+    """
+    Découpe un texte en termes normalisés (mots de plain_words, pluriels réguliers retirés)
+
+    Args:
+        text: Texte à découper
+
+    Returns:
+        Termes, dans l'ordre du texte
+    """
+    terms = []
+    for word in plain_words(text):
+        # Racinisation minimale: pluriels réguliers
+        if len(word) > 3 and word[-1] in "sx":
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+
+def mongo_search_string(query: str) -> str:
+    """
+    Construit la chaîne $search d'une requête
+
+    Les champs searchIndex contiennent les termes de normalize_terms; le nom
+    de fichier est indexé tel quel: la requête porte donc les deux formes.
+
+    Returns:
+        Termes séparés par des espaces (chaîne vide si la requête n'en contient aucun)
+    """
+    return ' '.join(dict.fromkeys(normalize_terms(query) + plain_words(query)))
+
+
+def build_search_fields(summary: str, key_points: List[str], actions: List[str]) -> Dict[str, str]:
+    """
+    Construit les champs indexés d'une analyse (termes uniques par champ)
+
+    Le résumé complet est stocké compressé: seuls ses termes distincts restent
+    en clair pour l'index texte.
+
+    Args:
+        summary: Résumé
+        key_points: Points clés
+        actions: Actions recommandées
+
+    Returns:
+        {summary, keyPoints, actions} sous forme de termes séparés par des espaces
+    """
+    def unique_terms(text: str) -> str:
+        return ' '.join(dict.fromkeys(normalize_terms(text)))
+
+    return {
+        "summary": unique_terms(summary),
+        "keyPoints": unique_terms(' '.join(key_points)),
+        "actions": unique_terms(' '.join(actions)),
+    }
+
+
+def ensure_text_index(db):
+    """
+    Crée l'index texte pondéré (une seule fois par processus)
+
+    L'index est préfixé par userId: toute recherche $text doit filtrer sur un
+    utilisateur, ce qui borne le parcours à ses seules analyses.
+    """
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    with _indexes_lock:
+        if not _indexes_ready:
+            existing = db.analyses.index_information().get(TEXT_INDEX_NAME)
+            if existing is not None and existing.get("default_language") != TEXT_INDEX_LANGUAGE:
+                # Index créé avec la racinisation française: reconstruit sans
+                print(f"Index texte {TEXT_INDEX_NAME} reconstruit (langue {TEXT_INDEX_LANGUAGE})")
+                db.analyses.drop_index(TEXT_INDEX_NAME)
+            try:
+                db.analyses.create_index(
+                    [("userId", 1)] + [(field, "text") for field in FIELD_WEIGHTS],
+                    weights=FIELD_WEIGHTS,
+                    default_language=TEXT_INDEX_LANGUAGE,
+                    name=TEXT_INDEX_NAME
+                )
+            except OperationFailure as e:
+                if e.code not in INDEX_CONFLICT_CODES:
+                    raise
+                print(f"Index texte existant conservé: {e}")
+            _indexes_ready = True
+
+
+def search_mongo(db, user_id: ObjectId, query: str, skip: int, limit: int) -> Tuple[List[Dict], int]:
+    """
+    Recherche avec l'index texte MongoDB
+
+    Returns:
+        Tuple (documents de la page avec leur score, nombre total de résultats)
+    """
+    ensure_text_index(db)
+    search = mongo_search_string(query)
+    if not search:
+        return [], 0
+    selector = {"userId": user_id, "$text": {"$search": search}}
+    projection = {
+        "filename": 1, "uploadDate": 1, "summaryPreview": 1, "keyPointCount": 1, "actionCount": 1,
+        "storageVersion": 1, "score": {"$meta": "textScore"}
+    }
+    documents = list(
+        db.analyses.find(selector, projection)
+        .sort([("score", {"$meta": "textScore"}), ("uploadDate", -1)])
+        .skip(skip)
+        .limit(limit)
+    )
+    return documents, db.analyses.count_documents(selector)
+
+
+class LocalSearchIndex:
+    """Index inversé en mémoire des analyses d'un utilisateur (score BM25 pondéré)"""
+
+    def __init__(self):
+        self.postings = {}  # terme -> {identifiant: fréquence pondérée}
+        self.lengths = {}
+        self.upload_dates = {}
+
+    def add(self, doc_id: ObjectId, fields: Dict[str, str], upload_date=None):
+        """
+        Indexe une analyse
+
+        Args:
+            doc_id: Identifiant de l'analyse
+            fields: Texte de chaque champ de FIELD_WEIGHTS
+            upload_date: Date de l'analyse (départage des scores égaux)
+        """
+        length = 0
+        for field, weight in FIELD_WEIGHTS.items():
+            for term in normalize_terms(fields.get(field, "")):
+                postings = self.postings.setdefault(term, {})
+                postings[doc_id] = postings.get(doc_id, 0) + weight
+                length += 1
+        self.lengths[doc_id] = length
+        self.upload_dates[doc_id] = upload_date.timestamp() if upload_date else 0
+
+    def search(self, query: str) -> List[Tuple[ObjectId, float]]:
+        """
+        Classe les analyses contenant au moins un terme de la requête
+
+        Returns:
+            Liste (identifiant, score), du plus pertinent au moins pertinent
+        """
+        count = len(self.lengths)
+        if count == 0:
+            return []
+        average_length = sum(self.lengths.values()) / count or 1
+        k1, b = 1.2, 0.75
+
+        scores = {}
+        for term in dict.fromkeys(normalize_terms(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, frequency in postings.items():
+                norm = k1 * (1 - b + b * self.lengths[doc_id] / average_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (k1 + 1) / (frequency + norm)
+
+        return sorted(
+            scores.items(),
+            key=lambda item: (item[1], self.upload_dates.get(item[0], 0)),
+            reverse=True
+        )
+
+
+def get_local_index(db, user_id: ObjectId) -> LocalSearchIndex:
+    """
+    Retourne l'index local des analyses d'un utilisateur
+
+    L'index est reconstruit quand des analyses ont été ajoutées ou supprimées
+    (nombre de documents et dernier identifiant).
+    """
+    latest = db.analyses.find_one({"userId": user_id}, {"_id": 1}, sort=[("_id", -1)])
+    signature = (db.analyses.count_documents({"userId": user_id}), latest["_id"] if latest else None)
+
+    key = str(user_id)
+    with _local_lock:
+        cached = _local_indexes.get(key)
+        if cached is not None and cached[0] == signature:
+            _local_indexes.move_to_end(key)
+            return cached[1]
+
+    index = LocalSearchIndex()
+    cursor = db.analyses.find({"userId": user_id}, {
+        "filename": 1, "uploadDate": 1, "searchIndex": 1, "summary": 1, "keyPoints": 1, "actions": 1
+    })
+    for doc in cursor:
+        search_fields = doc.get("searchIndex") or build_search_fields(
+            doc.get("summary", ""), doc.get("keyPoints", []), doc.get("actions", [])
+        )
+        fields = {f"searchIndex.{name}": value for name, value in search_fields.items()}
+        fields["filename"] = doc.get("filename", "")
+        index.add(doc["_id"], fields, doc.get("uploadDate"))
+
+    with _local_lock:
+        _local_indexes[key] = (signature, index)
+        _local_indexes.move_to_end(key)
+        while len(_local_indexes) > SEARCH_LOCAL_CACHE_USERS:
+            _local_indexes.popitem(last=False)
+    return index
+
+
+def search_local(db, user_id: ObjectId, query: str, skip: int, limit: int) -> Tuple[List[Dict], int]:
+    """
+    Recherche avec l'index inversé local
+
+    Returns:
+        Tuple (documents de la page avec leur score, nombre total de résultats)
+    """
+    ranked = get_local_index(db, user_id).search(query)
+    page = ranked[skip:skip + limit]
+    if not page:
+        return [], len(ranked)
+
+    documents = {
+        doc["_id"]: doc for doc in db.analyses.find(
+            {"_id": {"$in": [doc_id for doc_id, _ in page]}, "userId": user_id},
+            {"filename": 1, "uploadDate": 1, "summaryPreview": 1, "keyPointCount": 1, "actionCount": 1,
+             "storageVersion": 1, "summary": 1, "keyPoints": 1, "actions": 1}
+        )
+    }
+    results = []
+    for doc_id, score in page:
+        if doc_id in documents:
+            documents[doc_id]["score"] = score
+            results.append(documents[doc_id])
+    return results, len(ranked)
+
+
+def search_analyses(db, user_id: str, query: str, page: int = 1, limit: Optional[int] = None) -> Dict:
+    """
+    Recherche dans les analyses d'un utilisateur
+
+    Args:
+        db: Base MongoDB
+        user_id: Identifiant de l'utilisateur (seules ses analyses sont parcourues)
+        query: Texte recherché
+        page: Numéro de page (à partir de 1)
+        limit: Résultats par page
+
+    Returns:
+        {documents, total, page, limit, backend}
+    """
+    global _mongo_text_retry_at
+    page = max(1, page)
+    limit = min(max(1, limit or SEARCH_PAGE_SIZE), SEARCH_MAX_PAGE_SIZE)
+    skip = (page - 1) * limit
+    owner = ObjectId(user_id)
+
+    use_mongo = SEARCH_BACKEND == "mongo" or (SEARCH_BACKEND == "auto" and time.monotonic() >= _mongo_text_retry_at)
+    backend = "mongo" if use_mongo else "local"
+    if backend == "mongo":
+        try:
+            documents, total = search_mongo(db, owner, query, skip, limit)
+        except (OperationFailure, NotImplementedError) as e:
+            unsupported = isinstance(e, NotImplementedError) or e.code in TEXT_SEARCH_UNSUPPORTED_CODES
+            if SEARCH_BACKEND == "mongo" or not unsupported:
+                raise  # Erreur passagère ou inattendue: pas de bascule durable
+            # Base sans support $text (mongomock, index absent): index local, nouvel essai plus tard
+            print(f"Index texte MongoDB indisponible, recherche locale pendant {SEARCH_TEXT_RETRY_SECONDS:.0f} s: {e}")
+            _mongo_text_retry_at = time.monotonic() + SEARCH_TEXT_RETRY_SECONDS
+            backend = "local"
+    if backend == "local":
+        documents, total = search_local(db, owner, query, skip, limit)
+
+    return {"documents": documents, "total": total, "page": page, "limit": limit, "backend": backend}
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Module de stockage compact des analyses
+Regroupe les champs texte volumineux d'une analyse (résumé, points clés,
+actions, extrait du texte original) dans un bloc compressé, ne laisse en clair
+que les champs nécessaires à la liste de l'historique et fournit les
+projections des vues liste et détail
+"""
+
+import os
+import json
+import threading
+from typing import Dict, Optional
+from bson import Binary
+from dotenv import load_dotenv
+
+from artifact_cache import compress, decompress
+from analysis_search import build_search_fields
+
+load_dotenv(dotenv_path='../.env')
+
+# Configuration
+STORAGE_COMPRESSION_ENABLED = os.getenv("STORAGE_COMPRESSION_ENABLED", "true").lower() == "true"
+SUMMARY_PREVIEW_CHARS = int(os.getenv("SUMMARY_PREVIEW_CHARS", "240"))
+
+STORAGE_VERSION = 2
+PAYLOAD_FIELDS = ("summary", "keyPoints", "actions", "originalText", "anonymizedAnalysis", "anonymizationMap")
+
+# Vue liste: quelques centaines d'octets par analyse. Les champs en clair des
+# analyses au format précédent sont inclus pour pouvoir les convertir à la lecture.
+LIST_PROJECTION = {
+    "filename": 1, "uploadDate": 1, "summaryPreview": 1, "keyPointCount": 1, "actionCount": 1,
+    "storageVersion": 1, "summary": 1, "keyPoints": 1, "actions": 1
+}
+# Vue détail: tout sauf les données internes (texte complet, signatures)
+DETAIL_PROJECTION = {"fullText": 0, "minhash": 0, "minhashBands": 0, "pageHashes": 0, "searchIndex": 0}
+
+_indexes_ready = False
+_indexes_lock = threading.Lock()
+
+
+def make_preview(summary: str) -> str:
+    """Début du résumé, coupé sur un mot"""
+    if len(summary) <= SUMMARY_PREVIEW_CHARS:
+        return summary
+    return summary[:SUMMARY_PREVIEW_CHARS].rsplit(' ', 1)[0] + '…'
+
+
+def encode_analysis(doc: Dict) -> Dict:
+    """
+    Convertit un document d'analyse au format de stockage compact
+
+    Args:
+        doc: Document avec les champs summary, keyPoints, actions, originalText en clair
+
+    Returns:
+        Le même document, champs volumineux regroupés dans "payload"
+    """
+    summary = doc.get("summary", "")
+    doc["summaryPreview"] = make_preview(summary)
+    doc["keyPointCount"] = len(doc.get("keyPoints", []))
+    doc["actionCount"] = len(doc.get("actions", []))
+    doc["searchIndex"] = build_search_fields(summary, doc.get("keyPoints", []), doc.get("actions", []))
+    doc["storageVersion"] = STORAGE_VERSION
+    if not STORAGE_COMPRESSION_ENABLED:
+        return doc
+
+    payload = {field: doc.pop(field) for field in PAYLOAD_FIELDS if field in doc}
+    doc["payload"] = Binary(compress(json.dumps(payload, ensure_ascii=False).encode("utf-8")))
+    return doc
+
+
+def decode_analysis(doc: Optional[Dict]) -> Optional[Dict]:
+    """
+    Restitue les champs en clair d'un document lu en base (tous formats)
+
+    Args:
+        doc: Document MongoDB (la projection doit inclure "payload")
+
+    Returns:
+        Le même document, champs du bloc compressé réintégrés
+    """
+    if doc is None:
+        return None
+    blob = doc.pop("payload", None)
+    if blob is not None:
+        doc.update(json.loads(decompress(bytes(blob))))
+    return doc
+
+
+def list_item(db, doc: Dict) -> Dict:
+    """
+    Formate une analyse pour la vue liste de l'historique
+
+    Une analyse au format précédent est convertie au format compact lors de
+    sa première lecture.
+
+    Args:
+        db: Base MongoDB
+        doc: Document lu avec LIST_PROJECTION
+
+    Returns:
+        {id, fileName, uploadDate, summary, keyPointCount, actionCount}
+    """
+    if doc.get("storageVersion") != STORAGE_VERSION:
+        doc = upgrade_analysis(db, doc["_id"]) or doc
+        doc.setdefault("summaryPreview", make_preview(doc.get("summary", "")))
+        doc.setdefault("keyPointCount", len(doc.get("keyPoints", [])))
+        doc.setdefault("actionCount", len(doc.get("actions", [])))
+
+    return {
+        "id": doc["_id"],
+        "fileName": doc.get("filename", ""),
+        "uploadDate": doc.get("uploadDate") or "",
+        "summary": doc.get("summaryPreview", ""),
+        "keyPointCount": doc.get("keyPointCount", 0),
+        "actionCount": doc.get("actionCount", 0)
+    }
+
+
+def upgrade_analysis(db, analysis_id) -> Optional[Dict]:
+    """
+    Réécrit une analyse au format précédent dans le format compact
+
+    Args:
+        db: Base MongoDB
+        analysis_id: Identifiant de l'analyse
+
+    Returns:
+        Champs de la vue liste après conversion, ou None en cas d'erreur
+    """
+    try:
+        legacy = db.analyses.find_one({"_id": analysis_id}, {field: 1 for field in PAYLOAD_FIELDS})
+        if legacy is None:
+            return None
+        encoded = encode_analysis({field: legacy[field] for field in PAYLOAD_FIELDS if field in legacy})
+        update = {"$set": encoded}
+        removed = [field for field in PAYLOAD_FIELDS if field in legacy and field not in encoded]
+        if removed:
+            update["$unset"] = {field: "" for field in removed}
+        db.analyses.update_one({"_id": analysis_id}, update)
+        return db.analyses.find_one({"_id": analysis_id}, LIST_PROJECTION)
+    except Exception as e:
+        print(f"Erreur lors de la conversion de l'analyse {analysis_id}: {e}")
+        return None
+
+
+def ensure_indexes(db):
+    """Crée l'index de l'historique par utilisateur et date (une seule fois par processus)"""
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    with _indexes_lock:
+        if not _indexes_ready:
+            db.analyses.create_index([("userId", 1), ("uploadDate", -1)], name="history")
+            _indexes_ready = True
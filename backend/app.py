@@ -1,43 +1,103 @@
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, Response, stream_with_context
 from flask_cors import CORS
-from pymongo import MongoClient
+from werkzeug.exceptions import RequestEntityTooLarge
 from dotenv import load_dotenv
 import os
 from datetime import datetime
 from bson import ObjectId
-import json
+import logging
 
 # Import des modules locaux
-from pdf_utils import extract_text_from_pdf
-from llm_summary import summarize_text
-from pii_anonymizer import anonymize_document_text
-from auth import create_user, authenticate_user, generate_token, token_required
+from analysis_pipeline import (
+    AnalysisError, prepare_document, analyze_prepared, format_result, build_analysis_document, overloaded_error
+)
+from batch_processing import iter_batch_entries, run_batch, to_ndjson, BATCH_MAX_FILES
+from upload_utils import spool_upload, UploadTooLarge, MAX_REQUEST_BYTES
+from analysis_store import (
+    LIST_PROJECTION, DETAIL_PROJECTION, decode_analysis, list_item, ensure_indexes
+)
+from analysis_search import search_analyses
+from database import db, for_operation, get_pool_stats, MONGO_URI
+from persistence import save_analyses, get_persistence_stats
+from llm_summary import prewarm_local_model
+from auth import create_user, authenticate_user, generate_token, token_required, verify_token
+from rate_limit import rate_limited, client_key, get_rate_limit_settings
+from json_provider import FastJSONProvider
+from response_compression import compressed
+from document_profiles import PROFILES, get_profile
+from admission_control import AdmissionRejected, request_deadline, check_admission, get_admission_stats
+from lazy_imports import get_load_times
+from history_cache import (
+    HISTORY_CACHE_ENABLED, get_history_cache, get_detail_cache, history_key, detail_etag, get_history_cache_stats
+)
 
 load_dotenv(dotenv_path='../.env')
 
+# Configuration du logging (point d'entrée de l'application)
+logging.basicConfig(level=logging.INFO)
+
 app = Flask(__name__)
 CORS(app)
 
-# Configuration MongoDB
-mongo_uri = os.getenv("MONGO_URI", "mongodb://localhost:27017")
-client = MongoClient(mongo_uri)
-db = client.apocal_db
+# Taille maximale d'une requête: rejet dès l'en-tête Content-Length
+app.config['MAX_CONTENT_LENGTH'] = MAX_REQUEST_BYTES
+
+# Sérialisation JSON rapide (ObjectId et datetime gérés nativement)
+app.json = FastJSONProvider(app)
+
+# Détail d'une analyse: immuable, conservé par le navigateur (cache privé: réponse propre à l'utilisateur)
+DETAIL_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+def get_optional_token_payload():
+    """Décoder le token JWT s'il est présent et valide, sinon None"""
+    auth_header = request.headers.get('Authorization')
+    if auth_header and auth_header.startswith('Bearer '):
+        try:
+            return verify_token(auth_header.split(" ")[1])
+        except:
+            pass  # Si le token est invalide, on traite la requête en anonyme
+    return None
+
+def analysis_error_response(error):
+    """Réponse d'une erreur du pipeline (Retry-After pour un service saturé)"""
+    response = jsonify(error.to_response())
+    response.status_code = error.status_code
+    if error.retry_after is not None:
+        response.headers['Retry-After'] = str(error.retry_after)
+    return response
 
-class JSONEncoder(json.JSONEncoder):
-    def default(self, o):
-        if isinstance(o, ObjectId):
-            return str(o)
-        return json.JSONEncoder.default(self, o)
+def matching_etag(etag):
+    """Retourner l'ETag de If-None-Match correspondant à etag (variantes compressées comprises), sinon None"""
+    if request.if_none_match.star_tag:
+        return etag
+    for tag in request.if_none_match.as_set():
+        if tag == etag or tag.startswith(etag + "-"):
+            return tag
+    return None
 
-app.json_encoder = JSONEncoder
+def not_modified(etag, cache_control):
+    """Réponse 304 pour une représentation déjà détenue par le client"""
+    response = Response(status=304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    response.vary.add("Accept-Encoding")
+    return response
+
+@app.errorhandler(413)
+def request_too_large(e):
+    return jsonify({"error": f"Requête trop volumineuse (maximum {MAX_REQUEST_BYTES // (1024 * 1024)} Mo)"}), 413
 
 # Route de test pour vérifier que l'API fonctionne
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    return jsonify({"status": "ok", "message": "API fonctionne correctement"})
+    return jsonify({"status": "ok", "message": "API fonctionne correctement", "database": get_pool_stats(),
+                    "persistence": get_persistence_stats(), "rateLimits": get_rate_limit_settings(),
+                    "historyCache": get_history_cache_stats(), "admission": get_admission_stats(),
+                    "lazyImports": get_load_times()})
 
 # Routes d'authentification
 @app.route('/api/auth/register', methods=['POST'])
+@rate_limited('auth')
 def register():
     try:
         data = request.get_json()
@@ -69,11 +129,11 @@ def register():
         # Formater la réponse
         response_data = {
             "user": {
-                "id": str(user_data['_id']),
+                "id": user_data['_id'],
                 "email": user_data['email'],
                 "firstName": user_data['firstName'],
                 "lastName": user_data['lastName'],
-                "createdAt": user_data['createdAt'].isoformat()
+                "createdAt": user_data['createdAt']
             },
             "token": token
         }
@@ -84,6 +144,7 @@ def register():
         return jsonify({"error": str(e)}), 400
 
 @app.route('/api/auth/login', methods=['POST'])
+@rate_limited('auth')
 def login():
     try:
         data = request.get_json()
@@ -108,7 +169,7 @@ def login():
                 "email": user_data['email'],
                 "firstName": user_data['firstName'],
                 "lastName": user_data['lastName'],
-                "createdAt": user_data['createdAt'].isoformat()
+                "createdAt": user_data['createdAt']
             },
             "token": token
         }
@@ -132,11 +193,11 @@ def verify_token_route():
             return jsonify({"error": "Utilisateur non trouvé"}), 404
         
         response_data = {
-            "id": str(user_data['_id']),
+            "id": user_data['_id'],
             "email": user_data['email'],
             "firstName": user_data['firstName'],
             "lastName": user_data['lastName'],
-            "createdAt": user_data['createdAt'].isoformat()
+            "createdAt": user_data['createdAt']
         }
         
         return jsonify(response_data)
@@ -164,7 +225,7 @@ def update_profile():
             return jsonify({"error": "Aucune donnée à mettre à jour"}), 400
         
         # Mettre à jour dans la base
-        result = db.users.update_one(
+        result = for_operation(db.users, 'user_write').update_one(
             {'_id': ObjectId(user['id'])},
             {'$set': update_data}
         )
@@ -176,11 +237,11 @@ def update_profile():
         updated_user = db.users.find_one({'_id': ObjectId(user['id'])})
         
         response_data = {
-            "id": str(updated_user['_id']),
+            "id": updated_user['_id'],
             "email": updated_user['email'],
             "firstName": updated_user['firstName'],
             "lastName": updated_user['lastName'],
-            "createdAt": updated_user['createdAt'].isoformat()
+            "createdAt": updated_user['createdAt']
         }
         
         return jsonify(response_data)
@@ -190,7 +251,10 @@ def update_profile():
 
 # Route pour upload et analyse de PDF
 @app.route('/api/analysis/upload', methods=['POST'])
+@rate_limited('upload')
 def upload_and_analyze():
+    # Échéance de l'analyse, à partir de l'arrivée de la requête
+    deadline = request_deadline()
     try:
         if 'file' not in request.files:
             return jsonify({"error": "Aucun fichier fourni"}), 400
@@ -203,115 +267,219 @@ def upload_and_analyze():
         if not file.filename.lower().endswith('.pdf'):
             return jsonify({"error": "Seuls les fichiers PDF sont acceptés"}), 400
 
-        # Extraire le texte du PDF
-        try:
-            text = extract_text_from_pdf(file)
-            if not text.strip():
-                return jsonify({"error": "Le PDF semble vide ou le texte n'a pas pu être extrait"}), 400
-        except Exception as e:
-            return jsonify({"error": f"Erreur lors de l'extraction du texte: {str(e)}"}), 400
+        # Type de document imposé par le client (sinon déduit de la première page)
+        profile_name = request.form.get('profile') or None
+        if profile_name and get_profile(profile_name) is None:
+            return jsonify({"error": f"Profil inconnu (profils disponibles: {', '.join(PROFILES)})"}), 400
 
-        # Anonymiser le texte avant l'analyse (conformité RGPD)
-        try:
-            anonymized_text, anonymization_stats = anonymize_document_text(text, strict_mode=True)
-            print(f"Anonymisation PII: {anonymization_stats['total_pii_detected']} éléments détectés")
-        except Exception as e:
-            print(f"Erreur lors de l'anonymisation: {e}")
-            # En cas d'erreur d'anonymisation, utiliser le texte original
-            anonymized_text = text
-            anonymization_stats = {'total_pii_detected': 0, 'types_detected': []}
-        
-        # Analyser le texte anonymisé avec l'IA
+        # Identifier l'utilisateur connecté (token optionnel)
+        payload = get_optional_token_payload()
+
+        # Extraction, anonymisation, pré-synthèse puis analyse IA
         try:
-            analysis_result = summarize_text(anonymized_text)
-        except Exception as e:
-            return jsonify({"error": f"Erreur lors de l'analyse IA: {str(e)}"}), 500
+            # Refus immédiat si la file d'attente du LLM dépasse déjà l'échéance
+            check_admission(deadline)
+            # Copie par blocs avec limite de taille et empreinte SHA-256
+            with spool_upload(file, file.filename) as upload:
+                prepared = prepare_document(upload, file.filename, profile_name)
+            analysis_result = analyze_prepared(
+                prepared,
+                authorized=payload is not None,
+                db=db,
+                user_id=payload['user_id'] if payload else None,
+                previous_analysis_id=request.form.get('previousAnalysisId'),
+                deadline=deadline
+            )
+        except AdmissionRejected as e:
+            return analysis_error_response(overloaded_error(e.retry_after))
+        except UploadTooLarge as e:
+            return jsonify({"error": str(e)}), 413
+        except AnalysisError as e:
+            return analysis_error_response(e)
 
         # Structurer la réponse selon les attentes du frontend
-        result = {
-            "summary": analysis_result.get("summary", ""),
-            "keyPoints": analysis_result.get("keyPoints", []),
-            "actions": analysis_result.get("actions", [])
-        }
+        result = format_result(analysis_result)
 
-        # Sauvegarder dans MongoDB
+        # Sauvegarder dans MongoDB (écriture différée: la réponse n'attend pas la base)
         try:
-            doc = {
-                "filename": file.filename,
-                "summary": result["summary"],
-                "keyPoints": result["keyPoints"],
-                "actions": result["actions"],
-                "uploadDate": datetime.utcnow(),
-                "originalText": text[:1000]  # Garder juste un extrait
-            }
-            
-            # Associer à l'utilisateur si connecté
-            auth_header = request.headers.get('Authorization')
-            if auth_header and auth_header.startswith('Bearer '):
-                try:
-                    from auth import verify_token
-                    token = auth_header.split(" ")[1]
-                    payload = verify_token(token)
-                    doc["userId"] = ObjectId(payload['user_id'])
-                except:
-                    pass  # Si le token est invalide, on sauvegarde sans utilisateur
-            
-            db.analyses.insert_one(doc)
+            save_analyses([build_analysis_document(prepared, analysis_result, payload['user_id'] if payload else None)])
         except Exception as e:
             print(f"Erreur lors de la sauvegarde: {e}")
             # On continue même si la sauvegarde échoue
 
         return jsonify(result)
 
+    except RequestEntityTooLarge:
+        raise  # Traité par le gestionnaire d'erreur 413
     except Exception as e:
         print(f"Erreur générale: {e}")
         return jsonify({"error": "Une erreur interne est survenue"}), 500
 
+# Route pour l'analyse par lot (plusieurs PDF ou archive ZIP)
+@app.route('/api/analysis/batch', methods=['POST'])
+@rate_limited('upload')
+@compressed
+def batch_upload_and_analyze():
+    try:
+        files = request.files.getlist('files')
+        archive = request.files.get('archive')
+        
+        if not files and archive is None:
+            return jsonify({"error": "Aucun fichier fourni"}), 400
+        
+        if archive is not None and not archive.filename.lower().endswith('.zip'):
+            return jsonify({"error": "L'archive doit être au format ZIP"}), 400
+        
+        if len(files) > BATCH_MAX_FILES:
+            return jsonify({"error": f"Maximum {BATCH_MAX_FILES} fichiers par lot"}), 400
+        
+        # Lot refusé d'emblée si la file d'attente du LLM dépasse l'échéance d'un lot
+        try:
+            check_admission(request_deadline(batch=True))
+        except AdmissionRejected as e:
+            return analysis_error_response(overloaded_error(e.retry_after))
+
+        payload = get_optional_token_payload()
+        events = run_batch(
+            iter_batch_entries(files, archive),
+            db,
+            authorized=payload is not None,
+            user_id=payload['user_id'] if payload else None,
+            rate_limit_key=client_key()  # Un jeton "upload" par document, le premier pris par @rate_limited
+        )
+        
+        # Progression diffusée document par document (JSON délimité par lignes)
+        return Response(stream_with_context(to_ndjson(events)), mimetype='application/x-ndjson')
+    
+    except RequestEntityTooLarge:
+        raise  # Traité par le gestionnaire d'erreur 413
+    except Exception as e:
+        print(f"Erreur générale (lot): {e}")
+        return jsonify({"error": "Une erreur interne est survenue"}), 500
+
 # Route pour récupérer l'historique des analyses
 @app.route('/api/analysis/history', methods=['GET'])
+@rate_limited('history')
+@compressed
 def get_analysis_history():
     try:
-        # Vérifier si l'utilisateur est connecté
-        auth_header = request.headers.get('Authorization')
-        user_id = None
-        
-        if auth_header and auth_header.startswith('Bearer '):
-            try:
-                from auth import verify_token
-                token = auth_header.split(" ")[1]
-                payload = verify_token(token)
-                user_id = ObjectId(payload['user_id'])
-            except:
-                pass  # Token invalide, on récupère l'historique public
+        # Vérifier si l'utilisateur est connecté (token invalide: historique public)
+        payload = get_optional_token_payload()
         
         # Construire la requête
         query = {}
-        if user_id:
-            query["userId"] = user_id
-        
-        # Récupérer les analyses
-        analyses = list(db.analyses.find(query, {
-            'originalText': 0  # Exclure le texte original pour alléger la réponse
-        }).sort('uploadDate', -1).limit(20))
-        
-        # Formatter pour le frontend (correspondance exacte avec AnalysisHistory)
-        formatted_analyses = []
-        for analysis in analyses:
-            formatted_analyses.append({
-                "id": str(analysis["_id"]),
-                "fileName": analysis["filename"],
-                "uploadDate": analysis["uploadDate"].isoformat() if analysis.get("uploadDate") else "",
-                "summary": analysis["summary"],
-                "keyPoints": analysis["keyPoints"],
-                "actions": analysis["actions"]
-            })
-        
-        return jsonify(formatted_analyses)
+        if payload:
+            query["userId"] = ObjectId(payload['user_id'])
+        
+        def load_history():
+            # Récupérer les analyses (vue liste: aperçu du résumé, le détail est chargé à la demande)
+            analyses = list(for_operation(db.analyses, 'analysis_read').find(query, LIST_PROJECTION).sort('uploadDate', -1).limit(20))
+            # Formatter pour le frontend (correspondance exacte avec AnalysisHistory)
+            return [list_item(db, analysis) for analysis in analyses]
+        
+        ensure_indexes(db)
+        if not HISTORY_CACHE_ENABLED:
+            return jsonify(load_history())
+        
+        # Historique inchangé depuis la dernière lecture du client: 304 sans requête MongoDB
+        cache = get_history_cache()
+        key = history_key(payload['user_id'] if payload else None)
+        matched = matching_etag(cache.etag(db, key))
+        if matched:
+            cache.record_not_modified()
+            return not_modified(matched, "private, no-cache")
+        
+        etag, formatted_analyses = cache.get_body(db, key, load_history)
+        response = jsonify(formatted_analyses)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = "private, no-cache"  # Revalidation à chaque ouverture
+        return response
     except Exception as e:
         print(f"Erreur lors de la récupération de l'historique: {e}")
         return jsonify([])
 
+@app.route('/api/analysis/search', methods=['GET'])
+@rate_limited('history')
+@compressed
+@token_required
+def search_analysis_history():
+    """Rechercher dans les analyses de l'utilisateur connecté (résultats classés et paginés)"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "Paramètre de recherche 'q' requis"}), 400
+    try:
+        page = int(request.args.get('page', 1))
+        limit = int(request.args['limit']) if 'limit' in request.args else None
+    except ValueError:
+        return jsonify({"error": "Paramètres de pagination invalides"}), 400
+
+    try:
+        found = search_analyses(db, request.current_user['id'], query, page, limit)
+        results = []
+        for document in found["documents"]:
+            item = list_item(db, document)
+            item["score"] = round(document.get("score", 0.0), 4)
+            results.append(item)
+
+        return jsonify({
+            "results": results,
+            "total": found["total"],
+            "page": found["page"],
+            "limit": found["limit"]
+        })
+    except Exception as e:
+        print(f"Erreur lors de la recherche: {e}")
+        return jsonify({"error": "Erreur lors de la recherche"}), 500
+
+@app.route('/api/analysis/<analysis_id>', methods=['GET'])
+@rate_limited('history')
+def get_analysis_detail(analysis_id):
+    try:
+        if not ObjectId.is_valid(analysis_id):
+            return jsonify({"error": "Analyse introuvable"}), 404
+
+        cached = get_detail_cache().get(analysis_id)
+        if cached is None:
+            analysis = decode_analysis(db.analyses.find_one({"_id": ObjectId(analysis_id)}, DETAIL_PROJECTION))
+            if analysis is None:
+                return jsonify({"error": "Analyse introuvable"}), 404
+
+            result = format_result(analysis)
+            result.update({
+                "id": analysis["_id"],
+                "fileName": analysis.get("filename", ""),
+                "uploadDate": analysis.get("uploadDate") or ""
+            })
+            cached = (str(analysis["userId"]) if analysis.get("userId") else None, result)
+            get_detail_cache().put(analysis_id, *cached)
+
+        # Une analyse rattachée à un compte n'est visible que de son propriétaire,
+        # y compris pour une requête conditionnelle (pas de sonde d'existence par ETag)
+        owner_id, result = cached
+        if owner_id:
+            payload = get_optional_token_payload()
+            if not payload or owner_id != payload['user_id']:
+                return jsonify({"error": "Analyse introuvable"}), 404
+
+        # Une analyse ne change plus après son insertion: l'ETag ne dépend que de l'identifiant
+        etag = detail_etag(analysis_id)
+        matched = matching_etag(etag)
+        if matched:
+            return not_modified(matched, DETAIL_CACHE_CONTROL)
+
+        response = jsonify(result)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = DETAIL_CACHE_CONTROL
+        return response
+    except Exception as e:
+        print(f"Erreur lors de la récupération de l'analyse: {e}")
+        return jsonify({"error": "Erreur lors de la récupération de l'analyse"}), 500
+
 if __name__ == '__main__':
     print("🚀 Démarrage du serveur backend APOCALIPSSI...")
-    print(f"🔗 MongoDB URI: {mongo_uri}")
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    print(f"🔗 MongoDB URI: {MONGO_URI}")
+    # Modèle local chargé et maintenu en mémoire dès le démarrage. Ici et non au
+    # niveau du module: les processus OCR (spawn) ré-importent ce script sous le
+    # nom __mp_main__ et ne doivent lancer aucun service d'arrière-plan
+    prewarm_local_model()
+    app.run(debug=True, host='0.0.0.0', port=int(os.getenv("PORT", "5000")))
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Module de cache des artefacts intermédiaires
+Conserve sur disque, compressés, le texte extrait et le texte anonymisé d'un
+document, indexés par empreinte du contenu et version des règles, avec une
+éviction LRU bornée en taille
+"""
+
+import os
+import json
+import zlib
+import hashlib
+import tempfile
+import threading
+from typing import Dict, Optional
+from dotenv import load_dotenv
+
+load_dotenv(dotenv_path='../.env')
+
+try:
+    import zstandard
+    _zstd_compressor = zstandard.ZstdCompressor(level=6)
+    _zstd_decompressor = zstandard.ZstdDecompressor()
+except ImportError:
+    zstandard = None
+
+# Configuration
+ARTIFACT_CACHE_ENABLED = os.getenv("ARTIFACT_CACHE_ENABLED", "true").lower() == "true"
+ARTIFACT_CACHE_DIR = os.getenv(
+    "ARTIFACT_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "artifacts")
+)
+ARTIFACT_CACHE_MAX_BYTES = int(float(os.getenv("ARTIFACT_CACHE_MAX_MB", "512")) * 1024 * 1024)
+
+# Préfixes d'en-tête identifiant l'algorithme de compression
+ZSTD_MAGIC = b"Z"
+ZLIB_MAGIC = b"z"
+
+
+def compress(data: bytes) -> bytes:
+    """Compresse avec zstd si disponible, zlib sinon"""
+    if zstandard is not None:
+        return ZSTD_MAGIC + _zstd_compressor.compress(data)
+    return ZLIB_MAGIC + zlib.compress(data, 6)
+
+
+def decompress(blob: bytes) -> bytes:
+    """Décompresse un artefact selon son en-tête"""
+    if blob[:1] == ZSTD_MAGIC:
+        if zstandard is None:
+            raise ValueError("Artefact zstd illisible sans le module zstandard")
+        return _zstd_decompressor.decompress(blob[1:])
+    return zlib.decompress(blob[1:])
+
+
+class DiskArtifactCache:
+    """Cache disque compressé avec éviction LRU (date d'accès des fichiers)"""
+
+    def __init__(self, directory: str, max_bytes: int):
+        """
+        Initialise le cache
+
+        Args:
+            directory: Répertoire du cache
+            max_bytes: Taille totale maximale
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        self.total_bytes = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(key.encode("utf-8")).hexdigest() + ".bin")
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        Lit un artefact
+
+        Args:
+            key: Clé de l'artefact
+
+        Returns:
+            Artefact décodé, ou None si absent ou illisible
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                blob = f.read()
+            os.utime(path)  # Marque l'entrée comme récemment utilisée
+            return json.loads(decompress(blob))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Artefact de cache illisible ({key}): {e}")
+            return None
+
+    def put(self, key: str, value: Dict):
+        """
+        Enregistre un artefact (écriture atomique)
+
+        Args:
+            key: Clé de l'artefact
+            value: Données sérialisables en JSON
+        """
+        blob = compress(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+        path = self._path(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(blob)
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        with self.lock:
+            self.total_bytes += len(blob) - previous
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Supprime les entrées les moins récemment utilisées jusqu'à 90% de la limite"""
+        entries = sorted(
+            (entry for entry in os.scandir(self.directory) if entry.name.endswith(".bin")),
+            key=lambda entry: entry.stat().st_mtime
+        )
+        target = int(self.max_bytes * 0.9)
+        total = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if total <= target:
+                break
+            try:
+                size = entry.stat().st_size
+                os.unlink(entry.path)
+                total -= size
+            except OSError:
+                pass
+        self.total_bytes = total
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_artifact_cache() -> Optional[DiskArtifactCache]:
+    """Retourne le cache partagé (None si désactivé ou inutilisable)"""
+    global _cache
+    if not ARTIFACT_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = DiskArtifactCache(ARTIFACT_CACHE_DIR, ARTIFACT_CACHE_MAX_BYTES)
+            except OSError as e:
+                print(f"Cache d'artefacts indisponible: {e}")
+                return None
+        return _cache
+
+
+def cache_get(kind: str, content_hash: Optional[str], version: str) -> Optional[Dict]:
+    """
+    Lit un artefact intermédiaire d'un document
+
+    Args:
+        kind: Type d'artefact ("extraction", "anonymization")
+        content_hash: Empreinte SHA-256 du document
+        version: Version des règles ayant produit l'artefact
+
+    Returns:
+        Artefact, ou None
+    """
+    cache = get_artifact_cache()
+    if cache is None or not content_hash:
+        return None
+    return cache.get(f"{kind}:{version}:{content_hash}")
+
+
+def cache_put(kind: str, content_hash: Optional[str], version: str, value: Dict):
+    """Enregistre un artefact intermédiaire d'un document (erreurs ignorées)"""
+    cache = get_artifact_cache()
+    if cache is None or not content_hash:
+        return
+    try:
+        cache.put(f"{kind}:{version}:{content_hash}", value)
+    except Exception as e:
+        print(f"Erreur d'écriture du cache d'artefacts: {e}")
@@ -7,6 +7,8 @@ from flask import request, jsonify, current_app
 from bson import ObjectId
 from dotenv import load_dotenv
 
+from database import db, for_operation
+
 load_dotenv(dotenv_path='../.env')
 
 # Configuration JWT
@@ -67,8 +69,7 @@ def token_required(f):
             current_user_id = payload['user_id']
             
             # Récupérer l'utilisateur depuis la base de données
-            from app import db
-            user = db.users.find_one({'_id': ObjectId(current_user_id)})
+            user = for_operation(db.users, 'user_read').find_one({'_id': ObjectId(current_user_id)})
             
             if not user:
                 return jsonify({'message': 'Utilisateur non trouvé'}), 401
@@ -91,7 +92,7 @@ def token_required(f):
 def create_user(email: str, password: str, firstName: str, lastName: str, db):
     """Créer un nouvel utilisateur"""
     # Vérifier si l'email existe déjà
-    existing_user = db.users.find_one({'email': email})
+    existing_user = for_operation(db.users, 'user_read').find_one({'email': email})
     if existing_user:
         raise Exception("Un utilisateur avec cet email existe déjà")
     
@@ -107,7 +108,8 @@ def create_user(email: str, password: str, firstName: str, lastName: str, db):
         'createdAt': datetime.utcnow()
     }
     
-    result = db.users.insert_one(user_data)
+    # Écriture confirmée par la majorité des nœuds du replica set
+    result = for_operation(db.users, 'user_write').insert_one(user_data)
     
     # Retourner l'utilisateur sans le mot de passe
     user_data['_id'] = result.inserted_id
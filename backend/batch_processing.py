@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Module de traitement par lot
+Analyse plusieurs PDF (fichiers multiples ou archive ZIP) avec un pool de
+workers pour les étapes locales et une concurrence LLM bornée
+"""
+
+import os
+import zlib
+import zipfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Iterator, List, Optional, Tuple
+from dotenv import load_dotenv
+
+from analysis_pipeline import (
+    AnalysisError, prepare_document, analyze_prepared, format_result, build_analysis_document
+)
+from upload_utils import SpooledUpload, UploadTooLarge, spool_upload, MAX_UPLOAD_BYTES
+from persistence import save_analyses
+from json_provider import dumps_bytes
+from admission_control import request_deadline
+from rate_limit import charge_rate_limit, rate_limit_error
+
+load_dotenv(dotenv_path='../.env')
+
+# Configuration
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "100"))
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "4"))
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "2"))
+BATCH_MAX_ENTRY_BYTES = int(os.getenv("BATCH_MAX_ENTRY_BYTES", str(MAX_UPLOAD_BYTES)))
+
+# Erreurs de lecture d'une entrée d'archive: chiffrement (RuntimeError), méthode de
+# compression non supportée, données compressées corrompues, CRC invalide
+ZIP_ENTRY_ERRORS = (zipfile.BadZipFile, RuntimeError, NotImplementedError, zlib.error, OSError)
+
+# Limite globale des appels LLM simultanés, partagée par tous les lots du worker
+llm_semaphore = threading.BoundedSemaphore(BATCH_LLM_CONCURRENCY)
+
+
+def iter_zip_entries(archive) -> Iterator[Tuple[str, Optional[SpooledUpload], Optional[str]]]:
+    """
+    Parcourt les PDF d'une archive ZIP sans extraire l'archive
+
+    Args:
+        archive: Flux lisible et positionnable de l'archive
+
+    Yields:
+        Tuples (nom, document, erreur)
+    """
+    with zipfile.ZipFile(archive) as zf:
+        for info in zf.infolist():
+            name = info.filename
+            if info.is_dir() or name.startswith('__MACOSX/') or not name.lower().endswith('.pdf'):
+                continue
+            if info.file_size > BATCH_MAX_ENTRY_BYTES:
+                yield name, None, "Fichier trop volumineux dans l'archive"
+                continue  # Taille déclarée vérifiée avant toute décompression
+            try:
+                # Entrée décompressée en mémoire jusqu'au seuil d'upload, sur disque
+                # au-delà: les entrées du lot en cours gardent une empreinte mémoire bornée
+                with zf.open(info) as entry:
+                    upload = spool_upload(entry, name, max_bytes=BATCH_MAX_ENTRY_BYTES)
+            except UploadTooLarge as e:
+                yield name, None, str(e)
+                continue
+            except ZIP_ENTRY_ERRORS as e:
+                # Entrée illisible: signalée seule, la suite de l'archive est traitée
+                print(f"Entrée d'archive illisible ({name}): {e}")
+                yield name, None, "Fichier illisible dans l'archive (chiffré, corrompu ou compression non supportée)"
+                continue
+            yield name, upload, None
+
+
+def iter_batch_entries(files: List, archive=None) -> Iterator[Tuple[str, Optional[SpooledUpload], Optional[str]]]:
+    """
+    Énumère les documents d'un lot (fichiers envoyés puis contenu de l'archive)
+
+    Args:
+        files: Liste de FileStorage
+        archive: FileStorage d'une archive ZIP (optionnel)
+
+    Yields:
+        Tuples (nom, document, erreur)
+    """
+    for file in files:
+        if not file.filename:
+            continue
+        if not file.filename.lower().endswith('.pdf'):
+            yield file.filename, None, "Seuls les fichiers PDF sont acceptés"
+            continue
+        try:
+            upload = spool_upload(file, file.filename)
+        except UploadTooLarge as e:
+            yield file.filename, None, str(e)
+            continue
+        except OSError as e:
+            print(f"Erreur lors de la copie de {file.filename}: {e}")
+            yield file.filename, None, "Fichier illisible"
+            continue
+        yield file.filename, upload, None
+
+    if archive is not None:
+        try:
+            yield from iter_zip_entries(archive.stream)
+        except zipfile.BadZipFile:
+            yield archive.filename, None, "Archive ZIP invalide"
+
+
+def process_entry(index: int, filename: str, upload: SpooledUpload, db, authorized: bool,
+                  user_id: Optional[str]) -> Dict:
+    """
+    Analyse un document du lot (exécuté dans un worker)
+
+    Returns:
+        Événement de progression, avec le document MongoDB en clé privée "_doc"
+    """
+    try:
+        with upload:
+            prepared = prepare_document(upload, filename)
+        with llm_semaphore:
+            # Échéance propre au document: l'attente du lot ne compte pas contre lui
+            analysis_result = analyze_prepared(prepared, authorized, db=db, user_id=user_id,
+                                               deadline=request_deadline(batch=True))
+        return {
+            "type": "progress",
+            "index": index,
+            "fileName": filename,
+            "status": "done",
+            "result": format_result(analysis_result),
+            "_doc": build_analysis_document(prepared, analysis_result, user_id)
+        }
+    except AnalysisError as e:
+        event = {"type": "progress", "index": index, "fileName": filename, "status": "error"}
+        event.update(e.to_response())
+        return event
+    except Exception as e:
+        print(f"Erreur lors de l'analyse de {filename}: {e}")
+        return {"type": "progress", "index": index, "fileName": filename, "status": "error",
+                "error": "Une erreur interne est survenue"}
+
+
+def run_batch(entries: Iterator[Tuple[str, Optional[SpooledUpload], Optional[str]]], db,
+              authorized: bool, user_id: Optional[str], rate_limit_key: Optional[str] = None) -> Iterator[Dict]:
+    """
+    Exécute le lot et produit un événement par document terminé
+
+    Le nombre de documents en mémoire est borné: un nouveau document n'est lu
+    qu'une fois qu'une place se libère dans le pool. Les analyses réussies
+    sont enregistrées en une seule fois avec insert_many à la fin du lot, y
+    compris si le flux est interrompu.
+
+    Chaque document analysé coûte un jeton de la limite "upload" du client,
+    comme un envoi unitaire; le premier est prélevé par la route. Le lot
+    s'arrête au premier refus (événement d'erreur avec Retry-After).
+
+    Args:
+        entries: Documents du lot (voir iter_batch_entries)
+        db: Base MongoDB
+        authorized: Ré-identifier les entités (utilisateur authentifié)
+        user_id: Identifiant de l'utilisateur connecté (optionnel)
+        rate_limit_key: Client à débiter (voir rate_limit.client_key), None: pas de débit
+
+    Yields:
+        Événements de progression puis un événement final "complete"
+    """
+    documents = []
+    total = 0
+    succeeded = 0
+    admitted = 0
+    retry_after = None
+    max_in_flight = BATCH_WORKERS * 2
+
+    def collect(event):
+        nonlocal succeeded
+        doc = event.pop("_doc", None)
+        if doc is not None:
+            documents.append(doc)
+            succeeded += 1
+        return event
+
+    pending = set()
+    saved = 0
+    try:
+        with ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix="batch") as executor:
+            for filename, upload, error in entries:
+                if total >= BATCH_MAX_FILES:
+                    if upload is not None:
+                        upload.cleanup()
+                    yield {"type": "progress", "index": total, "fileName": filename, "status": "error",
+                           "error": f"Limite de {BATCH_MAX_FILES} fichiers par lot atteinte"}
+                    break
+                index = total
+                total += 1
+                if error:
+                    yield {"type": "progress", "index": index, "fileName": filename, "status": "error", "error": error}
+                    continue
+
+                if rate_limit_key is not None and admitted > 0:
+                    retry_after = charge_rate_limit('upload', rate_limit_key)
+                    if retry_after is not None:
+                        upload.cleanup()
+                        event = {"type": "progress", "index": index, "fileName": filename, "status": "error"}
+                        event.update(rate_limit_error(retry_after))
+                        yield event
+                        break
+                admitted += 1
+
+                pending.add(executor.submit(process_entry, index, filename, upload, db, authorized, user_id))
+                if len(pending) >= max_in_flight:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        pending.discard(future)
+                        yield collect(future.result())
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.discard(future)
+                    yield collect(future.result())
+    finally:
+        # Flux interrompu (client déconnecté, erreur de lecture): les analyses
+        # terminées mais pas encore transmises sont enregistrées elles aussi
+        for future in pending:
+            if future.done() and not future.cancelled():
+                collect(future.result())
+        # Sauvegarder toutes les analyses du lot (écriture différée groupée)
+        if documents:
+            try:
+                saved = len(save_analyses(documents))
+            except Exception as e:
+                print(f"Erreur lors de la sauvegarde du lot: {e}")
+
+    complete = {"type": "complete", "total": total, "succeeded": succeeded,
+                "failed": total - succeeded, "saved": saved}
+    if retry_after is not None:
+        complete["retryAfter"] = retry_after  # Lot interrompu par la limitation de débit
+    yield complete
+
+
+def to_ndjson(events: Iterator[Dict]) -> Iterator[bytes]:
+    """Sérialise les événements en JSON délimité par des retours à la ligne"""
+    for event in events:
+        yield dumps_bytes(event) + b"\n"
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Module d'accès à MongoDB
+Crée le MongoClient à la première utilisation (une fois par processus, y
+compris après un fork des serveurs multi-workers), fixe la taille du pool et
+les délais, applique une préférence de lecture et un niveau d'écriture par
+type d'opération et expose les statistiques du pool de connexions
+"""
+
+import os
+import threading
+from typing import Dict
+from pymongo import MongoClient, ReadPreference, WriteConcern, monitoring
+from dotenv import load_dotenv
+
+load_dotenv(dotenv_path='../.env')
+
+# Configuration
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "apocal_db")
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "zstd,snappy,zlib")
+# Par processus: avec N workers, le serveur voit au plus N x MONGO_MAX_POOL_SIZE connexions
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "20"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_MAX_CONNECTING = int(os.getenv("MONGO_MAX_CONNECTING", "2"))  # Ouvertures simultanées
+MONGO_MAX_IDLE_MS = int(os.getenv("MONGO_MAX_IDLE_MS", "60000"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "3000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "30000"))
+MONGO_WRITE_TIMEOUT_MS = int(os.getenv("MONGO_WRITE_TIMEOUT_MS", "5000"))
+# Écriture des analyses: acquittée par le primaire seul (une analyse perdue se relance)
+MONGO_ANALYSIS_WRITE_W = int(os.getenv("MONGO_ANALYSIS_WRITE_W", "1"))
+MONGO_ANALYSIS_READ_PREFERENCE = os.getenv("MONGO_ANALYSIS_READ_PREFERENCE", "primaryPreferred")
+
+READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+
+# Options appliquées par type d'opération
+OPERATIONS = {
+    # Comptes: lecture sur le primaire, écriture confirmée par la majorité des nœuds
+    "user_read": {"read_preference": ReadPreference.PRIMARY},
+    "user_write": {
+        "read_preference": ReadPreference.PRIMARY,
+        "write_concern": WriteConcern(w="majority", wtimeout=MONGO_WRITE_TIMEOUT_MS)
+    },
+    # Analyses: historique lisible sur un secondaire, écriture sans attente de réplication
+    "analysis_read": {
+        "read_preference": READ_PREFERENCES.get(MONGO_ANALYSIS_READ_PREFERENCE, ReadPreference.PRIMARY_PREFERRED)
+    },
+    "analysis_write": {"write_concern": WriteConcern(w=MONGO_ANALYSIS_WRITE_W, j=False)},
+}
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Compte les événements du pool de connexions, par serveur"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pools = {}
+
+    def _pool(self, address) -> Dict:
+        key = "%s:%s" % address
+        pool = self.pools.get(key)
+        if pool is None:
+            pool = self.pools[key] = {
+                "open": 0, "in_use": 0, "max_in_use": 0, "created": 0, "closed": 0,
+                "checkouts": 0, "checkout_failures": 0, "cleared": 0
+            }
+        return pool
+
+    def _update(self, address, **changes):
+        with self.lock:
+            pool = self._pool(address)
+            for key, delta in changes.items():
+                pool[key] += delta
+            pool["max_in_use"] = max(pool["max_in_use"], pool["in_use"])
+
+    def pool_created(self, event):
+        self._update(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._update(event.address, cleared=1)
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._update(event.address, created=1, open=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._update(event.address, closed=1, open=-1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._update(event.address, checkout_failures=1)
+
+    def connection_checked_out(self, event):
+        self._update(event.address, checkouts=1, in_use=1)
+
+    def connection_checked_in(self, event):
+        self._update(event.address, in_use=-1)
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            return {address: dict(pool) for address, pool in self.pools.items()}
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+_pool_listener = PoolStatsListener()
+
+
+def _reset_after_fork():
+    """Oublie le client hérité du processus parent (ses sockets et threads ne sont pas utilisables)"""
+    global _client, _client_pid, _client_lock, _pool_listener
+    _client = None
+    _client_pid = None
+    _client_lock = threading.Lock()
+    _pool_listener = PoolStatsListener()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_client() -> MongoClient:
+    """Retourne le MongoClient du processus courant (créé au premier appel)"""
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is not None and _client_pid == pid:
+        return _client
+    with _client_lock:
+        if _client is None or _client_pid != pid:
+            _client = MongoClient(
+                MONGO_URI,
+                maxPoolSize=MONGO_MAX_POOL_SIZE,
+                minPoolSize=MONGO_MIN_POOL_SIZE,
+                maxConnecting=MONGO_MAX_CONNECTING,
+                maxIdleTimeMS=MONGO_MAX_IDLE_MS,
+                waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+                connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+                serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+                retryWrites=True,
+                retryReads=True,
+                # Compression réseau négociée avec le serveur (les algorithmes non installés sont ignorés)
+                compressors=MONGO_COMPRESSORS,
+                event_listeners=[_pool_listener],
+                appname="apocalipssi-backend"
+            )
+            _client_pid = pid
+        return _client
+
+
+def get_db():
+    """Retourne la base de l'application"""
+    return get_client()[MONGO_DB_NAME]
+
+
+class LazyDatabase:
+    """Accès différé à la base: importable au chargement des modules sans ouvrir de connexion"""
+
+    def __getattr__(self, name):
+        return getattr(get_db(), name)
+
+    def __getitem__(self, name):
+        return get_db()[name]
+
+
+db = LazyDatabase()
+
+
+def for_operation(collection, operation: str):
+    """
+    Applique à une collection les options d'un type d'opération
+
+    Args:
+        collection: Collection MongoDB
+        operation: Clé de OPERATIONS (user_read, user_write, analysis_read, analysis_write)
+
+    Returns:
+        Collection configurée
+    """
+    return collection.with_options(**OPERATIONS[operation])
+
+
+def get_pool_stats() -> Dict:
+    """
+    Statistiques du pool de connexions du processus courant
+
+    Returns:
+        {pid, max_pool_size, pools: {serveur: compteurs}}
+    """
+    return {
+        "pid": os.getpid(),
+        "connected": _client is not None and _client_pid == os.getpid(),
+        "max_pool_size": MONGO_MAX_POOL_SIZE,
+        "pools": _pool_listener.snapshot()
+    }
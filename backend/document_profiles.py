@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Module des profils de traitement par type de document
+Classe chaque document (facture, contrat, rapport long, note courte) à partir
+du texte de sa première page et de son nombre de pages, puis adapte le
+pipeline: détecteurs PII, découpage avant le LLM, consignes et budget de
+sortie. Un document simple n'emprunte plus le chemin du pire cas.
+"""
+
+import os
+import re
+import copy
+from typing import Dict, Iterable, Optional, Tuple
+from dotenv import load_dotenv
+
+from token_budget import split_pages, LLM_MAX_OUTPUT_TOKENS
+from extractive_summary import EXTRACTIVE_TARGET_TOKENS
+from pii_anonymizer import ALL_DETECTORS
+from llm_summary import USER_PREFIX
+
+load_dotenv(dotenv_path='../.env')
+
+# Configuration
+DOCUMENT_PROFILES_ENABLED = os.getenv("DOCUMENT_PROFILES_ENABLED", "true").lower() == "true"
+LONG_REPORT_MIN_PAGES = int(os.getenv("LONG_REPORT_MIN_PAGES", "20"))
+SHORT_MEMO_MAX_PAGES = int(os.getenv("SHORT_MEMO_MAX_PAGES", "2"))
+SHORT_MEMO_MAX_CHARS = int(os.getenv("SHORT_MEMO_MAX_CHARS", "6000"))
+
+# Mots-clés distincts de la première page nécessaires pour retenir un type
+MIN_KEYWORD_HITS = 2
+FIRST_PAGE_MAX_CHARS = 4000
+
+# Découpage avant le LLM
+CHUNKING_EXTRACTIVE = "extractive"  # Phrases les mieux classées dans un budget (TextRank)
+CHUNKING_FULL = "full"              # Pages entières dans la fenêtre de contexte
+
+# Détecteurs d'identité exécutés pour tous les profils (aucune de ces données
+# ne doit parvenir en clair au LLM externe)
+IDENTITY_DETECTORS = frozenset({
+    "person_name", "company_name", "address", "postal_code_fr", "email",
+    "phone_fr", "phone_international", "ssn_fr", "iban_fr", "credit_card"
+})
+
+
+class DocumentProfile:
+    """Paramètres du pipeline pour un type de document"""
+
+    def __init__(self, name: str, label: str, instructions: str = "", summary_words: str = "200-300",
+                 detectors: Iterable[str] = ALL_DETECTORS, chunking: str = CHUNKING_EXTRACTIVE,
+                 extractive_target_tokens: int = EXTRACTIVE_TARGET_TOKENS,
+                 max_output_tokens: int = LLM_MAX_OUTPUT_TOKENS, temperature: float = 0.3,
+                 keywords: Tuple[str, ...] = ()):
+        """
+        Args:
+            name: Identifiant du profil
+            label: Type de document indiqué au LLM
+            instructions: Consignes propres au type de document
+            summary_words: Longueur attendue du résumé (en mots)
+            detectors: Détecteurs PII à exécuter
+            chunking: Découpage avant le LLM (extractive ou full)
+            extractive_target_tokens: Budget de la pré-synthèse extractive
+            max_output_tokens: Tokens réservés pour la réponse
+            temperature: Température de génération
+            keywords: Expressions caractéristiques de la première page
+        """
+        self.name = name
+        self.label = label
+        self.instructions = instructions
+        self.summary_words = summary_words
+        # Les détecteurs d'identité ne sont jamais retirés, quel que soit le type
+        self.detectors = frozenset(detectors) | IDENTITY_DETECTORS
+        self.chunking = chunking
+        self.extractive_target_tokens = extractive_target_tokens
+        self.max_output_tokens = max_output_tokens
+        self.temperature = temperature
+        self.keywords = tuple(re.compile(keyword, re.IGNORECASE | re.MULTILINE) for keyword in keywords)
+
+    def user_prefix(self) -> str:
+        """
+        Début du message utilisateur: type, consignes et longueur attendue
+
+        Les consignes vont dans le message utilisateur et non dans le prompt
+        système: celui-ci reste identique pour tous les profils et son cache
+        KV est réutilisé par Ollama.
+        """
+        lines = [f"Type de document: {self.label}"]
+        if self.instructions:
+            lines.append(self.instructions)
+        lines.append(f"Longueur du résumé: {self.summary_words} mots.")
+        return '\n'.join(lines) + "\n\n" + USER_PREFIX
+
+    def keyword_hits(self, first_page: str) -> int:
+        """Nombre d'expressions caractéristiques présentes sur la première page"""
+        return sum(1 for keyword in self.keywords if keyword.search(first_page))
+
+    def detectors_version(self) -> str:
+        """Détecteurs exécutés (clé du cache des textes anonymisés)"""
+        return ','.join(sorted(self.detectors))
+
+
+# Seules les dates de naissance sont ignorées sur une facture: ses dates
+# d'émission et d'échéance seraient sinon masquées comme telles
+INVOICE_DETECTORS = ALL_DETECTORS - {"date_birth"}
+
+PROFILES = {
+    "default": DocumentProfile("default", "document"),
+    "invoice": DocumentProfile(
+        "invoice", "facture",
+        instructions="Identifie l'émetteur, le destinataire, les montants (HT, TVA, TTC), "
+                     "la date d'échéance et les conditions de paiement.",
+        summary_words="60-120", detectors=INVOICE_DETECTORS, chunking=CHUNKING_FULL,
+        max_output_tokens=600, temperature=0.1,
+        keywords=(r'\bfacture\b', r'\binvoice\b', r'\bmontant\s+(?:ht|ttc)\b', r'\btva\b',
+                  r'\bnet\s+à\s+payer\b', r'\béchéance\b', r'\btotal\s+(?:ht|ttc)\b', r'\bsiret\b')
+    ),
+    "contract": DocumentProfile(
+        "contract", "contrat",
+        instructions="Identifie les parties, l'objet, la durée, les obligations de chacun, "
+                     "les conditions financières et les clauses de résiliation ou de pénalité.",
+        detectors=ALL_DETECTORS, extractive_target_tokens=5000, temperature=0.2,
+        keywords=(r'\bcontrat\b', r'\bentre\s+les\s+soussignés\b', r'\bci-après\s+dénommée?s?\b',
+                  r'\barticle\s+1\b', r'\bclauses?\b', r'\bconvention\b', r'\bparties\b', r'\bavenant\b')
+    ),
+    "long_report": DocumentProfile(
+        "long_report", "rapport long",
+        instructions="Dégage la structure du rapport, ses conclusions principales et les chiffres clés.",
+        detectors=ALL_DETECTORS, extractive_target_tokens=3000,
+        keywords=(r'\brapport\b', r'\bsommaire\b', r'\btable\s+des\s+matières\b', r'\bsynthèse\b',
+                  r'\bintroduction\b', r'\bannexes?\b')
+    ),
+    "short_memo": DocumentProfile(
+        "short_memo", "note courte",
+        instructions="Va à l'essentiel: objet, décisions et actions attendues.",
+        summary_words="60-120", chunking=CHUNKING_FULL,
+        max_output_tokens=500,
+        keywords=(r'\bnote\s+(?:de\s+service|interne|d\'information)\b', r'\bmémo\b', r'\bmemorandum\b',
+                  r'^\s*objet\s*:', r'^\s*de\s*:', r'^\s*(?:à|destinataires?)\s*:', r'\bcompte[- ]rendu\b')
+    ),
+}
+
+
+def get_profile(name: Optional[str]) -> Optional[DocumentProfile]:
+    """Profil enregistré sous ce nom (None si inconnu)"""
+    return PROFILES.get(name) if name else None
+
+
+def classify_document(text: str, page_count: int) -> DocumentProfile:
+    """
+    Choisit le profil d'un document à partir de sa première page
+
+    Args:
+        text: Texte extrait (pages séparées par les marqueurs --- Page N ---)
+        page_count: Nombre de pages du document
+
+    Returns:
+        Profil retenu (profil par défaut si les profils sont désactivés)
+    """
+    if not DOCUMENT_PROFILES_ENABLED:
+        return PROFILES["default"]
+
+    pages = split_pages(text[:FIRST_PAGE_MAX_CHARS * 2])
+    first_page = pages[0][:FIRST_PAGE_MAX_CHARS] if pages else ""
+    is_short = page_count <= SHORT_MEMO_MAX_PAGES and len(text) <= SHORT_MEMO_MAX_CHARS
+    is_long = page_count >= LONG_REPORT_MIN_PAGES
+
+    candidates = []
+    for profile in PROFILES.values():
+        hits = profile.keyword_hits(first_page) if profile.keywords else 0
+        if hits < MIN_KEYWORD_HITS:
+            continue
+        # Une note ne fait que quelques pages; un rapport long en fait beaucoup
+        if (profile.name == "short_memo" and not is_short) or (profile.name == "long_report" and not is_long):
+            continue
+        candidates.append((hits, profile))
+    if candidates:
+        return max(candidates, key=lambda candidate: candidate[0])[1]
+
+    # Sans mot-clé décisif, la taille du document suffit à éviter le pire cas
+    # pour le découpage, mais jamais à réduire l'anonymisation
+    if is_long:
+        return with_all_detectors(PROFILES["long_report"])
+    if is_short:
+        return with_all_detectors(PROFILES["short_memo"])
+    return PROFILES["default"]
+
+
+def with_all_detectors(profile: DocumentProfile) -> DocumentProfile:
+    """Profil exécutant tous les détecteurs PII (copie si le profil en retire)"""
+    if profile.detectors == ALL_DETECTORS:
+        return profile
+    complete = copy.copy(profile)
+    complete.detectors = ALL_DETECTORS
+    return complete
+
+
+def get_profile_names() -> Dict[str, str]:
+    """Profils disponibles (nom -> type de document)"""
+    return {name: profile.label for name, profile in PROFILES.items()}
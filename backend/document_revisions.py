@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Module de ré-analyse incrémentale des révisions de documents
+Compare page par page (empreintes hachées) une nouvelle extraction au texte
+stocké de l'analyse précédente, pour n'envoyer au LLM que les pages modifiées
+"""
+
+import os
+import re
+import json
+import hashlib
+from typing import Dict, List, Optional, Tuple
+from bson import ObjectId, Binary
+from bson.errors import InvalidId
+from dotenv import load_dotenv
+
+from artifact_cache import compress, decompress
+from analysis_store import decode_analysis
+from token_budget import split_pages
+from pii_anonymizer import translate_placeholders
+
+load_dotenv(dotenv_path='../.env')
+
+# Configuration
+REVISION_ENABLED = os.getenv("REVISION_ENABLED", "true").lower() == "true"
+# Passer automatiquement en mode révision quand un quasi-doublon est trouvé
+REVISION_AUTO = os.getenv("REVISION_AUTO", "true").lower() == "true"
+# Au-delà de cette part de pages modifiées, une analyse complète est moins coûteuse
+REVISION_MAX_CHANGED_RATIO = float(os.getenv("REVISION_MAX_CHANGED_RATIO", "0.5"))
+
+PAGE_MARKER_PATTERN = re.compile(r'^--- Page \d+ ---\n?')
+
+
+def page_fingerprints(text: str) -> List[str]:
+    """
+    Empreinte de chaque page, indépendante de son numéro
+
+    Args:
+        text: Texte extrait (pages séparées par les marqueurs --- Page N ---)
+
+    Returns:
+        Empreintes hexadécimales, dans l'ordre des pages
+    """
+    fingerprints = []
+    for page in split_pages(text):
+        body = ' '.join(PAGE_MARKER_PATTERN.sub('', page).split())
+        fingerprints.append(hashlib.sha256(body.encode('utf-8')).hexdigest()[:16])
+    return fingerprints
+
+
+def pack_text(text: str) -> Binary:
+    """Compresse le texte complet d'un document pour le stockage MongoDB"""
+    return Binary(compress(text.encode('utf-8')))
+
+
+def unpack_text(blob) -> str:
+    """Décompresse un texte stocké avec pack_text"""
+    return decompress(bytes(blob)).decode('utf-8')
+
+
+def load_previous_analysis(db, analysis_id: str, user_id: Optional[str]) -> Optional[Dict]:
+    """
+    Charge une analyse précédente de l'utilisateur
+
+    Args:
+        db: Base MongoDB
+        analysis_id: Identifiant de l'analyse
+        user_id: Identifiant de l'utilisateur (seules ses analyses sont accessibles)
+
+    Returns:
+        Document de l'analyse, ou None
+    """
+    if not REVISION_ENABLED or not user_id or not analysis_id:
+        return None
+    try:
+        query = {"_id": ObjectId(analysis_id), "userId": ObjectId(user_id)}
+    except (InvalidId, TypeError):
+        return None
+    return decode_analysis(db.analyses.find_one(query, {
+        "filename": 1, "summary": 1, "keyPoints": 1, "actions": 1, "payload": 1, "pageHashes": 1, "fullText": 1,
+        "anonymizedAnalysis": 1, "anonymizationMap": 1
+    }))
+
+
+def plan_revision(prepared: Dict, previous: Dict) -> Optional[Dict]:
+    """
+    Détermine les pages modifiées par rapport à l'analyse précédente
+
+    Args:
+        prepared: Résultat de prepare_document
+        previous: Analyse précédente (load_previous_analysis)
+
+    Returns:
+        {changed_pages, removed_pages, changes_text} ou None si une analyse
+        complète est préférable (texte précédent ou analyse anonymisée
+        indisponible, trop de changements)
+    """
+    if not previous.get("anonymizedAnalysis") or previous.get("anonymizationMap") is None:
+        return None  # Analyse précédente seulement ré-identifiée: rien de sûr à transmettre au LLM
+
+    previous_hashes = previous.get("pageHashes")
+    if not previous_hashes and previous.get("fullText"):
+        previous_hashes = page_fingerprints(unpack_text(previous["fullText"]))
+    if not previous_hashes:
+        return None
+
+    new_hashes = prepared["page_hashes"]
+    anonymized_pages = split_pages(prepared["anonymized_text"])
+    if len(anonymized_pages) != len(new_hashes):
+        return None  # Découpage incohérent: analyse complète
+
+    # Comparaison en multi-ensemble: une page déplacée n'est pas une modification
+    remaining = {}
+    for fingerprint in previous_hashes:
+        remaining[fingerprint] = remaining.get(fingerprint, 0) + 1
+    changed = []
+    for index, fingerprint in enumerate(new_hashes):
+        if remaining.get(fingerprint, 0) > 0:
+            remaining[fingerprint] -= 1
+        else:
+            changed.append(index)
+    # Une page ancienne sans correspondance est d'abord comptée comme modifiée
+    removed = max(0, sum(remaining.values()) - len(changed))
+
+    if new_hashes and (len(changed) + removed) / len(new_hashes) > REVISION_MAX_CHANGED_RATIO:
+        return None
+    if removed and not changed:
+        return None  # Seules des suppressions: le contexte manque au LLM, analyse complète
+
+    return {
+        "changed_pages": [index + 1 for index in changed],
+        "removed_pages": removed,
+        "changes_text": '\n\n'.join(anonymized_pages[index] for index in changed)
+    }
+
+
+def build_revision_prefix(previous: Dict, revision: Dict, anonymization_map: Dict) -> Tuple[str, Dict]:
+    """
+    Construit le début du message utilisateur: analyse précédente et nature des changements
+
+    L'analyse précédente est reprise sous sa forme anonymisée (stockée avec
+    son mapping) et réécrite avec les placeholders du nouveau document: une
+    entité qui n'apparaît plus dans le nouveau document reste anonymisée.
+
+    Args:
+        previous: Analyse précédente (avec anonymizedAnalysis et anonymizationMap)
+        revision: Résultat de plan_revision
+        anonymization_map: Mapping placeholder -> entité du nouveau document
+
+    Returns:
+        Tuple (préfixe du message utilisateur, mapping complété pour la ré-identification)
+    """
+    previous_analysis = json.dumps(previous["anonymizedAnalysis"], ensure_ascii=False, indent=2)
+    previous_analysis, anonymization_map = translate_placeholders(
+        previous_analysis, previous["anonymizationMap"], anonymization_map
+    )
+
+    prefix = (
+        f"Analyse précédente:\n{previous_analysis}\n\n"
+        f"Pages supprimées depuis la version précédente: {revision['removed_pages']}\n\n"
+        f"Pages modifiées ou ajoutées:\n\n"
+    )
+    return prefix, anonymization_map
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Module de pré-synthèse extractive
+Classe les phrases du document (TF-IDF + TextRank) en local sur CPU et ne
+transmet au LLM que le contenu le mieux classé dans un budget de tokens
+"""
+
+import os
+import re
+from collections import Counter
+from typing import Dict, List, Tuple
+from dotenv import load_dotenv
+
+from token_budget import get_token_counter, split_pages, split_blocks
+from lazy_imports import lazy_import, is_installed
+
+load_dotenv(dotenv_path='../.env')
+
+# numpy/scipy chargés à la première pré-synthèse
+EXTRACTIVE_AVAILABLE = is_installed("numpy") and is_installed("scipy")
+if EXTRACTIVE_AVAILABLE:
+    np = lazy_import("numpy")
+    sparse = lazy_import("scipy.sparse")
+else:
+    print("numpy/scipy non installés: pré-synthèse extractive désactivée")
+
+# Configuration
+EXTRACTIVE_ENABLED = os.getenv("EXTRACTIVE_ENABLED", "true").lower() == "true"
+EXTRACTIVE_TARGET_TOKENS = int(os.getenv("EXTRACTIVE_TARGET_TOKENS", "4000"))
+EXTRACTIVE_MODEL = os.getenv("GROQ_MODEL", "llama3-70b-8192")
+# Phrases classées au plus (coût du graphe de similarité borné pour les gros documents)
+EXTRACTIVE_MAX_CANDIDATES = int(os.getenv("EXTRACTIVE_MAX_CANDIDATES", "2000"))
+
+# Une phrase présente sur au moins cette part des pages est du gabarit
+BOILERPLATE_PAGE_RATIO = 0.5
+TEXTRANK_DAMPING = 0.85
+TEXTRANK_ITERATIONS = 50
+TEXTRANK_TOP_K = 20              # Voisins conservés par phrase dans le graphe
+TEXTRANK_MIN_SIMILARITY = 0.05   # Arêtes plus faibles ignorées
+TEXTRANK_BLOCK_ROWS = 256        # Lignes de similarité calculées à la fois
+MAX_TERM_DF_RATIO = 0.3          # Terme présent dans plus de 30 % des phrases: non discriminant
+MIN_SENTENCE_CHARS = 15
+
+# Mots vides: sans eux presque toutes les paires de phrases partagent un terme
+STOPWORDS = frozenset("""
+au aux avec ce ces cet cette dans de des du elle en et eux il ils je la le les leur leurs lui ma mais me
+même mes moi mon ne nos notre nous on ou où par pas pour qu que qui sa se ses son sur ta te tes toi ton tu
+un une vos votre vous est sont été être avoir ont était sera seront fait faire plus moins aussi ainsi
+comme donc dont entre sans sous si tout tous toute toutes très cela ceci selon lors afin peut doit
+the and of to in for on with is are be by as at or an this that from it its not
+""".split())
+
+SENTENCE_SPLIT_PATTERN = re.compile(r'(?<=[.!?])\s+')
+WORD_PATTERN = re.compile(r'\w{2,}')
+PAGE_HEADER_PATTERN = re.compile(r'^--- Page (\d+) ---$')
+DIGITS_PATTERN = re.compile(r'\d+')
+
+
+def split_sentences(page: str) -> Tuple[str, List[str]]:
+    """
+    Découpe une page en phrases
+
+    Args:
+        page: Bloc de page (marqueur --- Page N --- éventuellement en tête)
+
+    Returns:
+        Tuple (marqueur_de_page, phrases)
+    """
+    lines = page.split('\n')
+    marker = ''
+    if lines and PAGE_HEADER_PATTERN.match(lines[0]):
+        marker = lines.pop(0)
+    # Une phrase ne déborde pas de son unité (paragraphe, titre, tableau)
+    sentences = []
+    for block in split_blocks('\n'.join(lines)):
+        body = ' '.join(line.strip() for line in block.split('\n') if line.strip())
+        sentences.extend(s.strip() for s in SENTENCE_SPLIT_PATTERN.split(body) if s.strip())
+    return marker, sentences
+
+
+def normalize_sentence(sentence: str) -> str:
+    """Normalise une phrase pour la détection du gabarit (casse, numéros)"""
+    return DIGITS_PATTERN.sub('0', ' '.join(sentence.lower().split()))
+
+
+def build_tfidf_matrix(sentences: List[str]):
+    """
+    Construit la matrice TF-IDF creuse (phrases x termes), lignes normalisées L2
+
+    Args:
+        sentences: Phrases à vectoriser
+
+    Returns:
+        Matrice scipy.sparse CSR
+    """
+    vocabulary = {}
+    indptr = [0]
+    indices = []
+    data = []
+
+    for sentence in sentences:
+        counts = Counter(word for word in WORD_PATTERN.findall(sentence.lower()) if word not in STOPWORDS)
+        for term, count in counts.items():
+            indices.append(vocabulary.setdefault(term, len(vocabulary)))
+            data.append(count)
+        indptr.append(len(indices))
+
+    tf = sparse.csr_matrix(
+        (np.asarray(data, dtype=np.float64), np.asarray(indices, dtype=np.int64), np.asarray(indptr, dtype=np.int64)),
+        shape=(len(sentences), max(len(vocabulary), 1))
+    )
+
+    # IDF lissé: log((1 + n) / (1 + df)) + 1; termes trop fréquents écartés
+    document_frequency = np.bincount(tf.indices, minlength=tf.shape[1])
+    idf = np.log((1.0 + len(sentences)) / (1.0 + document_frequency)) + 1.0
+    if len(sentences) >= 10:
+        idf[document_frequency > MAX_TERM_DF_RATIO * len(sentences)] = 0.0
+    tfidf = tf.multiply(idf).tocsr()
+
+    norms = np.sqrt(np.asarray(tfidf.multiply(tfidf).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sparse.diags(1.0 / norms).dot(tfidf).tocsr()
+
+
+def similarity_graph(tfidf):
+    """
+    Graphe de similarité cosinus creux: TEXTRANK_TOP_K voisins par phrase au
+    plus, au-dessus de TEXTRANK_MIN_SIMILARITY
+
+    Les similarités sont calculées par blocs de TEXTRANK_BLOCK_ROWS lignes;
+    le graphe conservé compte au plus n x TEXTRANK_TOP_K arêtes au lieu de n².
+
+    Args:
+        tfidf: Matrice TF-IDF normalisée (phrases x termes)
+
+    Returns:
+        Matrice CSR symétrique (phrases x phrases), diagonale nulle
+    """
+    n = tfidf.shape[0]
+    k = min(TEXTRANK_TOP_K, n - 1)
+    if k <= 0:
+        return sparse.csr_matrix((n, n))
+
+    rows, cols, values = [], [], []
+    transposed = tfidf.T.tocsc()
+    for start in range(0, n, TEXTRANK_BLOCK_ROWS):
+        block = tfidf[start:start + TEXTRANK_BLOCK_ROWS].dot(transposed).toarray()
+        block[np.arange(block.shape[0]), np.arange(start, start + block.shape[0])] = 0.0
+        neighbours = np.argpartition(-block, k - 1, axis=1)[:, :k]
+        weights = np.take_along_axis(block, neighbours, axis=1)
+        keep = weights >= TEXTRANK_MIN_SIMILARITY
+        rows.append(np.nonzero(keep)[0] + start)
+        cols.append(neighbours[keep])
+        values.append(weights[keep])
+
+    graph = sparse.csr_matrix((np.concatenate(values), (np.concatenate(rows), np.concatenate(cols))), shape=(n, n))
+    # Graphe non orienté: une arête retenue d'un côté l'est des deux
+    return graph.maximum(graph.T).tocsr()
+
+
+def textrank_scores(tfidf) -> "np.ndarray":
+    """
+    Calcule le score TextRank de chaque phrase par itération de puissance
+
+    Args:
+        tfidf: Matrice TF-IDF normalisée (phrases x termes)
+
+    Returns:
+        Vecteur de scores
+    """
+    n = tfidf.shape[0]
+    similarity = similarity_graph(tfidf)
+
+    # Normalisation stochastique des lignes (phrases isolées: score uniforme)
+    out_weight = np.asarray(similarity.sum(axis=1)).ravel()
+    out_weight[out_weight == 0] = 1.0
+    transition = sparse.diags(1.0 / out_weight).dot(similarity).T.tocsr()
+
+    scores = np.full(n, 1.0 / n)
+    teleport = (1.0 - TEXTRANK_DAMPING) / n
+    for _ in range(TEXTRANK_ITERATIONS):
+        updated = teleport + TEXTRANK_DAMPING * transition.dot(scores)
+        if np.abs(updated - scores).sum() < 1e-6:
+            return updated
+        scores = updated
+    return scores
+
+
+def limit_candidates(candidates: List[int], sentence_pages: List[int],
+                     max_candidates: int = EXTRACTIVE_MAX_CANDIDATES) -> List[int]:
+    """
+    Borne le nombre de phrases classées
+
+    Chaque page garde ses premières phrases (quota égal entre les pages):
+    l'ouverture d'une section porte le plus souvent son propos.
+
+    Args:
+        candidates: Positions des phrases candidates (ordre du document)
+        sentence_pages: Page de chaque phrase
+        max_candidates: Nombre maximal de phrases
+
+    Returns:
+        Positions retenues (ordre du document)
+    """
+    if len(candidates) <= max_candidates:
+        return candidates
+
+    per_page = {}
+    for position in candidates:
+        per_page.setdefault(sentence_pages[position], []).append(position)
+    quota = max(1, max_candidates // len(per_page))
+    limited = sorted(position for positions in per_page.values() for position in positions[:quota])
+    if len(limited) > max_candidates:
+        # Plus de pages que de places: une phrase sur plusieurs, réparties sur tout le document
+        stride = len(limited) / max_candidates
+        limited = [limited[int(i * stride)] for i in range(max_candidates)]
+    return limited
+
+
+def extract_key_content(text: str, target_tokens: int = EXTRACTIVE_TARGET_TOKENS,
+                        model: str = EXTRACTIVE_MODEL) -> Tuple[str, Dict]:
+    """
+    Réduit le document à ses phrases les plus représentatives
+
+    Les phrases retenues gardent leur ordre d'origine et restent regroupées
+    sous leur marqueur de page pour le découpage en aval.
+
+    Args:
+        text: Texte du document (anonymisé)
+        target_tokens: Budget cible en tokens
+        model: Modèle utilisé pour compter les tokens
+
+    Returns:
+        Tuple (texte_réduit, statistiques)
+    """
+    counter = get_token_counter(model)
+    input_tokens = counter.count(text)
+    stats = {
+        'applied': False,
+        'input_tokens': input_tokens,
+        'output_tokens': input_tokens,
+        'sentences_total': 0,
+        'sentences_kept': 0,
+        'boilerplate_removed': 0
+    }
+
+    if not EXTRACTIVE_ENABLED or not EXTRACTIVE_AVAILABLE or input_tokens <= target_tokens:
+        return text, stats
+
+    # Découper en phrases en gardant la page d'origine
+    markers = []
+    sentences = []
+    sentence_pages = []
+    for page_index, page in enumerate(split_pages(text)):
+        marker, page_sentences = split_sentences(page)
+        markers.append(marker)
+        sentences.extend(page_sentences)
+        sentence_pages.extend([page_index] * len(page_sentences))
+
+    # Écarter le gabarit répété d'une page à l'autre (en-têtes, pieds de page, mentions)
+    pages_per_sentence = {}
+    for sentence, page_index in zip(sentences, sentence_pages):
+        pages_per_sentence.setdefault(normalize_sentence(sentence), set()).add(page_index)
+    threshold = max(2, int(len(markers) * BOILERPLATE_PAGE_RATIO))
+
+    candidates = []
+    boilerplate = 0
+    for position, sentence in enumerate(sentences):
+        if len(pages_per_sentence[normalize_sentence(sentence)]) >= threshold:
+            boilerplate += 1
+        elif len(sentence) >= MIN_SENTENCE_CHARS:
+            candidates.append(position)
+
+    stats['sentences_total'] = len(sentences)
+    stats['boilerplate_removed'] = boilerplate
+    if not candidates:
+        return text, stats
+    candidates = limit_candidates(candidates, sentence_pages)
+
+    # Classer les phrases et retenir les meilleures dans le budget
+    scores = textrank_scores(build_tfidf_matrix([sentences[i] for i in candidates]))
+    selected = []
+    used = 0
+    for rank in np.argsort(-scores, kind='stable'):
+        position = candidates[rank]
+        cost = counter.count(sentences[position]) + 1
+        if used + cost > target_tokens:
+            continue
+        selected.append(position)
+        used += cost
+
+    # Reconstituer le texte dans l'ordre du document, page par page
+    blocks = []
+    current_page = None
+    for position in sorted(selected):
+        page_index = sentence_pages[position]
+        if page_index != current_page:
+            current_page = page_index
+            blocks.append([markers[page_index]] if markers[page_index] else [])
+        blocks[-1].append(sentences[position])
+    reduced_text = '\n\n'.join('\n'.join(block) for block in blocks)
+
+    stats.update({
+        'applied': True,
+        'output_tokens': counter.count(reduced_text),
+        'sentences_kept': len(selected)
+    })
+    print(f"Pré-synthèse extractive: {stats['input_tokens']} -> {stats['output_tokens']} tokens, "
+          f"{len(selected)}/{len(sentences)} phrases, {boilerplate} phrases de gabarit écartées")
+
+    return reduced_text, stats
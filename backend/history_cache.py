@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Module de cache des réponses d'historique
+Conserve par utilisateur la dernière page d'historique et une version dérivée
+du nombre d'analyses et de la date de la plus récente. La version sert d'ETag
+fort: une requête conditionnelle sur un historique inchangé reçoit un 304
+sans requête MongoDB. Chaque écriture d'analyses fait évoluer la version des
+utilisateurs concernés. Le cache est propre à chaque worker: les écritures
+d'un autre worker n'apparaissent qu'à la revalidation de la version auprès
+de MongoDB, soit avec au plus HISTORY_CACHE_TTL secondes de retard.
+Le détail d'une analyse ne change plus après son insertion: il est mis en
+cache par identifiant.
+"""
+
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+from bson import ObjectId
+from dotenv import load_dotenv
+
+from database import for_operation
+from analysis_store import STORAGE_VERSION
+
+load_dotenv(dotenv_path='../.env')
+
+# Configuration
+HISTORY_CACHE_ENABLED = os.getenv("HISTORY_CACHE_ENABLED", "true").lower() == "true"
+HISTORY_CACHE_TTL = float(os.getenv("HISTORY_CACHE_TTL", "30"))  # Revalidation auprès de MongoDB (secondes)
+HISTORY_CACHE_MAX_USERS = int(os.getenv("HISTORY_CACHE_MAX_USERS", "1000"))
+DETAIL_CACHE_SIZE = int(os.getenv("DETAIL_CACHE_SIZE", "256"))
+
+PUBLIC_KEY = "public"  # Historique anonyme: dernières analyses de tous les utilisateurs
+
+
+def history_key(user_id: Optional[str]) -> str:
+    """Clé de cache de l'historique d'un utilisateur (ou de l'historique public)"""
+    return str(user_id) if user_id else PUBLIC_KEY
+
+
+def _truncate_ms(value: Optional[datetime]) -> Optional[datetime]:
+    """Précision de MongoDB (milliseconde): même version avant et après relecture"""
+    if value is None:
+        return None
+    return value.replace(microsecond=value.microsecond // 1000 * 1000)
+
+
+def make_etag(key: str, count: int, latest: Optional[datetime]) -> str:
+    """
+    ETag fort d'un historique
+
+    Args:
+        key: Clé de l'historique
+        count: Nombre d'analyses
+        latest: Date de l'analyse la plus récente
+
+    Returns:
+        ETag (sans guillemets)
+    """
+    version = f"{key}:{count}:{latest.isoformat() if latest else ''}:{STORAGE_VERSION}"
+    return hashlib.sha1(version.encode("utf-8")).hexdigest()[:20]
+
+
+class HistoryCache:
+    """Versions et pages d'historique par utilisateur (éviction LRU)"""
+
+    def __init__(self, max_users: int):
+        self.entries = OrderedDict()  # clé -> {count, latest, checked_at, body}
+        self.max_users = max_users
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "not_modified": 0, "misses": 0, "revalidations": 0}
+
+    def _load_version(self, db, key: str) -> Tuple[int, Optional[datetime]]:
+        """Lit la version d'un historique (requêtes servies par l'index userId/uploadDate)"""
+        query = {} if key == PUBLIC_KEY else {"userId": ObjectId(key)}
+        analyses = for_operation(db.analyses, 'analysis_read')
+        count = analyses.count_documents(query)
+        latest = analyses.find_one(query, {"uploadDate": 1}, sort=[("uploadDate", -1)])
+        return count, _truncate_ms(latest.get("uploadDate") if latest else None)
+
+    def etag(self, db, key: str) -> str:
+        """
+        Retourne l'ETag courant d'un historique
+
+        La version en mémoire est utilisée tant qu'elle a moins de
+        HISTORY_CACHE_TTL secondes; au-delà, elle est relue dans MongoDB et la
+        page en cache est abandonnée si elle a changé.
+        """
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and now - entry["checked_at"] < HISTORY_CACHE_TTL:
+                self.entries.move_to_end(key)
+                return make_etag(key, entry["count"], entry["latest"])
+
+        count, latest = self._load_version(db, key)
+        with self.lock:
+            self.stats["revalidations"] += 1
+            entry = self.entries.get(key)
+            if entry is None or (entry["count"], entry["latest"]) != (count, latest):
+                entry = {"count": count, "latest": latest, "body": None}
+            entry["checked_at"] = now
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_users:
+                self.entries.popitem(last=False)
+            return make_etag(key, count, latest)
+
+    def get_body(self, db, key: str, load: Callable[[], List[Dict]]) -> Tuple[str, List[Dict]]:
+        """
+        Retourne la page d'historique et son ETag (chargée si absente du cache)
+
+        Args:
+            db: Base MongoDB
+            key: Clé de l'historique
+            load: Fonction de lecture de la page dans MongoDB
+
+        Returns:
+            Tuple (ETag, page d'historique)
+        """
+        etag = self.etag(db, key)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry["body"] is not None:
+                self.stats["hits"] += 1
+                return etag, entry["body"]
+            self.stats["misses"] += 1
+
+        body = load()
+        with self.lock:
+            entry = self.entries.get(key)
+            # Page conservée seulement si aucune écriture n'a changé la version entre-temps
+            if entry is not None and make_etag(key, entry["count"], entry["latest"]) == etag:
+                entry["body"] = body
+        return etag, body
+
+    def record_insert(self, docs: List[Dict]):
+        """
+        Fait évoluer la version des historiques touchés par des analyses écrites
+
+        Args:
+            docs: Documents insérés dans db.analyses
+        """
+        touched = {}
+        for doc in docs:
+            upload_date = _truncate_ms(doc.get("uploadDate"))
+            for key in {history_key(doc.get("userId")), PUBLIC_KEY}:
+                count, latest = touched.get(key, (0, None))
+                if upload_date is not None and (latest is None or upload_date > latest):
+                    latest = upload_date
+                touched[key] = (count + 1, latest)
+
+        with self.lock:
+            for key, (count, latest) in touched.items():
+                entry = self.entries.get(key)
+                if entry is None:
+                    continue  # Version lue dans MongoDB à la prochaine requête
+                entry["count"] += count
+                if latest is not None and (entry["latest"] is None or latest > entry["latest"]):
+                    entry["latest"] = latest
+                entry["body"] = None
+
+    def record_not_modified(self):
+        with self.lock:
+            self.stats["not_modified"] += 1
+
+
+class DetailCache:
+    """Détails d'analyses formatés, par identifiant (immuables après insertion)"""
+
+    def __init__(self, size: int):
+        self.entries = OrderedDict()  # identifiant -> (userId propriétaire, détail)
+        self.size = size
+        self.lock = threading.Lock()
+
+    def get(self, analysis_id: str) -> Optional[Tuple[Optional[str], Dict]]:
+        with self.lock:
+            entry = self.entries.get(analysis_id)
+            if entry is not None:
+                self.entries.move_to_end(analysis_id)
+            return entry
+
+    def put(self, analysis_id: str, owner_id: Optional[str], detail: Dict):
+        with self.lock:
+            self.entries[analysis_id] = (owner_id, detail)
+            self.entries.move_to_end(analysis_id)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+
+def detail_etag(analysis_id: str) -> str:
+    """ETag du détail d'une analyse (dépend seulement de l'identifiant et du format)"""
+    return f"{analysis_id}-v{STORAGE_VERSION}"
+
+
+_history_cache = HistoryCache(HISTORY_CACHE_MAX_USERS)
+_detail_cache = DetailCache(DETAIL_CACHE_SIZE)
+
+
+def get_history_cache() -> HistoryCache:
+    return _history_cache
+
+
+def get_detail_cache() -> DetailCache:
+    return _detail_cache
+
+
+def record_analyses_inserted(docs: List[Dict]):
+    """Invalide les historiques concernés par des analyses écrites dans MongoDB"""
+    if HISTORY_CACHE_ENABLED and docs:
+        _history_cache.record_insert(docs)
+
+
+def get_history_cache_stats() -> Dict:
+    """Compteurs du cache d'historique (pour /api/health)"""
+    with _history_cache.lock:
+        stats = dict(_history_cache.stats)
+        stats.update({"enabled": HISTORY_CACHE_ENABLED, "users": len(_history_cache.entries),
+                      "details": len(_detail_cache.entries)})
+    return stats
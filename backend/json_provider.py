@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Module de sérialisation JSON des réponses
+Fournisseur JSON Flask fondé sur orjson (repli sur la bibliothèque standard)
+qui sérialise nativement ObjectId et datetime: les routes renvoient les
+documents MongoDB sans conversion champ par champ
+"""
+
+import json
+from datetime import date, datetime
+from typing import Any, Union
+from bson import ObjectId
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+    print("orjson non installé: sérialisation JSON standard")
+
+# Options orjson: clés non textuelles tolérées (ex: compteurs indexés par entier)
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+
+
+def _default(o: Any) -> Any:
+    """Types non sérialisables nativement"""
+    if isinstance(o, ObjectId):
+        return str(o)
+    if isinstance(o, (datetime, date)):
+        return o.isoformat()  # Même format qu'orjson (utilisé par le repli standard)
+    if isinstance(o, (set, frozenset, tuple)):
+        return list(o)
+    if isinstance(o, bytes):
+        return o.decode("utf-8", errors="replace")
+    raise TypeError(f"Objet de type {type(o).__name__} non sérialisable en JSON")
+
+
+def dumps_bytes(obj: Any) -> bytes:
+    """
+    Sérialise en JSON compact (UTF-8)
+
+    Args:
+        obj: Valeur à sérialiser (ObjectId et datetime acceptés)
+
+    Returns:
+        JSON encodé en UTF-8
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=ORJSON_OPTIONS)
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONProvider(JSONProvider):
+    """Fournisseur JSON de l'application (jsonify, request.get_json)"""
+
+    mimetype = "application/json"
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return dumps_bytes(obj).decode("utf-8")
+
+    def loads(self, s: Union[str, bytes], **kwargs: Any) -> Any:
+        if orjson is not None:
+            return orjson.loads(s)
+        return json.loads(s)
+
+    def response(self, *args: Any, **kwargs: Any):
+        """Réponse JSON construite directement en octets (sans passer par une chaîne)"""
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj), mimetype=self.mimetype)
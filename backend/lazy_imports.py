@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Module de chargement différé des dépendances lourdes
+Les bibliothèques coûteuses à importer (PyMuPDF, numpy/scipy, client Groq,
+modèles NLP) ne sont chargées qu'à la première utilisation par une étape du
+pipeline: un worker démarre et répond à /api/health sans les attendre.
+pymongo et bson restent importés au démarrage, volontairement: ObjectId et
+les exceptions pymongo servent dans presque toutes les routes et dans des
+clauses except (qui exigent la classe réelle), pour environ 0,1 s de
+chargement; seule la connexion (MongoClient, database.py) est différée
+"""
+
+import time
+import threading
+import importlib
+import importlib.util
+from typing import Dict
+
+_load_times = {}
+_load_lock = threading.RLock()
+
+
+def is_installed(name: str) -> bool:
+    """Indique si un module est installé, sans l'importer"""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+class LazyModule:
+    """Module importé au premier accès à l'un de ses attributs"""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def load(self):
+        """Importe le module (une seule fois) et mesure la durée du chargement"""
+        if self._module is None:
+            with _load_lock:
+                if self._module is None:
+                    started_at = time.perf_counter()
+                    module = importlib.import_module(self._name)
+                    _load_times[self._name] = int((time.perf_counter() - started_at) * 1000)
+                    self._module = module
+        return self._module
+
+    def __getattr__(self, attribute):
+        return getattr(self.load(), attribute)
+
+    def __repr__(self):
+        state = "chargé" if self._module is not None else "non chargé"
+        return f"<module différé {self._name} ({state})>"
+
+
+def lazy_import(name: str) -> LazyModule:
+    """
+    Déclare un module à charger à la première utilisation
+
+    Args:
+        name: Nom du module (ex: "fitz", "scipy.sparse", "spacy")
+
+    Returns:
+        Objet se comportant comme le module
+    """
+    return LazyModule(name)
+
+
+def get_load_times() -> Dict[str, int]:
+    """Durée de chargement (ms) des modules différés déjà importés"""
+    with _load_lock:
+        return dict(_load_times)
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Module d'analyse des réponses LLM
+Extrait le premier objet JSON équilibré d'une réponse (balises de code et
+texte parasite tolérés) en temps linéaire, y compris sur un flux de fragments,
+puis valide la structure attendue par le frontend
+"""
+
+import json
+from typing import Dict, Iterable, List, Optional
+
+REQUIRED_FIELDS = ("summary", "keyPoints", "actions")
+
+
+class JSONObjectScanner:
+    """Scanner incrémental des objets JSON de premier niveau d'un flux de texte"""
+
+    def __init__(self):
+        self.buffer = []
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+
+    def feed(self, chunk: str) -> List[str]:
+        """
+        Consomme un fragment de texte
+
+        Chaque caractère n'est examiné qu'une seule fois, quel que soit le
+        découpage du flux.
+
+        Args:
+            chunk: Fragment de la réponse
+
+        Returns:
+            Liste des objets JSON (texte brut) complétés par ce fragment
+        """
+        completed = []
+        for char in chunk:
+            if self.depth == 0:
+                # Hors objet: on ignore tout jusqu'à la prochaine accolade ouvrante
+                if char == '{':
+                    self.depth = 1
+                    self.buffer = [char]
+                continue
+
+            self.buffer.append(char)
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char == '{':
+                self.depth += 1
+            elif char == '}':
+                self.depth -= 1
+                if self.depth == 0:
+                    completed.append(''.join(self.buffer))
+                    self.buffer = []
+        return completed
+
+
+def validate_analysis(data) -> Dict:
+    """
+    Valide et normalise la structure {summary, keyPoints, actions}
+
+    Args:
+        data: Objet JSON décodé
+
+    Returns:
+        Dictionnaire conforme
+
+    Raises:
+        ValueError: Si la structure est incomplète ou invalide
+    """
+    if not isinstance(data, dict) or not all(key in data for key in REQUIRED_FIELDS):
+        raise ValueError("Structure JSON incomplète")
+    if not isinstance(data["summary"], str):
+        raise ValueError("Le champ summary doit être une chaîne")
+    for field in ("keyPoints", "actions"):
+        value = data[field]
+        if isinstance(value, str):
+            value = [value]
+        if not isinstance(value, list):
+            raise ValueError(f"Le champ {field} doit être une liste")
+        data[field] = [item if isinstance(item, str) else json.dumps(item, ensure_ascii=False) for item in value]
+    return data
+
+
+def parse_analysis_chunks(chunks: Iterable[str]) -> Optional[Dict]:
+    """
+    Retourne la première analyse valide trouvée dans un flux de fragments
+
+    La lecture s'arrête dès qu'un objet conforme est complet.
+
+    Args:
+        chunks: Fragments successifs de la réponse LLM
+
+    Returns:
+        Analyse validée, ou None si aucun objet conforme
+    """
+    scanner = JSONObjectScanner()
+    for chunk in chunks:
+        for candidate in scanner.feed(chunk):
+            try:
+                return validate_analysis(json.loads(candidate))
+            except ValueError:
+                continue  # json.JSONDecodeError hérite de ValueError
+    return None
+
+
+def parse_analysis_response(content: str) -> Optional[Dict]:
+    """
+    Analyse une réponse LLM complète
+
+    Args:
+        content: Texte de la réponse (éventuellement entouré de ``` ou de texte)
+
+    Returns:
+        Analyse validée, ou None si aucun objet conforme
+    """
+    if not content:
+        return None
+    return parse_analysis_chunks((content,))
@@ -1,46 +1,22 @@
-from groq import Groq
 import os
-import json
-import requests
+import threading
+import time
 from dotenv import load_dotenv
+from token_budget import pack_document, LLM_MAX_OUTPUT_TOKENS
+from llm_response import parse_analysis_response
+from ollama_session import get_ollama_session, start_ollama_prewarm, OLLAMA_MODEL
+from lazy_imports import lazy_import
 
 # Charger les variables d'environnement depuis .env
 load_dotenv(dotenv_path='../.env')
 
 # Configuration
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
-OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.2:3b")
 USE_LOCAL_MODEL = os.getenv("USE_LOCAL_MODEL", "false").lower() == "true"
+GROQ_MODEL = os.getenv("GROQ_MODEL", "llama3-70b-8192")
 
-# Initialiser le client Groq avec gestion d'erreur
-try:
-    if not GROQ_API_KEY:
-        print("GROQ_API_KEY non trouvée dans les variables d'environnement")
-        groq_client = None
-    else:
-        groq_client = Groq(api_key=GROQ_API_KEY)
-except Exception as e:
-    print(f"Erreur lors de l'initialisation de Groq: {e}")
-    groq_client = None
-
-def check_ollama_available():
-    """Vérifier si Ollama est disponible localement"""
-    try:
-        response = requests.get(f"{OLLAMA_BASE_URL}/api/tags", timeout=5)
-        return response.status_code == 200
-    except:
-        return False
-
-def summarize_with_ollama(text):
-    """Utiliser Ollama pour la synthèse de texte"""
-    try:
-        # Limiter le texte pour éviter de dépasser les limites
-        max_chars = 12000  # Modèles locaux ont généralement moins de tokens
-        if len(text) > max_chars:
-            text = text[:max_chars] + "..."
-
-        system_prompt = """Tu es un assistant expert en analyse de documents. 
+# Prompt structuré pour obtenir le format attendu par le frontend
+SYSTEM_PROMPT = """Tu es un assistant expert en analyse de documents. 
 Analyse le document fourni et retourne une réponse en JSON avec exactement cette structure:
 {
     "summary": "Un résumé détaillé du document en français",
@@ -49,106 +25,153 @@ Analyse le document fourni et retourne une réponse en JSON avec exactement cett
 }
 
 Assure-toi que:
-- Le résumé soit complet et informatif (200-300 mots)
+- Le résumé soit complet et informatif (200-300 mots, sauf longueur indiquée dans la demande)
 - Les points clés soient les éléments les plus importants du document
 - Les actions soient des recommandations concrètes et réalisables
 - La réponse soit uniquement en JSON valide, sans autre texte"""
 
-        payload = {
-            "model": OLLAMA_MODEL,
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"Analyse ce document:\n\n{text}"}
-            ],
-            "stream": False,
-            "options": {
-                "temperature": 0.3,
-                "num_predict": 1500
-            }
-        }
+USER_PREFIX = "Analyse ce document:\n\n"
 
-        response = requests.post(
-            f"{OLLAMA_BASE_URL}/api/chat",
-            json=payload,
-            timeout=60
-        )
-        
-        if response.status_code != 200:
-            raise Exception(f"Erreur Ollama: {response.status_code}")
+# Prompt de mise à jour d'une analyse existante (révision d'un document)
+REVISION_SYSTEM_PROMPT = """Tu es un assistant expert en analyse de documents. 
+Une nouvelle version d'un document déjà analysé t'est fournie: tu reçois l'analyse précédente 
+et uniquement les pages modifiées ou ajoutées. Mets à jour l'analyse et retourne une réponse 
+en JSON avec exactement cette structure:
+{
+    "summary": "Le résumé complet mis à jour, en français",
+    "keyPoints": ["Point clé 1", "Point clé 2", "Point clé 3"],
+    "actions": ["Action recommandée 1", "Action recommandée 2", "Action recommandée 3"]
+}
+
+Assure-toi que:
+- Les éléments de l'analyse précédente toujours valables soient conservés
+- Les changements des pages modifiées soient intégrés au résumé, aux points clés et aux actions
+- La réponse soit uniquement en JSON valide, sans autre texte"""
+
+# Client Groq créé au premier appel (le SDK est long à importer)
+groq = lazy_import("groq")
+_groq_client = None
+_groq_lock = threading.Lock()
+
+if not GROQ_API_KEY:
+    print("GROQ_API_KEY non trouvée dans les variables d'environnement")
+
+def get_groq_client():
+    """Retourner le client Groq (None si non configuré ou en erreur)"""
+    global _groq_client
+    if not GROQ_API_KEY:
+        return None
+    with _groq_lock:
+        if _groq_client is None:
+            # Initialiser le client Groq avec gestion d'erreur
+            try:
+                _groq_client = groq.Groq(api_key=GROQ_API_KEY)
+            except Exception as e:
+                print(f"Erreur lors de l'initialisation de Groq: {e}")
+                return None
+        return _groq_client
+
+def check_ollama_available():
+    """Vérifier si Ollama est disponible localement"""
+    return get_ollama_session().is_available()
+
+def prewarm_local_model():
+    """Pré-charger le modèle Ollama au démarrage (modèle local uniquement)"""
+    if USE_LOCAL_MODEL:
+        start_ollama_prewarm(SYSTEM_PROMPT)
 
-        result = response.json()
+def build_usage(backend, budget_stats, input_tokens, output_tokens, started_at):
+    """Construire le rapport de consommation de tokens d'un appel LLM"""
+    usage = {
+        "backend": backend,
+        "model": budget_stats["model"],
+        "tokenizer": budget_stats["tokenizer"],
+        "estimated_input_tokens": budget_stats["estimated_input_tokens"],
+        "input_tokens": input_tokens if input_tokens is not None else budget_stats["estimated_input_tokens"],
+        "output_tokens": output_tokens or 0,
+        "pages_included": budget_stats["pages_included"],
+        "pages_total": budget_stats["pages_total"],
+        "latency_ms": int((time.perf_counter() - started_at) * 1000)
+    }
+    print(f"Tokens {backend}: {usage['input_tokens']} en entrée, {usage['output_tokens']} en sortie, "
+          f"{usage['pages_included']}/{usage['pages_total']} pages, {usage['latency_ms']} ms")
+    return usage
+
+def classify_llm_error(error):
+    """
+    Nature d'un échec d'appel LLM
+
+    Args:
+        error: Exception levée par le client Groq ou la session Ollama
+
+    Returns:
+        "rate_limited" (limite de débit, serveur saturé), "timeout" ou "error"
+    """
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if status in (429, 503):
+        return "rate_limited"
+    if "timeout" in type(error).__name__.lower():
+        return "timeout"
+    return "error"
+
+def summarize_with_ollama(text, system_prompt=SYSTEM_PROMPT, user_prefix=USER_PREFIX,
+                          max_output_tokens=LLM_MAX_OUTPUT_TOKENS, temperature=0.3):
+    """Utiliser Ollama pour la synthèse de texte"""
+    try:
+        # Remplir la fenêtre de contexte avec un maximum de pages entières
+        started_at = time.perf_counter()
+        text, budget_stats = pack_document(text, OLLAMA_MODEL, system_prompt, user_prefix, max_output_tokens)
+
+        # Prompt système en tête: préfixe réutilisé depuis le cache KV du serveur
+        result = get_ollama_session().chat(
+            system_prompt,
+            f"{user_prefix}{text}",
+            options={"temperature": temperature, "num_predict": max_output_tokens},
+            response_format="json"  # Sortie JSON contrainte côté Ollama
+        )
         content = result['message']['content'].strip()
+        usage = build_usage("ollama", budget_stats, result.get("prompt_eval_count"),
+                            result.get("eval_count"), started_at)
         
-        try:
-            # Nettoyer le contenu des backticks et du markdown
-            cleaned_content = content.strip()
-            
-            # Enlever les backticks et le label json si présents
-            if cleaned_content.startswith("```json"):
-                cleaned_content = cleaned_content[7:]  # Enlever ```json
-            if cleaned_content.startswith("```"):
-                cleaned_content = cleaned_content[3:]  # Enlever ```
-            if cleaned_content.endswith("```"):
-                cleaned_content = cleaned_content[:-3]  # Enlever ```
-            
-            cleaned_content = cleaned_content.strip()
-            
-            # Essayer de parser le JSON
-            parsed_result = json.loads(cleaned_content)
-            
-            # Valider la structure
-            if not all(key in parsed_result for key in ["summary", "keyPoints", "actions"]):
-                raise ValueError("Structure JSON incomplète")
-                
+        # Extraire la première analyse JSON valide (balises ``` et texte parasite tolérés)
+        parsed_result = parse_analysis_response(content)
+        if parsed_result is not None:
+            parsed_result["usage"] = usage
             return parsed_result
-            
-        except json.JSONDecodeError as e:
-            # Si le parsing JSON échoue, essayer d'extraire le contenu utile
-            print(f"Erreur de parsing JSON Ollama: {e}")
-            print(f"Contenu reçu: {content}")
-            
-            # Essayer d'extraire le JSON même s'il y a du texte autour
-            import re
-            json_pattern = r'\{.*"summary".*"keyPoints".*"actions".*\}'
-            json_match = re.search(json_pattern, content, re.DOTALL)
-            
-            if json_match:
-                try:
-                    extracted_json = json_match.group(0)
-                    parsed_result = json.loads(extracted_json)
-                    if all(key in parsed_result for key in ["summary", "keyPoints", "actions"]):
-                        print("JSON extrait avec succès malgré le formatage")
-                        return parsed_result
-                except:
-                    pass
-            
-            # Si tout échoue, créer une structure par défaut
-            return {
-                "summary": content if content else "Résumé non disponible (Ollama)",
-                "keyPoints": ["Analyse en cours...", "Points clés à identifier", "Données en traitement"],
-                "actions": ["Vérifier le document", "Réessayer l'analyse", "Contacter le support si nécessaire"]
-            }
+        
+        # Si tout échoue, créer une structure par défaut
+        print(f"Erreur de parsing JSON Ollama. Contenu reçu: {content}")
+        return {
+            "summary": content if content else "Résumé non disponible (Ollama)",
+            "keyPoints": ["Analyse en cours...", "Points clés à identifier", "Données en traitement"],
+            "actions": ["Vérifier le document", "Réessayer l'analyse", "Contacter le support si nécessaire"],
+            "usage": usage
+        }
     
     except Exception as e:
         print(f"Erreur lors de l'appel à Ollama: {e}")
         return {
+            "failure": classify_llm_error(e),
             "summary": f"Erreur lors de l'analyse (Ollama): {str(e)}",
             "keyPoints": ["Document reçu", "Erreur technique rencontrée", "Analyse interrompue"],
             "actions": ["Vérifier qu'Ollama est installé et en cours d'exécution", "Réessayer dans quelques minutes", "Basculer vers l'API externe"]
         }
 
-def summarize_text(text):
+def summarize_text(text, system_prompt=SYSTEM_PROMPT, user_prefix=USER_PREFIX,
+                   max_output_tokens=LLM_MAX_OUTPUT_TOKENS, temperature=0.3):
     """Fonction principale de synthèse avec fallback automatique"""
     
     # Si on a configuré l'utilisation du modèle local et qu'Ollama est disponible
     if USE_LOCAL_MODEL and check_ollama_available():
         print("Utilisation du modèle local Ollama")
-        return summarize_with_ollama(text)
+        return summarize_with_ollama(text, system_prompt, user_prefix, max_output_tokens, temperature)
     
     # Fallback vers Groq si disponible
-    if groq_client is not None:
+    if get_groq_client() is not None:
         print("Utilisation de l'API Groq externe")
-        return summarize_with_groq(text)
+        return summarize_with_groq(text, system_prompt, user_prefix, max_output_tokens, temperature)
     
     # Si aucun service n'est disponible
     return {
@@ -157,8 +180,10 @@ def summarize_text(text):
         "actions": ["Installer Ollama localement", "Configurer GROQ_API_KEY", "Redémarrer l'application"]
     }
 
-def summarize_with_groq(text):
+def summarize_with_groq(text, system_prompt=SYSTEM_PROMPT, user_prefix=USER_PREFIX,
+                        max_output_tokens=LLM_MAX_OUTPUT_TOKENS, temperature=0.3):
     """Utiliser Groq pour la synthèse de texte (fonction existante)"""
+    groq_client = get_groq_client()
     if groq_client is None:
         return {
             "summary": "Erreur: Client Groq non initialisé",
@@ -167,62 +192,48 @@ def summarize_with_groq(text):
         }
     
     try:
-        # Limiter le texte pour éviter de dépasser les limites de tokens
-        max_chars = 15000  # Groq peut gérer plus de texte
-        if len(text) > max_chars:
-            text = text[:max_chars] + "..."
-
-        # Prompt structuré pour obtenir le format attendu par le frontend
-        system_prompt = """Tu es un assistant expert en analyse de documents. 
-Analyse le document fourni et retourne une réponse en JSON avec exactement cette structure:
-{
-    "summary": "Un résumé détaillé du document en français",
-    "keyPoints": ["Point clé 1", "Point clé 2", "Point clé 3"],
-    "actions": ["Action recommandée 1", "Action recommandée 2", "Action recommandée 3"]
-}
-
-Assure-toi que:
-- Le résumé soit complet et informatif (200-300 mots)
-- Les points clés soient les éléments les plus importants du document
-- Les actions soient des recommandations concrètes et réalisables
-- La réponse soit uniquement en JSON valide, sans autre texte"""
+        # Remplir la fenêtre de contexte avec un maximum de pages entières
+        started_at = time.perf_counter()
+        text, budget_stats = pack_document(text, GROQ_MODEL, system_prompt, user_prefix, max_output_tokens)
 
         response = groq_client.chat.completions.create(
-            model="llama3-70b-8192",  # Modèle Groq pour l'analyse de texte
+            model=GROQ_MODEL,  # Modèle Groq pour l'analyse de texte
             messages=[
                 {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"Analyse ce document:\n\n{text}"}
+                {"role": "user", "content": f"{user_prefix}{text}"}
             ],
-            max_tokens=1500,
-            temperature=0.3
+            max_tokens=max_output_tokens,
+            temperature=temperature,
+            response_format={"type": "json_object"}  # Mode JSON de Groq
         )
         
         # Extraire et parser la réponse JSON
         content = response.choices[0].message.content.strip()
+        response_usage = getattr(response, "usage", None)
+        usage = build_usage("groq", budget_stats,
+                            getattr(response_usage, "prompt_tokens", None),
+                            getattr(response_usage, "completion_tokens", None), started_at)
         
-        try:
-            # Essayer de parser le JSON directement
-            result = json.loads(content)
-            
-            # Valider la structure
-            if not all(key in result for key in ["summary", "keyPoints", "actions"]):
-                raise ValueError("Structure JSON incomplète")
-                
-            return result
-            
-        except json.JSONDecodeError:
-            # Si le parsing JSON échoue, créer une structure par défaut
-            print(f"Erreur de parsing JSON. Contenu reçu: {content}")
-            return {
-                "summary": content if content else "Résumé non disponible",
-                "keyPoints": ["Analyse en cours...", "Points clés à identifier", "Données en traitement"],
-                "actions": ["Vérifier le document", "Réessayer l'analyse", "Contacter le support si nécessaire"]
-            }
+        # Extraire la première analyse JSON valide (texte parasite toléré)
+        parsed_result = parse_analysis_response(content)
+        if parsed_result is not None:
+            parsed_result["usage"] = usage
+            return parsed_result
+        
+        # Si le parsing JSON échoue, créer une structure par défaut
+        print(f"Erreur de parsing JSON. Contenu reçu: {content}")
+        return {
+            "summary": content if content else "Résumé non disponible",
+            "keyPoints": ["Analyse en cours...", "Points clés à identifier", "Données en traitement"],
+            "actions": ["Vérifier le document", "Réessayer l'analyse", "Contacter le support si nécessaire"],
+            "usage": usage
+        }
     
     except Exception as e:
         print(f"Erreur lors de l'appel à Groq: {e}")
         # Retourner une structure par défaut en cas d'erreur
         return {
+            "failure": classify_llm_error(e),
             "summary": f"Erreur lors de l'analyse: {str(e)}",
             "keyPoints": ["Document reçu", "Erreur technique rencontrée", "Analyse interrompue"],
             "actions": ["Vérifier votre clé API Groq", "Réessayer dans quelques minutes", "Contacter le support technique"]
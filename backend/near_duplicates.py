@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Module de détection des quasi-doublons
+Calcule une signature MinHash sur les shingles de mots du texte extrait et
+l'indexe dans MongoDB par bandes LSH pour retrouver en temps sous-linéaire
+une analyse antérieure d'un document presque identique
+"""
+
+import os
+import re
+import hashlib
+import threading
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from bson import ObjectId
+from dotenv import load_dotenv
+
+from analysis_store import decode_analysis
+from lazy_imports import lazy_import, is_installed
+
+load_dotenv(dotenv_path='../.env')
+
+# numpy chargé au premier calcul de signature
+NEAR_DUPLICATES_AVAILABLE = is_installed("numpy")
+if NEAR_DUPLICATES_AVAILABLE:
+    np = lazy_import("numpy")
+else:
+    print("numpy non installé: détection des quasi-doublons désactivée")
+
+# Configuration
+NEAR_DUPLICATES_ENABLED = os.getenv("NEAR_DUPLICATES_ENABLED", "true").lower() == "true"
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.8"))  # Signalé à l'utilisateur
+NEAR_DUPLICATE_REUSE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_REUSE_THRESHOLD", "0.97"))  # Analyse réutilisée
+
+SHINGLE_SIZE = 5
+NUM_PERMUTATIONS = 128
+LSH_BANDS = 32  # 32 bandes de 4 lignes: seuil de collision ~ (1/32)^(1/4) ≈ 0.42
+LSH_ROWS = NUM_PERMUTATIONS // LSH_BANDS
+MAX_CANDIDATES = 50
+SHINGLE_BLOCK = 8192
+
+MERSENNE_PRIME = (1 << 61) - 1
+WORD_PATTERN = re.compile(r'\w+')
+PAGE_MARKER_PATTERN = re.compile(r'^--- Page \d+ ---$', re.MULTILINE)
+
+_indexes_ready = False
+_indexes_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1)
+def permutations() -> Tuple["np.ndarray", "np.ndarray"]:
+    """Permutations fixes (a*x + b) mod p: les signatures restent comparables entre redémarrages"""
+    rng = np.random.RandomState(20240613)
+    perm_a = rng.randint(1, 1 << 29, size=NUM_PERMUTATIONS).astype(np.uint64)
+    perm_b = rng.randint(0, 1 << 60, size=NUM_PERMUTATIONS, dtype=np.int64).astype(np.uint64)
+    return perm_a, perm_b
+
+
+def shingle_hashes(text: str) -> "np.ndarray":
+    """
+    Empreintes 32 bits des shingles de SHINGLE_SIZE mots du texte
+
+    Args:
+        text: Texte extrait
+
+    Returns:
+        Tableau uint64 d'empreintes uniques
+    """
+    words = WORD_PATTERN.findall(PAGE_MARKER_PATTERN.sub(' ', text).lower())
+    if len(words) < SHINGLE_SIZE:
+        words = words + [''] * (SHINGLE_SIZE - len(words))
+    hashes = {
+        int.from_bytes(
+            hashlib.blake2b(' '.join(words[i:i + SHINGLE_SIZE]).encode('utf-8'), digest_size=4).digest(), 'little'
+        )
+        for i in range(len(words) - SHINGLE_SIZE + 1)
+    }
+    return np.fromiter(hashes, dtype=np.uint64, count=len(hashes))
+
+
+def compute_signature(text: str) -> Optional[List[int]]:
+    """
+    Calcule la signature MinHash du texte
+
+    Args:
+        text: Texte extrait
+
+    Returns:
+        Liste de NUM_PERMUTATIONS entiers, ou None si la détection est désactivée
+    """
+    if not NEAR_DUPLICATES_ENABLED or not NEAR_DUPLICATES_AVAILABLE or not text:
+        return None
+    shingles = shingle_hashes(text)
+    perm_a, perm_b = permutations()
+    signature = np.full(NUM_PERMUTATIONS, MERSENNE_PRIME, dtype=np.uint64)
+    # Traitement par blocs pour borner la matrice permutations x shingles
+    for start in range(0, len(shingles), SHINGLE_BLOCK):
+        block = shingles[start:start + SHINGLE_BLOCK]
+        permuted = (np.outer(perm_a, block) + perm_b[:, None]) % np.uint64(MERSENNE_PRIME)
+        np.minimum(signature, permuted.min(axis=1), out=signature)
+    return signature.tolist()
+
+
+def signature_bands(signature: List[int]) -> List[str]:
+    """
+    Découpe la signature en bandes LSH indexables
+
+    Args:
+        signature: Signature MinHash
+
+    Returns:
+        Une clé par bande ("numéro:empreinte")
+    """
+    bands = []
+    for band in range(LSH_BANDS):
+        rows = signature[band * LSH_ROWS:(band + 1) * LSH_ROWS]
+        digest = hashlib.blake2b(','.join(map(str, rows)).encode(), digest_size=8).hexdigest()
+        bands.append(f"{band}:{digest}")
+    return bands
+
+
+def estimate_similarity(signature_a: List[int], signature_b: List[int]) -> float:
+    """Estime la similarité de Jaccard à partir de deux signatures"""
+    if not signature_a or not signature_b or len(signature_a) != len(signature_b):
+        return 0.0
+    return float(np.mean(np.asarray(signature_a) == np.asarray(signature_b)))
+
+
+def ensure_indexes(db):
+    """Crée l'index multiclé des bandes LSH (une seule fois par processus)"""
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    with _indexes_lock:
+        if not _indexes_ready:
+            db.analyses.create_index([("userId", 1), ("minhashBands", 1)], name="near_duplicates")
+            _indexes_ready = True
+
+
+def find_near_duplicate(db, signature: Optional[List[int]], user_id: Optional[str]) -> Optional[Dict]:
+    """
+    Recherche l'analyse la plus similaire parmi celles de l'utilisateur
+
+    Seules les analyses du même utilisateur sont candidates, pour ne jamais
+    exposer le document d'un autre compte.
+
+    Args:
+        db: Base MongoDB
+        signature: Signature MinHash du nouveau document
+        user_id: Identifiant de l'utilisateur connecté
+
+    Returns:
+        {analysisId, fileName, similarity, analysis} ou None
+    """
+    if signature is None or not user_id:
+        return None
+
+    ensure_indexes(db)
+    candidates = db.analyses.find(
+        {"userId": ObjectId(user_id), "minhashBands": {"$in": signature_bands(signature)}},
+        {"filename": 1, "summary": 1, "keyPoints": 1, "actions": 1, "payload": 1, "minhash": 1,
+         "anonymizedAnalysis": 1, "anonymizationMap": 1}
+    ).limit(MAX_CANDIDATES)
+
+    best = None
+    for candidate in candidates:
+        similarity = estimate_similarity(signature, candidate.get("minhash"))
+        if similarity >= NEAR_DUPLICATE_THRESHOLD and (best is None or similarity > best["similarity"]):
+            best = {
+                "analysisId": str(candidate["_id"]),
+                "fileName": candidate.get("filename", ""),
+                "similarity": round(similarity, 3),
+                "analysis": candidate
+            }
+    if best is not None:
+        decode_analysis(best["analysis"])
+    return best
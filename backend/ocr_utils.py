@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Module d'OCR local pour les PDF scannés
+Rend uniquement les pages sans couche texte, les reconnaît avec Tesseract
+via l'intégration OCR de PyMuPDF dans un pool de processus (CPU, hors ligne)
+et met en cache le texte par empreinte de l'image de page
+"""
+
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import multiprocessing
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+from lazy_imports import lazy_import
+
+load_dotenv(dotenv_path='../.env')
+
+fitz = lazy_import("fitz")  # PyMuPDF, chargé à la première utilisation
+
+# Configuration
+OCR_ENABLED = os.getenv("OCR_ENABLED", "true").lower() == "true"
+OCR_DPI = int(os.getenv("OCR_DPI", "300"))
+OCR_LANGUAGE = os.getenv("OCR_LANGUAGE", "fra+eng")
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+OCR_CACHE_SIZE = int(os.getenv("OCR_CACHE_SIZE", "2048"))  # Nombre de pages en cache
+OCR_PAGE_TIMEOUT = int(os.getenv("OCR_PAGE_TIMEOUT", "120"))
+# Pages rendues en attente d'OCR au plus (mémoire bornée pour les gros scans)
+OCR_MAX_PENDING = int(os.getenv("OCR_MAX_PENDING", str(2 * OCR_WORKERS)))
+
+_executor = None
+_executor_lock = threading.Lock()
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_tessdata = None
+
+
+def get_tessdata() -> Optional[str]:
+    """
+    Localise les données Tesseract (TESSDATA_PREFIX ou installation système)
+
+    Returns:
+        Chemin tessdata, ou None si Tesseract n'est pas installé
+    """
+    global _tessdata
+    if _tessdata is None:
+        try:
+            _tessdata = fitz.get_tessdata()
+        except Exception:
+            _tessdata = ""
+    return _tessdata or None
+
+
+def is_ocr_available() -> bool:
+    """Indique si l'OCR local peut être utilisé"""
+    return OCR_ENABLED and get_tessdata() is not None
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """Retourne le pool de processus OCR (créé au premier besoin)"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn: pas d'héritage de l'état MuPDF/threads du serveur. Chaque
+            # processus ré-importe le script principal (app.py) sous le nom
+            # __mp_main__: celui-ci ne démarre aucun service hors de son bloc __main__
+            _executor = ProcessPoolExecutor(
+                max_workers=OCR_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _executor
+
+
+def ocr_image(png_bytes: bytes, language: str, tessdata: str) -> str:
+    """
+    Reconnaît le texte d'une image de page (exécuté dans un processus du pool)
+
+    Args:
+        png_bytes: Image PNG de la page
+        language: Langues Tesseract (ex: fra+eng)
+        tessdata: Chemin des données Tesseract
+
+    Returns:
+        Texte reconnu
+    """
+    pixmap = fitz.Pixmap(png_bytes)
+    pdf_bytes = pixmap.pdfocr_tobytes(language=language, tessdata=tessdata)
+    with fitz.open("pdf", pdf_bytes) as ocr_doc:
+        return ocr_doc[0].get_text()
+
+
+def cache_get(key: str) -> Optional[str]:
+    """Lit le texte OCR d'une image de page en cache (LRU)"""
+    with _cache_lock:
+        text = _cache.get(key)
+        if text is not None:
+            _cache.move_to_end(key)
+        return text
+
+
+def cache_put(key: str, text: str):
+    """Enregistre le texte OCR d'une image de page en cache (LRU)"""
+    with _cache_lock:
+        _cache[key] = text
+        _cache.move_to_end(key)
+        while len(_cache) > OCR_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def ocr_pages(doc: "fitz.Document", page_indexes: List[int]) -> Tuple[Dict[int, str], Dict]:
+    """
+    Applique l'OCR aux pages demandées
+
+    Chaque page est rendue au DPI configuré; l'empreinte SHA-256 de l'image
+    sert de clé de cache, de sorte qu'une page déjà reconnue (ré-upload,
+    annexe partagée) n'est pas traitée deux fois.
+
+    Args:
+        doc: Document PyMuPDF ouvert
+        page_indexes: Index (base 0) des pages sans couche texte
+
+    Returns:
+        Tuple (texte par index de page, statistiques)
+    """
+    stats = {'ocr_pages': 0, 'ocr_cache_hits': 0}
+    texts = {}
+    tessdata = get_tessdata()
+    if not page_indexes or not OCR_ENABLED or tessdata is None:
+        return texts, stats
+
+    def collect(done):
+        for future in done:
+            page_index, key = pending.pop(future)
+            try:
+                text = future.result()
+            except Exception as e:
+                print(f"Erreur OCR page {page_index + 1}: {e}")
+                continue
+            cache_put(key, text)
+            texts[page_index] = text
+            stats['ocr_pages'] += 1
+
+    # Fenêtre glissante: le rendu d'une page chevauche l'OCR des précédentes,
+    # et seules OCR_MAX_PENDING images sont en mémoire à la fois
+    pending = {}  # future -> (index de page, clé de cache)
+    for page_index in page_indexes:
+        if len(pending) >= OCR_MAX_PENDING:
+            done, _ = wait(pending, timeout=OCR_PAGE_TIMEOUT, return_when=FIRST_COMPLETED)
+            if not done:
+                print(f"OCR interrompu: aucune page reconnue en {OCR_PAGE_TIMEOUT} s")
+                pending.clear()
+                break
+            collect(done)
+
+        # Rendu en niveaux de gris: suffisant pour Tesseract et trois fois plus léger
+        pixmap = doc[page_index].get_pixmap(dpi=OCR_DPI, colorspace=fitz.csGRAY)
+        digest = hashlib.sha256(f"{OCR_DPI}:{OCR_LANGUAGE}:{pixmap.width}x{pixmap.height}:".encode())
+        digest.update(pixmap.samples_mv)
+        key = digest.hexdigest()
+
+        cached = cache_get(key)
+        if cached is not None:
+            texts[page_index] = cached
+            stats['ocr_cache_hits'] += 1
+            continue
+
+        png_bytes = pixmap.tobytes("png")
+        del pixmap
+        pending[get_executor().submit(ocr_image, png_bytes, OCR_LANGUAGE, tessdata)] = (page_index, key)
+
+    while pending:
+        done, _ = wait(pending, timeout=OCR_PAGE_TIMEOUT, return_when=FIRST_COMPLETED)
+        if not done:
+            for page_index, _ in pending.values():
+                print(f"Erreur OCR page {page_index + 1}: délai de {OCR_PAGE_TIMEOUT} s dépassé")
+            break
+        collect(done)
+
+    return texts, stats
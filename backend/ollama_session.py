@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Module de gestion de la session Ollama
+Garde le modèle chargé en mémoire (keep_alive), le pré-charge au démarrage et
+à intervalle régulier avec le prompt système, et envoie toutes les requêtes
+avec les mêmes options de chargement pour que le serveur réutilise le cache
+KV du préfixe commun (prompt système) au lieu de le recalculer
+"""
+
+import os
+import time
+import threading
+from typing import Dict, Optional
+from dotenv import load_dotenv
+
+from token_budget import get_token_counter, OLLAMA_NUM_CTX
+from lazy_imports import lazy_import
+
+load_dotenv(dotenv_path='../.env')
+
+requests = lazy_import("requests")  # Chargé à la première requête vers Ollama
+
+# Configuration
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.2:3b")
+# Durée de maintien du modèle en mémoire après une requête ("-1": indéfiniment)
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_NUM_THREAD = int(os.getenv("OLLAMA_NUM_THREAD", "0"))  # 0: choix d'Ollama (cœurs physiques)
+OLLAMA_PREWARM = os.getenv("OLLAMA_PREWARM", "true").lower() == "true"
+# Intervalle de pré-chargement en l'absence de requête (doit rester inférieur à keep_alive)
+OLLAMA_PREWARM_INTERVAL = int(os.getenv("OLLAMA_PREWARM_INTERVAL", "600"))
+OLLAMA_TIMEOUT = int(os.getenv("OLLAMA_TIMEOUT", "60"))
+OLLAMA_LOAD_TIMEOUT = int(os.getenv("OLLAMA_LOAD_TIMEOUT", "300"))  # Premier chargement du modèle
+OLLAMA_AVAILABILITY_TTL = float(os.getenv("OLLAMA_AVAILABILITY_TTL", "10"))
+
+
+class OllamaSession:
+    """Connexion HTTP persistante et options stables vers un modèle Ollama"""
+
+    def __init__(self, base_url: str, model: str):
+        """
+        Initialise la session
+
+        Args:
+            base_url: URL du serveur Ollama
+            model: Modèle à utiliser
+        """
+        self.base_url = base_url
+        self.model = model
+        self.http = requests.Session()
+        self.last_used = 0.0
+        self.available = None
+        self.available_checked_at = 0.0
+        self.prewarm_thread = None
+        self.lock = threading.Lock()
+
+    def load_options(self) -> Dict:
+        """
+        Options qui déterminent le chargement du modèle
+
+        Elles doivent être identiques d'une requête à l'autre: un changement de
+        num_ctx ou num_thread force Ollama à recharger le modèle et vide son cache.
+        """
+        options = {"num_ctx": OLLAMA_NUM_CTX}
+        if OLLAMA_NUM_THREAD > 0:
+            options["num_thread"] = OLLAMA_NUM_THREAD
+        return options
+
+    def is_available(self) -> bool:
+        """Vérifie que le serveur répond (résultat mémorisé quelques secondes)"""
+        now = time.monotonic()
+        if self.available is not None and now - self.available_checked_at < OLLAMA_AVAILABILITY_TTL:
+            return self.available
+        try:
+            self.available = self.http.get(f"{self.base_url}/api/tags", timeout=5).status_code == 200
+        except requests.RequestException:
+            self.available = False
+        self.available_checked_at = now
+        return self.available
+
+    def chat(self, system_prompt: str, user_content: str, options: Optional[Dict] = None,
+             response_format: Optional[str] = None, timeout: int = OLLAMA_TIMEOUT) -> Dict:
+        """
+        Envoie une requête de chat
+
+        Le prompt système statique est toujours en tête: le serveur retrouve son
+        cache KV et ne traite que la partie propre au document. num_keep protège
+        ce préfixe si le contexte doit être décalé.
+
+        Args:
+            system_prompt: Prompt système (préfixe commun aux requêtes)
+            user_content: Message utilisateur
+            options: Options de génération (température, num_predict...)
+            response_format: Format de sortie contraint ("json")
+            timeout: Délai maximal de la requête
+
+        Returns:
+            Réponse JSON d'Ollama
+        """
+        payload = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_content}
+            ],
+            "stream": False,
+            "keep_alive": OLLAMA_KEEP_ALIVE,
+            "options": {
+                **(options or {}),
+                **self.load_options(),
+                "num_keep": get_token_counter(self.model).count(system_prompt)
+            }
+        }
+        if response_format:
+            payload["format"] = response_format
+
+        response = self.http.post(f"{self.base_url}/api/chat", json=payload, timeout=timeout)
+        self.last_used = time.monotonic()
+        if response.status_code != 200:
+            # HTTPError: le code (503 quand le serveur est saturé) reste lisible par l'appelant
+            raise requests.HTTPError(f"Erreur Ollama: {response.status_code}", response=response)
+        return response.json()
+
+    def prewarm(self, system_prompt: str) -> bool:
+        """
+        Charge le modèle et calcule le cache KV du prompt système
+
+        Args:
+            system_prompt: Prompt système des analyses
+
+        Returns:
+            True si le modèle a répondu
+        """
+        started_at = time.perf_counter()
+        try:
+            result = self.chat(system_prompt, "OK", options={"num_predict": 1}, timeout=OLLAMA_LOAD_TIMEOUT)
+        except Exception as e:
+            print(f"Pré-chargement Ollama impossible: {e}")
+            return False
+        load_ms = int(result.get("load_duration", 0) / 1e6)
+        print(f"Modèle Ollama {self.model} prêt en {int((time.perf_counter() - started_at) * 1000)} ms "
+              f"(chargement {load_ms} ms, keep_alive {OLLAMA_KEEP_ALIVE})")
+        return True
+
+    def start_prewarm(self, system_prompt: str):
+        """
+        Pré-charge le modèle en arrière-plan puis le maintient chaud
+
+        Le modèle est rechargé à chaque intervalle sans requête, avant
+        l'expiration de keep_alive.
+
+        Args:
+            system_prompt: Prompt système des analyses
+        """
+        with self.lock:
+            if self.prewarm_thread is not None and self.prewarm_thread.is_alive():
+                return
+
+            def run():
+                while True:
+                    idle = time.monotonic() - self.last_used
+                    if idle >= OLLAMA_PREWARM_INTERVAL or self.last_used == 0.0:
+                        if self.is_available():
+                            self.prewarm(system_prompt)
+                        idle = 0
+                    time.sleep(max(1, OLLAMA_PREWARM_INTERVAL - idle))
+
+            self.prewarm_thread = threading.Thread(target=run, name="ollama-prewarm", daemon=True)
+            self.prewarm_thread.start()
+
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def get_ollama_session() -> OllamaSession:
+    """Retourne la session Ollama du processus courant"""
+    global _session, _session_pid
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            _session = OllamaSession(OLLAMA_BASE_URL, OLLAMA_MODEL)
+            _session_pid = os.getpid()
+        return _session
+
+
+def start_ollama_prewarm(system_prompt: str):
+    """
+    Lance le pré-chargement du modèle au démarrage du backend
+
+    Args:
+        system_prompt: Prompt système à garder en cache
+    """
+    if OLLAMA_PREWARM:
+        get_ollama_session().start_prewarm(system_prompt)
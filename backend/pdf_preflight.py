@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Module d'inspection préalable des PDF
+Vérifie en quelques millisecondes l'en-tête, la table xref, le nombre de
+pages, le chiffrement et la présence d'une couche texte sur les premières
+pages, avant de lancer le pipeline complet
+"""
+
+import os
+from typing import Dict
+from dotenv import load_dotenv
+
+from lazy_imports import lazy_import
+
+from upload_utils import SpooledUpload, MAX_PDF_PAGES
+from ocr_utils import is_ocr_available
+
+load_dotenv(dotenv_path='../.env')
+
+fitz = lazy_import("fitz")  # PyMuPDF, chargé à la première utilisation
+
+# Configuration
+PREFLIGHT_SAMPLE_PAGES = int(os.getenv("PREFLIGHT_SAMPLE_PAGES", "3"))
+PREFLIGHT_MIN_TEXT_CHARS = int(os.getenv("PREFLIGHT_MIN_TEXT_CHARS", "20"))
+
+# Destinations possibles d'un document après inspection
+ROUTE_TEXT = "text"
+ROUTE_OCR = "ocr"
+ROUTE_REJECT = "reject"
+
+REASON_MESSAGES = {
+    "not_pdf": "Le fichier n'est pas un PDF (en-tête %PDF absent)",
+    "corrupt": "Le PDF est corrompu ou illisible",
+    "encrypted": "Le PDF est protégé par un mot de passe",
+    "empty": "Le PDF ne contient aucune page",
+    "too_many_pages": f"Le PDF dépasse le nombre maximal de pages ({MAX_PDF_PAGES})",
+    "image_only": "Le PDF ne contient pas de couche texte (document scanné)",
+    "repaired": "La structure du PDF a été réparée à l'ouverture",
+}
+
+
+def make_reason(code: str, **details) -> Dict:
+    """Construit une raison structurée {code, message, ...}"""
+    reason = {"code": code, "message": REASON_MESSAGES[code]}
+    reason.update(details)
+    return reason
+
+
+def inspect_pdf(upload: SpooledUpload) -> Dict:
+    """
+    Inspecte un PDF sans extraire son texte complet
+
+    Args:
+        upload: Fichier reçu
+
+    Returns:
+        Rapport {route, reasons, warnings, page_count, encrypted, text_pages, sampled_pages, metadata}
+    """
+    report = {
+        "route": ROUTE_REJECT,
+        "reasons": [],
+        "warnings": [],
+        "page_count": 0,
+        "encrypted": False,
+        "text_pages": 0,
+        "sampled_pages": 0,
+        "metadata": {}
+    }
+
+    # En-tête: les lecteurs tolèrent quelques octets avant %PDF-
+    if b"%PDF-" not in upload.read_head(1024):
+        report["reasons"].append(make_reason("not_pdf"))
+        return report
+
+    try:
+        doc = upload.open_pdf(check_pages=False)
+    except Exception as e:
+        report["reasons"].append(make_reason("corrupt", detail=str(e)))
+        return report
+
+    try:
+        report["page_count"] = doc.page_count
+        report["encrypted"] = bool(doc.is_encrypted)
+        report["metadata"] = {
+            key: value for key, value in (doc.metadata or {}).items()
+            if key in ("format", "producer", "creator") and value
+        }
+
+        if doc.needs_pass:
+            report["reasons"].append(make_reason("encrypted"))
+            return report
+        if doc.xref_length() <= 1:
+            report["reasons"].append(make_reason("corrupt", detail="Table xref vide"))
+            return report
+        if doc.is_repaired:
+            report["warnings"].append(make_reason("repaired"))
+        if doc.page_count == 0:
+            report["reasons"].append(make_reason("empty"))
+            return report
+        if doc.page_count > MAX_PDF_PAGES:
+            report["reasons"].append(make_reason("too_many_pages", page_count=doc.page_count))
+            return report
+
+        # Échantillon de la couche texte sur les premières pages
+        sampled = min(PREFLIGHT_SAMPLE_PAGES, doc.page_count)
+        for page_index in range(sampled):
+            if len(doc[page_index].get_text().strip()) >= PREFLIGHT_MIN_TEXT_CHARS:
+                report["text_pages"] += 1
+        report["sampled_pages"] = sampled
+
+        if report["text_pages"] == 0:
+            # Document scanné: OCR local si Tesseract est disponible
+            if is_ocr_available():
+                report["route"] = ROUTE_OCR
+                report["warnings"].append(make_reason("image_only"))
+            else:
+                report["reasons"].append(make_reason("image_only", ocr_available=False))
+        else:
+            report["route"] = ROUTE_TEXT
+    except Exception as e:
+        report["route"] = ROUTE_REJECT
+        report["reasons"].append(make_reason("corrupt", detail=str(e)))
+    finally:
+        doc.close()
+
+    return report
@@ -1,52 +1,412 @@
-import fitz  # PyMuPDF
 import io
+import os
+import re
+import hashlib
+from collections import Counter
+from dotenv import load_dotenv
 
-def extract_text_from_pdf(file):
+from lazy_imports import lazy_import
+from upload_utils import SpooledUpload, MAX_PDF_PAGES
+from ocr_utils import ocr_pages, OCR_ENABLED, OCR_DPI, OCR_LANGUAGE
+
+load_dotenv(dotenv_path='../.env')
+
+fitz = lazy_import("fitz")  # PyMuPDF, chargé à la première extraction
+
+# Mode d'extraction: "structured" (blocs: ordre de lecture, paragraphes, titres,
+# tableaux) ou "plain" (texte brut ligne à ligne)
+EXTRACTION_MODE = os.getenv("PDF_EXTRACTION_MODE", "structured").lower()
+# Détection des tableaux à filets (find_tables), tentée seulement sur les pages qui en dessinent
+TABLE_DETECTION_ENABLED = os.getenv("PDF_TABLE_DETECTION", "true").lower() == "true"
+TABLE_MIN_RULES = 6  # Traits horizontaux ou verticaux nécessaires pour chercher un tableau
+
+# Un bloc court dont la police dépasse celle du corps de ce facteur est un titre
+HEADING_SIZE_RATIO = 1.15
+HEADING_MAX_CHARS = 120
+HEADING_MAX_LINES = 2
+# Écart entre deux fragments d'une ligne (en tailles de police) marquant deux cellules
+CELL_GAP_RATIO = 1.5
+SPAN_BOLD_FLAG = 16
+
+BLOCK_PARAGRAPH = "p"
+BLOCK_HEADING = "h"
+BLOCK_TABLE = "t"
+
+LIST_ITEM_PATTERN = re.compile(r'^(?:[•▪◦‣●■–—*-]|\d{1,3}[.)]|[a-z][.)])\s')
+
+# Une ligne présente sur au moins cette part des pages est considérée comme répétée
+REPEATED_LINE_PAGE_RATIO = 0.5
+# En dessous de ce nombre de pages, la déduplication n'est pas significative
+MIN_PAGES_FOR_DEDUP = 3
+
+# Les numéros ne sont ignorés que sur les lignes de bord (en-têtes, pieds de page)
+EDGE_LINES = 2
+
+# Version de l'extraction: à incrémenter à chaque changement du texte produit
+# (invalide le cache des textes extraits)
+EXTRACTION_VERSION = "3"
+
+DIGITS_PATTERN = re.compile(r'\d+')
+
+def line_fingerprint(line, edge_position=None):
     """
-    Extrait le texte d'un fichier PDF téléchargé.
+    Calcule l'empreinte d'une ligne normalisée (casse, espaces).
+    Pour une ligne de bord (edge_position renseignée, ex: "-1" pour la dernière
+    ligne), les numéros sont ignorés: "Page 3 / 40" et "Page 4 / 40" partagent
+    alors la même empreinte.
+    """
+    normalized = ' '.join(line.lower().split())
+    if edge_position is not None:
+        normalized = f"{edge_position}#" + DIGITS_PATTERN.sub('#', normalized)
+    return hashlib.blake2b(normalized.encode('utf-8'), digest_size=8).digest()
+
+def page_fingerprints(lines):
+    """Retourne, pour chaque ligne de la page, la liste de ses empreintes"""
+    edge_start = min(EDGE_LINES, len(lines))
+    edge_end = max(len(lines) - EDGE_LINES, edge_start)
+    fingerprints = []
+    for index, line in enumerate(lines):
+        line_fps = [line_fingerprint(line)]
+        if index < edge_start:
+            line_fps.append(line_fingerprint(line, edge_position=str(index)))
+        elif index >= edge_end:
+            line_fps.append(line_fingerprint(line, edge_position=str(index - len(lines))))
+        fingerprints.append(line_fps)
+    return fingerprints
+
+def remove_repeated_lines(pages):
+    """
+    Supprime les en-têtes, pieds de page et mentions répétés d'une page à l'autre.
     
     Args:
-        file: Objet fichier Flask (FileStorage)
+        pages: Liste de (numéro_de_page, lignes)
     
     Returns:
-        str: Texte extrait du PDF
+        tuple: (pages nettoyées, statistiques)
+    """
+    stats = {'repeated_lines_detected': 0, 'lines_removed': 0, 'bytes_removed': 0}
+    if len(pages) < MIN_PAGES_FOR_DEDUP:
+        return pages, stats
+    
+    # Compter, pour chaque empreinte, le nombre de pages où la ligne apparaît
+    all_fingerprints = [page_fingerprints(lines) for _, lines in pages]
+    page_frequency = Counter()
+    for fingerprints in all_fingerprints:
+        page_frequency.update(set(fp for line_fps in fingerprints for fp in line_fps))
+    
+    threshold = max(2, int(len(pages) * REPEATED_LINE_PAGE_RATIO))
+    repeated = {fingerprint for fingerprint, count in page_frequency.items() if count >= threshold}
+    stats['repeated_lines_detected'] = len(repeated)
+    if not repeated:
+        return pages, stats
+    
+    # Garder la première occurrence de chaque ligne répétée, supprimer les suivantes
+    seen = set()
+    cleaned_pages = []
+    for (page_number, lines), fingerprints in zip(pages, all_fingerprints):
+        kept = []
+        for line, line_fps in zip(lines, fingerprints):
+            matched = [fp for fp in line_fps if fp in repeated]
+            if matched:
+                if any(fp in seen for fp in matched):
+                    stats['lines_removed'] += 1
+                    stats['bytes_removed'] += len(line.encode('utf-8')) + 1
+                    continue
+                seen.update(matched)
+            kept.append(line)
+        cleaned_pages.append((page_number, kept))
+    
+    return cleaned_pages, stats
+
+class TextBlock:
+    """Bloc de texte d'une page: paragraphe, titre ou tableau"""
+
+    __slots__ = ("kind", "x0", "y0", "x1", "y1", "text", "size", "bold", "line_count")
+
+    def __init__(self, kind, bbox, text, size=0.0, bold=False, line_count=1):
+        self.kind = kind
+        self.x0, self.y0, self.x1, self.y1 = bbox
+        self.text = text
+        self.size = size
+        self.bold = bold
+        self.line_count = line_count
+
+    def render(self):
+        """Représentation compacte du bloc dans le texte extrait"""
+        if self.kind == BLOCK_HEADING:
+            return "## " + self.text
+        return self.text
+
+def join_block_lines(lines):
+    """
+    Recompose le texte d'un bloc: les retours à la ligne de mise en page sont
+    supprimés, ceux qui précèdent un élément de liste sont conservés
+    """
+    text = lines[0]
+    for line in lines[1:]:
+        if LIST_ITEM_PATTERN.match(line):
+            text += '\n' + line
+        elif text.endswith('-') and line[:1].islower():
+            text += line  # Mot coupé en fin de ligne
+        else:
+            text += ' ' + line
+    return text
+
+def join_line_spans(spans):
+    """Texte d'une ligne; les fragments séparés par un large blanc sont des cellules ( | )"""
+    text = ''
+    previous_end = None
+    for span in spans:
+        span_text = span["text"]
+        if not span_text.strip():
+            continue
+        if previous_end is not None:
+            gap = span["bbox"][0] - previous_end
+            if gap > span["size"] * CELL_GAP_RATIO:
+                text = text.rstrip() + ' | '
+            elif not text.endswith(' ') and not span_text.startswith(' '):
+                text += ' ' if gap > span["size"] * 0.1 else ''
+        text += span_text
+        previous_end = span["bbox"][2]
+    return ' '.join(text.split())
+
+def find_page_tables(page):
+    """
+    Tableaux à filets de la page, sous forme de blocs
+
+    find_tables est coûteux: il n'est appelé que si la page dessine
+    suffisamment de traits horizontaux ou verticaux.
+    """
+    rules = 0
+    for drawing in page.get_drawings():
+        for item in drawing["items"]:
+            if item[0] == "re":
+                rules += 4
+            elif item[0] == "l" and (abs(item[1].x - item[2].x) < 1 or abs(item[1].y - item[2].y) < 1):
+                rules += 1
+        if rules >= TABLE_MIN_RULES:
+            break
+    if rules < TABLE_MIN_RULES:
+        return []
+
+    blocks = []
+    for table in page.find_tables().tables:
+        rows = []
+        for row in table.extract():
+            cells = [' '.join((cell or '').split()) for cell in row]
+            if any(cells):
+                rows.append(' | '.join(cells))
+        if rows:
+            blocks.append(TextBlock(BLOCK_TABLE, tuple(table.bbox), '\n'.join(rows), line_count=len(rows)))
+    return blocks
+
+def read_page_blocks(page):
+    """
+    Lit les blocs de texte d'une page (get_text("dict")), tableaux regroupés
+
+    Returns:
+        Liste de TextBlock, dans l'ordre de lecture
+    """
+    tables = find_page_tables(page) if TABLE_DETECTION_ENABLED else []
+    blocks = list(tables)
+
+    for block in page.get_text("dict", flags=fitz.TEXTFLAGS_TEXT)["blocks"]:
+        if block.get("type") != 0:
+            continue
+        x0, y0, x1, y1 = block["bbox"]
+        center_x, center_y = (x0 + x1) / 2, (y0 + y1) / 2
+        if any(t.x0 <= center_x <= t.x1 and t.y0 <= center_y <= t.y1 for t in tables):
+            continue  # Texte déjà lu dans les cellules du tableau
+
+        lines = []
+        chars = 0
+        weighted_size = 0.0
+        bold_chars = 0
+        for line in block["lines"]:
+            text = join_line_spans(line["spans"])
+            if not text:
+                continue
+            lines.append(text)
+            for span in line["spans"]:
+                count = len(span["text"].strip())
+                chars += count
+                weighted_size += span["size"] * count
+                if span["flags"] & SPAN_BOLD_FLAG:
+                    bold_chars += count
+        if not lines:
+            continue
+        blocks.append(TextBlock(
+            BLOCK_PARAGRAPH, (x0, y0, x1, y1), join_block_lines(lines),
+            size=weighted_size / chars if chars else 0.0,
+            bold=bold_chars * 2 > chars,
+            line_count=len(lines)
+        ))
+
+    return order_blocks(blocks, page.rect.width)
+
+def order_blocks(blocks, page_width):
+    """
+    Ordre de lecture: de haut en bas, colonne gauche puis colonne droite
+
+    Un bloc qui traverse le milieu de la page (titre, paragraphe pleine
+    largeur, tableau) clôt la bande de colonnes qui le précède.
+    """
+    middle = page_width / 2
+    ordered = []
+    band = []
+
+    def flush_band():
+        band.sort(key=lambda b: (b.x0 >= middle, b.y0, b.x0))
+        ordered.extend(band)
+        band.clear()
+
+    for block in sorted(blocks, key=lambda b: (b.y0, b.x0)):
+        if block.x0 < middle < block.x1:
+            flush_band()
+            ordered.append(block)
+        else:
+            band.append(block)
+    flush_band()
+    return ordered
+
+def body_font_size(pages_blocks):
+    """Taille de police du corps du texte (médiane pondérée par le nombre de caractères)"""
+    sizes = Counter()
+    for blocks in pages_blocks:
+        for block in blocks:
+            if block.kind == BLOCK_PARAGRAPH and block.size:
+                sizes[round(block.size, 1)] += len(block.text)
+    if not sizes:
+        return 0.0
+    half = sum(sizes.values()) / 2
+    seen = 0
+    for size in sorted(sizes):
+        seen += sizes[size]
+        if seen >= half:
+            return size
+    return 0.0
+
+def mark_headings(pages_blocks):
+    """Marque comme titres les blocs courts en police plus grande (ou en gras) que le corps"""
+    body_size = body_font_size(pages_blocks)
+    if not body_size:
+        return
+    for blocks in pages_blocks:
+        for block in blocks:
+            if (block.kind != BLOCK_PARAGRAPH or block.line_count > HEADING_MAX_LINES
+                    or len(block.text) > HEADING_MAX_CHARS or block.text.endswith(('.', ','))):
+                continue
+            if block.size >= body_size * HEADING_SIZE_RATIO or (block.bold and block.size >= body_size):
+                block.kind = BLOCK_HEADING
+
+def extraction_version(dedupe=True):
+    """Version complète de l'extraction, incluant les paramètres qui modifient le texte"""
+    ocr = f"{OCR_DPI}-{OCR_LANGUAGE}" if OCR_ENABLED else "off"
+    mode = EXTRACTION_MODE
+    if mode == "structured":
+        mode += f"-tables={int(TABLE_DETECTION_ENABLED)}"
+    return f"{EXTRACTION_VERSION}:{mode}:dedupe={int(dedupe)}:ratio={REPEATED_LINE_PAGE_RATIO}:ocr={ocr}"
+
+def extract_text_with_stats(file, dedupe=True):
+    """
+    Extrait le texte d'un fichier PDF téléchargé et retourne les statistiques d'extraction.
+    
+    Args:
+        file: SpooledUpload (ouvert par chemin ou tampon) ou objet fichier lisible
+        dedupe: Supprimer les lignes répétées sur de nombreuses pages
+    
+    Returns:
+        tuple: (texte extrait, statistiques)
     
     Raises:
         Exception: Si l'extraction échoue
     """
     try:
-        # Lire le contenu du fichier
-        file_content = file.read()
-        
-        # Réinitialiser le pointeur de fichier au cas où il serait utilisé ailleurs
-        file.seek(0)
-        
-        # Ouvrir le PDF avec PyMuPDF
-        doc = fitz.open(stream=file_content, filetype="pdf")
-        
-        # Extraire le texte de toutes les pages
-        text_parts = []
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            text = page.get_text()
+        if isinstance(file, SpooledUpload):
+            # Ouvrir le PDF par son chemin ou son tampon, sans copie supplémentaire
+            doc = file.open_pdf()
+        else:
+            # Lire le contenu du fichier
+            file_content = file.read()
             
-            # Nettoyer le texte (supprimer les lignes vides multiples)
-            cleaned_text = '\n'.join(line.strip() for line in text.split('\n') if line.strip())
+            # Réinitialiser le pointeur de fichier au cas où il serait utilisé ailleurs
+            file.seek(0)
             
-            if cleaned_text:
-                text_parts.append(f"--- Page {page_num + 1} ---\n{cleaned_text}")
+            # Ouvrir le PDF avec PyMuPDF
+            doc = fitz.open(stream=file_content, filetype="pdf")
+            if doc.page_count > MAX_PDF_PAGES:
+                doc.close()
+                raise Exception(f"Le PDF contient trop de pages (maximum {MAX_PDF_PAGES})")
+        
+        # Extraire le texte de toutes les pages
+        pages = []
+        if EXTRACTION_MODE == "structured":
+            # Blocs dans l'ordre de lecture: chaque paragraphe, titre ou tableau
+            # devient une unité (dédupliquée, puis séparée par une ligne vide)
+            pages_blocks = [read_page_blocks(doc[page_num]) for page_num in range(len(doc))]
+            mark_headings(pages_blocks)
+            for page_num, blocks in enumerate(pages_blocks):
+                pages.append((page_num + 1, [block.render() for block in blocks]))
+        else:
+            for page_num in range(len(doc)):
+                page = doc[page_num]
+                text = page.get_text()
+                
+                # Nettoyer le texte (supprimer les lignes vides multiples)
+                lines = [line.strip() for line in text.split('\n') if line.strip()]
+                pages.append((page_num + 1, lines))
+        
+        # OCR des seules pages sans couche texte (documents scannés)
+        empty_pages = [index for index, (_, lines) in enumerate(pages) if not lines]
+        ocr_texts, ocr_stats = ocr_pages(doc, empty_pages)
+        for index, text in ocr_texts.items():
+            lines = [line.strip() for line in text.split('\n') if line.strip()]
+            pages[index] = (pages[index][0], lines)
         
         # Fermer le document
         doc.close()
         
+        # Supprimer les en-têtes, pieds de page et mentions répétés
+        stats = {'repeated_lines_detected': 0, 'lines_removed': 0, 'bytes_removed': 0}
+        if dedupe:
+            pages, stats = remove_repeated_lines(pages)
+        stats['page_count'] = len(pages)
+        stats.update(ocr_stats)
+        
         # Joindre tout le texte
+        unit_separator = '\n\n' if EXTRACTION_MODE == "structured" else '\n'
+        text_parts = [
+            f"--- Page {page_number} ---\n" + unit_separator.join(lines)
+            for page_number, lines in pages if lines
+        ]
         full_text = '\n\n'.join(text_parts)
         
         if not full_text.strip():
             raise Exception("Aucun texte extractible trouvé dans le PDF")
         
-        return full_text
+        if stats['bytes_removed']:
+            print(f"Déduplication PDF: {stats['lines_removed']} lignes répétées supprimées "
+                  f"({stats['bytes_removed']} octets)")
+        
+        return full_text, stats
         
     except Exception as e:
         print(f"Erreur lors de l'extraction PDF: {e}")
         raise Exception(f"Impossible d'extraire le texte du PDF: {str(e)}")
+
+def extract_text_from_pdf(file, dedupe=True):
+    """
+    Extrait le texte d'un fichier PDF téléchargé.
+    
+    Args:
+        file: Objet fichier Flask (FileStorage)
+        dedupe: Supprimer les lignes répétées sur de nombreuses pages
+    
+    Returns:
+        str: Texte extrait du PDF
+    
+    Raises:
+        Exception: Si l'extraction échoue
+    """
+    text, _ = extract_text_with_stats(file, dedupe=dedupe)
+    return text
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Module d'écriture différée des analyses
+Met en file les documents d'analyse et les écrit par lots (insert_many) depuis
+un thread dédié, sur seuil de taille ou de délai, avec nouvelles tentatives
+sur erreur transitoire et repli dans un fichier local si MongoDB est
+indisponible, rejoué dès que la base répond de nouveau. Les analyses refusées
+par MongoDB lui-même (document invalide ou trop gros) sont écartées dans un
+fichier de quarantaine au lieu d'être retentées indéfiniment
+"""
+
+import os
+import time
+import queue
+import atexit
+import threading
+from typing import Dict, List
+from bson import ObjectId, json_util
+from bson.errors import InvalidDocument
+from pymongo.errors import (
+    AutoReconnect, BulkWriteError, ConnectionFailure, DuplicateKeyError, PyMongoError,
+    ServerSelectionTimeoutError
+)
+from dotenv import load_dotenv
+
+from database import db, for_operation
+from history_cache import record_analyses_inserted
+
+load_dotenv(dotenv_path='../.env')
+
+# Configuration
+PERSIST_ASYNC = os.getenv("PERSIST_ASYNC", "true").lower() == "true"
+PERSIST_BATCH_SIZE = int(os.getenv("PERSIST_BATCH_SIZE", "50"))
+PERSIST_FLUSH_INTERVAL = float(os.getenv("PERSIST_FLUSH_INTERVAL", "0.5"))  # Secondes
+PERSIST_MAX_RETRIES = int(os.getenv("PERSIST_MAX_RETRIES", "3"))
+PERSIST_RETRY_DELAY = float(os.getenv("PERSIST_RETRY_DELAY", "0.5"))  # Délai initial, doublé à chaque essai
+PERSIST_QUEUE_SIZE = int(os.getenv("PERSIST_QUEUE_SIZE", "10000"))
+PERSIST_SPILL_REPLAY_INTERVAL = float(os.getenv("PERSIST_SPILL_REPLAY_INTERVAL", "30"))
+PERSIST_SPILL_PATH = os.getenv(
+    "PERSIST_SPILL_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "spill", "analyses.jsonl")
+)
+
+DUPLICATE_KEY_ERROR = 11000
+# Erreurs signifiant que MongoDB est injoignable (nouvel essai plus tard); toute
+# autre erreur d'insertion tient au document lui-même
+UNAVAILABLE_ERRORS = (ConnectionFailure, AutoReconnect, ServerSelectionTimeoutError)
+
+
+def rejected_path_for(spill_path: str) -> str:
+    """Fichier de quarantaine associé à un fichier de repli (analyses.jsonl -> analyses.rejected.jsonl)"""
+    return os.path.splitext(spill_path)[0] + ".rejected.jsonl"
+
+
+class AnalysisWriter:
+    """File d'écriture des analyses vidée par lots depuis un thread dédié"""
+
+    def __init__(self, spill_path: str):
+        """
+        Initialise la file et démarre le thread d'écriture
+
+        Args:
+            spill_path: Fichier de repli (une analyse JSON étendu par ligne)
+        """
+        self.queue = queue.Queue(maxsize=PERSIST_QUEUE_SIZE)
+        self.spill_path = spill_path
+        self.rejected_path = rejected_path_for(spill_path)
+        self.spill_lock = threading.Lock()
+        self.stats = {
+            "queued": 0, "written": 0, "batches": 0, "retries": 0, "spilled": 0, "replayed": 0, "rejected": 0
+        }
+        self.next_replay = 0.0
+        self.thread = threading.Thread(target=self._run, name="analysis-writer", daemon=True)
+        self.thread.start()
+
+    def enqueue(self, docs: List[Dict]) -> List[ObjectId]:
+        """
+        Met des analyses en file d'écriture
+
+        L'identifiant est attribué ici: une analyse rejouée depuis le fichier de
+        repli ne peut pas être insérée deux fois.
+
+        Args:
+            docs: Documents à insérer dans db.analyses
+
+        Returns:
+            Identifiants des analyses
+        """
+        ids = []
+        for doc in docs:
+            doc.setdefault("_id", ObjectId())
+            ids.append(doc["_id"])
+            try:
+                self.queue.put_nowait(doc)
+                self.stats["queued"] += 1
+            except queue.Full:
+                # File saturée: repli direct sur disque plutôt que bloquer la requête
+                self._spill([doc])
+        return ids
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Attend l'écriture des analyses en file (arrêt du serveur, tests)"""
+        deadline = time.monotonic() + timeout
+        while self.queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+        return not self.queue.unfinished_tasks
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch:
+                try:
+                    self._write(batch)
+                except Exception as e:
+                    print(f"Erreur inattendue de l'écriture différée: {e}")
+                    self._spill(batch)
+                finally:
+                    for _ in batch:
+                        self.queue.task_done()
+            if time.monotonic() >= self.next_replay:
+                self._replay_spill()
+
+    def _next_batch(self) -> List[Dict]:
+        """Attend un premier document puis complète le lot jusqu'au seuil de taille ou de délai"""
+        try:
+            batch = [self.queue.get(timeout=PERSIST_SPILL_REPLAY_INTERVAL)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + PERSIST_FLUSH_INTERVAL
+        while len(batch) < PERSIST_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _insert(self, docs: List[Dict]) -> List[Dict]:
+        """
+        Insère un lot; les doublons (lot déjà écrit avant une coupure) sont ignorés
+
+        Un lot refusé en bloc (document trop gros ou invalide) est repris
+        document par document pour n'écarter que les documents fautifs.
+
+        Returns:
+            Documents rejetés pour une autre raison que le doublon
+
+        Raises:
+            UNAVAILABLE_ERRORS: Si MongoDB est injoignable
+        """
+        collection = for_operation(db.analyses, 'analysis_write')
+        try:
+            collection.insert_many(docs, ordered=False)
+            return []
+        except BulkWriteError as e:
+            failed = [
+                error["index"] for error in e.details.get("writeErrors", [])
+                if error.get("code") != DUPLICATE_KEY_ERROR
+            ]
+            return [docs[index] for index in failed]
+        except UNAVAILABLE_ERRORS:
+            raise
+        except (PyMongoError, InvalidDocument) as e:
+            print(f"Lot d'analyses refusé ({e}), insertion document par document")
+
+        rejected = []
+        for doc in docs:
+            try:
+                collection.insert_one(doc)
+            except DuplicateKeyError:
+                pass
+            except UNAVAILABLE_ERRORS:
+                raise
+            except (PyMongoError, InvalidDocument) as e:
+                print(f"Analyse {doc.get('_id')} refusée par MongoDB: {e}")
+                rejected.append(doc)
+        return rejected
+
+    def _write(self, docs: List[Dict]):
+        """Écrit un lot avec nouvelles tentatives, puis repli sur disque"""
+        delay = PERSIST_RETRY_DELAY
+        for attempt in range(PERSIST_MAX_RETRIES + 1):
+            try:
+                rejected = self._insert(docs)
+                if rejected:
+                    self._quarantine(rejected)
+                self.stats["written"] += len(docs) - len(rejected)
+                self.stats["batches"] += 1
+                record_analyses_inserted([doc for doc in docs if doc not in rejected])
+                return
+            except UNAVAILABLE_ERRORS as e:
+                if attempt == PERSIST_MAX_RETRIES:
+                    print(f"MongoDB indisponible, {len(docs)} analyse(s) mises de côté: {e}")
+                    break
+                self.stats["retries"] += 1
+                time.sleep(delay)
+                delay *= 2
+        self._spill(docs)
+        self.next_replay = time.monotonic() + PERSIST_SPILL_REPLAY_INTERVAL
+
+    def _append_lines(self, path: str, lines: List[str]):
+        """Ajoute des lignes à un fichier de repli ou de quarantaine (écriture synchronisée)"""
+        with self.spill_lock:
+            os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+            with open(path, "a", encoding="utf-8") as f:
+                for line in lines:
+                    f.write(line + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _spill(self, docs: List[Dict]):
+        """Ajoute des analyses au fichier de repli"""
+        try:
+            self._append_lines(self.spill_path, [json_util.dumps(doc) for doc in docs])
+            self.stats["spilled"] += len(docs)
+        except OSError as e:
+            print(f"Impossible d'écrire le fichier de repli des analyses: {e}")
+
+    def _quarantine(self, docs: List[Dict], lines: List[str] = ()):
+        """
+        Écarte des analyses refusées par MongoDB (jamais rejouées automatiquement)
+
+        Args:
+            docs: Analyses refusées
+            lines: Lignes illisibles du fichier de repli, conservées telles quelles
+        """
+        entries = [json_util.dumps(doc) for doc in docs] + list(lines)
+        try:
+            self._append_lines(self.rejected_path, entries)
+            self.stats["rejected"] += len(entries)
+            print(f"{len(entries)} analyse(s) refusée(s) mises en quarantaine dans {self.rejected_path}")
+        except OSError as e:
+            print(f"Impossible d'écrire le fichier de quarantaine des analyses: {e}")
+
+    def _replay_spill(self):
+        """Rejoue le fichier de repli quand MongoDB répond de nouveau"""
+        self.next_replay = time.monotonic() + PERSIST_SPILL_REPLAY_INTERVAL
+        replay_path = self.spill_path + ".replay"
+        with self.spill_lock:
+            if not os.path.exists(replay_path):
+                if not os.path.exists(self.spill_path):
+                    return
+                os.replace(self.spill_path, replay_path)
+
+        docs, unreadable = [], []
+        try:
+            with open(replay_path, encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        docs.append(json_util.loads(line))
+                    except ValueError:
+                        unreadable.append(line.rstrip("\n"))  # Ligne tronquée (arrêt pendant l'écriture)
+        except OSError as e:
+            print(f"Fichier de repli des analyses illisible: {e}")
+            return
+
+        try:
+            rejected = []
+            for start in range(0, len(docs), PERSIST_BATCH_SIZE):
+                batch = docs[start:start + PERSIST_BATCH_SIZE]
+                batch_rejected = self._insert(batch)
+                record_analyses_inserted([doc for doc in batch if doc not in batch_rejected])
+                rejected += batch_rejected
+        except UNAVAILABLE_ERRORS:
+            return  # Toujours indisponible: nouvel essai au prochain intervalle
+
+        # Les refus tiennent aux documents: en quarantaine, pour que le fichier
+        # de rejeu disparaisse et que les replis suivants soient rejoués
+        if rejected or unreadable:
+            self._quarantine(rejected, unreadable)
+        os.unlink(replay_path)
+        self.stats["replayed"] += len(docs) - len(rejected)
+        print(f"Rejeu: {len(docs) - len(rejected)} analyse(s) enregistrée(s)")
+
+
+_writer = None
+_writer_pid = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> AnalysisWriter:
+    """Retourne l'écrivain du processus courant (thread démarré au premier appel)"""
+    global _writer, _writer_pid
+    with _writer_lock:
+        if _writer is None or _writer_pid != os.getpid():
+            _writer = AnalysisWriter(PERSIST_SPILL_PATH)
+            _writer_pid = os.getpid()
+        return _writer
+
+
+def save_analyses(docs: List[Dict]) -> List[ObjectId]:
+    """
+    Enregistre des analyses (en différé sauf si PERSIST_ASYNC=false)
+
+    Args:
+        docs: Documents à insérer dans db.analyses
+
+    Returns:
+        Identifiants des analyses
+    """
+    if not docs:
+        return []
+    if not PERSIST_ASYNC:
+        ids = for_operation(db.analyses, 'analysis_write').insert_many(docs, ordered=False).inserted_ids
+        record_analyses_inserted(docs)
+        return ids
+    return get_writer().enqueue(docs)
+
+
+def get_persistence_stats() -> Dict:
+    """Compteurs de l'écriture différée du processus courant"""
+    writer = _writer if _writer_pid == os.getpid() else None
+    if writer is None:
+        return {"async": PERSIST_ASYNC, "pending": 0}
+    stats = dict(writer.stats)
+    stats.update({"async": PERSIST_ASYNC, "pending": writer.queue.unfinished_tasks})
+    return stats
+
+
+@atexit.register
+def flush_on_exit():
+    """Vide la file avant l'arrêt du processus"""
+    if _writer is not None and _writer_pid == os.getpid():
+        _writer.flush()
@@ -12,23 +12,52 @@ from typing import Dict, List, Tuple, Optional
 from datetime import datetime
 import json
 
-# Configuration du logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Version des règles de détection: à incrémenter à chaque modification des
+# patterns, listes ou placeholders (invalide le cache des textes anonymisés)
+RULES_VERSION = "3"
+
+# Détecteurs disponibles: types détectés par expression régulière et détecteurs heuristiques
+PATTERN_DETECTORS = (
+    'email', 'phone_fr', 'phone_international', 'ssn_fr', 'iban_fr', 'credit_card',
+    'postal_code_fr', 'date_birth', 'ip_address', 'mac_address'
+)
+ALL_DETECTORS = frozenset(PATTERN_DETECTORS + ('person_name', 'company_name', 'address'))
+
+# Séparateur des unités du texte extrait (paragraphes, titres, tableaux, pages):
+# une détection ne déborde jamais d'une unité sur la suivante
+SEGMENT_SEPARATOR_PATTERN = re.compile(r'\n[ \t]*\n\s*')
+
+
+def iter_segments(text: str):
+    """Positions (début, fin) des unités du texte, séparées par une ligne vide"""
+    start = 0
+    for separator in SEGMENT_SEPARATOR_PATTERN.finditer(text):
+        if separator.start() > start:
+            yield start, separator.start()
+        start = separator.end()
+    if start < len(text):
+        yield start, len(text)
+
 class PIIAnonymizer:
     """Classe pour l'anonymisation des données personnelles"""
     
-    def __init__(self, strict_mode: bool = True):
+    def __init__(self, strict_mode: bool = True, detectors: Optional[frozenset] = None):
         """
         Initialise l'anonymiseur PII
         
         Args:
             strict_mode: Si True, anonymise de manière stricte (RGPD)
+            detectors: Détecteurs à exécuter (tous par défaut, voir ALL_DETECTORS)
         """
         self.strict_mode = strict_mode
+        self.detectors = ALL_DETECTORS if detectors is None else frozenset(detectors)
         self.anonymization_map = {}
         self.anonymization_log = []
+        # Table des entités du document: (type, valeur normalisée) -> placeholder
+        self.entity_table = {}
+        self._type_counters = {}
         
         # Patterns pour détecter les PII
         self.pii_patterns = {
@@ -44,21 +73,21 @@ class PIIAnonymizer:
             'mac_address': r'\b([0-9A-Fa-f]{2}[:-]){5}([0-9A-Fa-f]{2})\b'
         }
         
-        # Placeholders pour l'anonymisation
+        # Préfixes des placeholders indexés ([PERSONNE_1], [EMAIL_2], ...)
         self.placeholders = {
-            'email': '[EMAIL_ANONYMIZÉ]',
-            'phone_fr': '[TÉLÉPHONE_ANONYMIZÉ]',
-            'phone_international': '[TÉLÉPHONE_INTERNATIONAL_ANONYMIZÉ]',
-            'ssn_fr': '[NUMÉRO_SÉCURITÉ_SOCIALE_ANONYMIZÉ]',
-            'iban_fr': '[IBAN_ANONYMIZÉ]',
-            'credit_card': '[CARTE_BANCAIRE_ANONYMIZÉ]',
-            'postal_code_fr': '[CODE_POSTAL_ANONYMIZÉ]',
-            'date_birth': '[DATE_NAISSANCE_ANONYMIZÉ]',
-            'ip_address': '[ADRESSE_IP_ANONYMIZÉ]',
-            'mac_address': '[ADRESSE_MAC_ANONYMIZÉ]',
-            'person_name': '[NOM_PERSONNE_ANONYMIZÉ]',
-            'company_name': '[NOM_ENTREPRISE_ANONYMIZÉ]',
-            'address': '[ADRESSE_ANONYMIZÉ]'
+            'email': 'EMAIL',
+            'phone_fr': 'TÉLÉPHONE',
+            'phone_international': 'TÉLÉPHONE_INTERNATIONAL',
+            'ssn_fr': 'NUMÉRO_SÉCURITÉ_SOCIALE',
+            'iban_fr': 'IBAN',
+            'credit_card': 'CARTE_BANCAIRE',
+            'postal_code_fr': 'CODE_POSTAL',
+            'date_birth': 'DATE_NAISSANCE',
+            'ip_address': 'ADRESSE_IP',
+            'mac_address': 'ADRESSE_MAC',
+            'person_name': 'PERSONNE',
+            'company_name': 'ENTREPRISE',
+            'address': 'ADRESSE'
         }
         
         # Noms français courants pour détection
@@ -162,6 +191,8 @@ class PIIAnonymizer:
         detected_pii = []
         
         for pii_type, pattern in self.pii_patterns.items():
+            if pii_type not in self.detectors:
+                continue
             matches = re.finditer(pattern, text, re.IGNORECASE)
             for match in matches:
                 detected_pii.append((match.group(0), pii_type, match.start()))
@@ -183,6 +214,37 @@ class PIIAnonymizer:
         hash_input = f"{original_value}{salt}"
         return hashlib.sha256(hash_input.encode()).hexdigest()[:8]
 
+    def get_placeholder(self, original_value: str, pii_type: str) -> str:
+        """
+        Retourne le placeholder indexé d'une entité, en le créant si besoin
+        
+        Une même entité (même type, même valeur normalisée) reçoit toujours
+        le même placeholder dans un document, ce qui permet au LLM de
+        distinguer les personnes et de ré-identifier le résultat.
+        
+        Args:
+            original_value: Valeur originale
+            pii_type: Type de PII
+            
+        Returns:
+            Placeholder indexé, ex: [PERSONNE_1]
+        """
+        key = (pii_type, ' '.join(original_value.split()).lower())
+        placeholder = self.entity_table.get(key)
+        if placeholder is None:
+            index = self._type_counters.get(pii_type, 0) + 1
+            self._type_counters[pii_type] = index
+            prefix = self.placeholders.get(pii_type, pii_type.upper())
+            placeholder = f'[{prefix}_{index}]'
+            self.entity_table[key] = placeholder
+            self.anonymization_map[placeholder] = {
+                'original': original_value,
+                'type': pii_type,
+                'hash': self.generate_secure_hash(original_value, pii_type),
+                'occurrences': 0
+            }
+        return placeholder
+
     def anonymize_text(self, text: str) -> Tuple[str, Dict]:
         """
         Anonymise le texte en détectant et remplaçant les PII
@@ -198,67 +260,75 @@ class PIIAnonymizer:
         # Réinitialiser les structures
         self.anonymization_map = {}
         self.anonymization_log = []
+        self.entity_table = {}
+        self._type_counters = {}
         
-        # Détecter tous les types de PII
+        # Détecter tous les types de PII, unité par unité (paragraphe, titre, tableau)
         all_detected = []
+        for start, end in iter_segments(text):
+            segment = text[start:end]
+            segment_detected = []
+            
+            # PII basées sur des patterns
+            segment_detected.extend(self.detect_pattern_based_pii(segment))
+            
+            # Noms de personnes
+            if 'person_name' in self.detectors:
+                segment_detected.extend(self.detect_person_names(segment))
+            
+            # Noms d'entreprises
+            if 'company_name' in self.detectors:
+                segment_detected.extend(self.detect_company_names(segment))
+            
+            # Adresses
+            if 'address' in self.detectors:
+                segment_detected.extend(self.detect_addresses(segment))
+            
+            all_detected.extend((value, pii_type, start + position) for value, pii_type, position in segment_detected)
         
-        # PII basées sur des patterns
-        all_detected.extend(self.detect_pattern_based_pii(text))
-        
-        # Noms de personnes
-        all_detected.extend(self.detect_person_names(text))
-        
-        # Noms d'entreprises
-        all_detected.extend(self.detect_company_names(text))
-        
-        # Adresses
-        all_detected.extend(self.detect_addresses(text))
-        
-        # Trier par position pour éviter les conflits
-        all_detected.sort(key=lambda x: x[2], reverse=True)
+        # Trier par position (la détection la plus longue gagne en cas de chevauchement)
+        all_detected.sort(key=lambda x: (x[2], -len(x[0])))
         
-        # Anonymiser le texte
-        anonymized_text = text
+        # Anonymiser le texte en une seule passe, en construisant la table des entités
+        parts = []
+        kept = []
+        cursor = 0
         
         for original_value, pii_type, position in all_detected:
-            # Générer un hash sécurisé
-            secure_hash = self.generate_secure_hash(original_value, pii_type)
-            
-            # Créer le placeholder
-            placeholder = self.placeholders.get(pii_type, f'[{pii_type.upper()}_ANONYMIZÉ]')
+            if position < cursor:
+                continue  # Chevauche une détection déjà remplacée
             
-            # Ajouter au mapping
-            self.anonymization_map[placeholder] = {
-                'original': original_value,
-                'type': pii_type,
-                'hash': secure_hash,
-                'position': position
-            }
+            placeholder = self.get_placeholder(original_value, pii_type)
+            entry = self.anonymization_map[placeholder]
+            entry['occurrences'] += 1
             
             # Ajouter au log
             self.anonymization_log.append({
                 'timestamp': datetime.now().isoformat(),
                 'type': pii_type,
-                'hash': secure_hash,
+                'hash': entry['hash'],
+                'placeholder': placeholder,
                 'position': position
             })
             
-            # Remplacer dans le texte
-            anonymized_text = (
-                anonymized_text[:position] + 
-                placeholder + 
-                anonymized_text[position + len(original_value):]
-            )
+            parts.append(text[cursor:position])
+            parts.append(placeholder)
+            cursor = position + len(original_value)
+            kept.append(pii_type)
+        
+        parts.append(text[cursor:])
+        anonymized_text = ''.join(parts)
         
         # Statistiques
         stats = {
-            'total_pii_detected': len(all_detected),
-            'types_detected': list(set(item[1] for item in all_detected)),
+            'total_pii_detected': len(kept),
+            'total_entities': len(self.anonymization_map),
+            'types_detected': list(set(kept)),
             'anonymization_map': self.anonymization_map,
             'log': self.anonymization_log
         }
         
-        logger.info(f"Anonymisation terminée: {len(all_detected)} PII détectées et anonymisées")
+        logger.info(f"Anonymisation terminée: {len(kept)} PII détectées, {len(self.anonymization_map)} entités distinctes")
         
         return anonymized_text, stats
 
@@ -304,20 +374,127 @@ class PIIAnonymizer:
         return filename
 
 # Fonction utilitaire pour anonymisation rapide
-def anonymize_document_text(text: str, strict_mode: bool = True) -> Tuple[str, Dict]:
+def anonymize_document_text(text: str, strict_mode: bool = True,
+                            detectors: Optional[frozenset] = None) -> Tuple[str, Dict]:
     """
     Fonction utilitaire pour anonymiser rapidement un texte de document
     
     Args:
         text: Texte du document
         strict_mode: Mode d'anonymisation strict (RGPD)
+        detectors: Détecteurs à exécuter (tous par défaut)
         
     Returns:
         Tuple (texte_anonymisé, statistiques)
     """
-    anonymizer = PIIAnonymizer(strict_mode=strict_mode)
+    anonymizer = PIIAnonymizer(strict_mode=strict_mode, detectors=detectors)
     return anonymizer.anonymize_text(text)
 
+def build_reidentification_pattern(anonymization_map: Dict) -> Optional[re.Pattern]:
+    """
+    Compile une expression unique reconnaissant tous les placeholders du document
+    
+    Args:
+        anonymization_map: Mapping placeholder -> entité (issu de anonymize_text)
+        
+    Returns:
+        Pattern compilé, ou None si aucun placeholder
+    """
+    if not anonymization_map:
+        return None
+    # Les placeholders les plus longs d'abord ([PERSONNE_12] avant [PERSONNE_1])
+    alternatives = sorted(anonymization_map.keys(), key=len, reverse=True)
+    return re.compile('|'.join(re.escape(placeholder) for placeholder in alternatives))
+
+def deanonymize_text(text: str, anonymization_map: Dict, pattern: Optional[re.Pattern] = None) -> str:
+    """
+    Restaure les valeurs originales dans un texte produit à partir du texte anonymisé
+    
+    Args:
+        text: Texte contenant des placeholders
+        anonymization_map: Mapping placeholder -> entité
+        pattern: Pattern précompilé (optionnel)
+        
+    Returns:
+        Texte ré-identifié
+    """
+    if not text:
+        return text
+    if pattern is None:
+        pattern = build_reidentification_pattern(anonymization_map)
+    if pattern is None:
+        return text
+    return pattern.sub(lambda match: anonymization_map[match.group(0)]['original'], text)
+
+def deanonymize_analysis(analysis: Dict, anonymization_map: Dict) -> Dict:
+    """
+    Ré-identifie le résumé, les points clés et les actions d'une analyse LLM
+    
+    Args:
+        analysis: Résultat {summary, keyPoints, actions}
+        anonymization_map: Mapping placeholder -> entité
+        
+    Returns:
+        Nouvelle analyse avec les valeurs originales restaurées
+    """
+    pattern = build_reidentification_pattern(anonymization_map)
+    if pattern is None:
+        return dict(analysis)
+    
+    restored = dict(analysis)
+    restored['summary'] = deanonymize_text(analysis.get('summary', ''), anonymization_map, pattern)
+    for field in ('keyPoints', 'actions'):
+        restored[field] = [
+            deanonymize_text(item, anonymization_map, pattern) if isinstance(item, str) else item
+            for item in analysis.get(field, [])
+        ]
+    return restored
+
+def translate_placeholders(text: str, source_map: Dict, target_map: Dict) -> Tuple[str, Dict]:
+    """
+    Réécrit un texte anonymisé d'un document avec les placeholders d'un autre
+    
+    Utilisé pour renvoyer au LLM l'analyse anonymisée d'une version précédente
+    d'un document: une entité présente dans les deux versions reçoit le
+    placeholder de la nouvelle; une entité absente de la nouvelle version
+    reçoit un nouveau placeholder, ajouté au mapping retourné pour la
+    ré-identification. Aucune valeur originale n'est réintroduite.
+    
+    Args:
+        text: Texte anonymisé avec les placeholders de source_map
+        source_map: Mapping placeholder -> entité du document d'origine
+        target_map: Mapping placeholder -> entité du nouveau document
+        
+    Returns:
+        Tuple (texte avec les placeholders du nouveau document, mapping complété)
+    """
+    pattern = build_reidentification_pattern(source_map)
+    if not text or pattern is None:
+        return text, target_map
+
+    extended = dict(target_map)
+    by_entity = {}
+    counters = {}
+    for placeholder, entity in extended.items():
+        by_entity.setdefault((entity.get('type'), ' '.join(entity['original'].split()).lower()), placeholder)
+        prefix, _, index = placeholder.strip('[]').rpartition('_')
+        if index.isdigit():
+            counters[prefix] = max(counters.get(prefix, 0), int(index))
+
+    def translate(match):
+        entity = source_map[match.group(0)]
+        key = (entity.get('type'), ' '.join(entity['original'].split()).lower())
+        placeholder = by_entity.get(key)
+        if placeholder is None:
+            prefix = match.group(0).strip('[]').rpartition('_')[0]
+            counters[prefix] = counters.get(prefix, 0) + 1
+            placeholder = f'[{prefix}_{counters[prefix]}]'
+            by_entity[key] = placeholder
+            extended[placeholder] = {'original': entity['original'], 'type': entity.get('type'), 'occurrences': 0}
+        return placeholder
+
+    return pattern.sub(translate, text), extended
+
 # Test rapide
 if __name__ == "__main__":
     # Test avec un texte contenant des PII
@@ -338,4 +515,7 @@ if __name__ == "__main__":
     print(anonymized_text)
     
     print(f"\nStatistiques: {stats['total_pii_detected']} PII détectées")
-    print(f"Types détectés: {stats['types_detected']}") 
\ No newline at end of file
+    print(f"Types détectés: {stats['types_detected']}")
+    
+    print("\nTexte ré-identifié:")
+    print(deanonymize_text(anonymized_text, stats['anonymization_map'])) 
\ No newline at end of file
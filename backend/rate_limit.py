@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Module de limitation de débit
+Seaux à jetons par client (utilisateur du JWT, sinon adresse IP) et par
+catégorie de routes (analyse, authentification, historique), plus un seau
+global pour les analyses: chaque client dispose de sa part avant que le débit
+total ne soit plafonné. Les seaux sont en mémoire ou partagés entre workers
+via MongoDB.
+"""
+
+import os
+import math
+import time
+import threading
+from datetime import datetime, timezone
+from collections import OrderedDict
+from functools import wraps
+from typing import Dict, Optional, Tuple
+from flask import request, jsonify
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from dotenv import load_dotenv
+
+from auth import verify_token
+from database import db
+
+load_dotenv(dotenv_path='../.env')
+
+# Configuration
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()  # memory ou mongo (partagé)
+RATE_LIMIT_TRUST_PROXY = os.getenv("RATE_LIMIT_TRUST_PROXY", "false").lower() == "true"
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))  # Seaux gardés en mémoire
+
+
+def _limit(name: str, per_minute: str, burst: str) -> Tuple[float, float]:
+    """Lit une limite (requêtes par minute, rafale) depuis l'environnement"""
+    return (float(os.getenv(f"RATE_LIMIT_{name}_PER_MINUTE", per_minute)),
+            float(os.getenv(f"RATE_LIMIT_{name}_BURST", burst)))
+
+
+# Catégorie -> (jetons par minute, capacité du seau); 0 jeton par minute: pas de limite
+RATE_LIMITS = {
+    "upload": _limit("UPLOAD", "6", "3"),          # Appels LLM: coûteux en tokens et en workers
+    "auth": _limit("AUTH", "10", "5"),             # bcrypt: coûteux en CPU
+    "history": _limit("HISTORY", "120", "30"),
+}
+# Plafond global des analyses, tous clients confondus
+GLOBAL_LIMITS = {
+    "upload": _limit("UPLOAD_GLOBAL", "60", "20"),
+}
+
+
+class MemoryBuckets:
+    """Seaux à jetons en mémoire du processus (éviction LRU au-delà de max_keys)"""
+
+    def __init__(self, max_keys: int):
+        self.buckets = OrderedDict()  # clé -> (jetons, horodatage)
+        self.max_keys = max_keys
+        self.lock = threading.Lock()
+
+    def take(self, key: str, rate: float, capacity: float, cost: float = 1.0) -> float:
+        """
+        Prélève des jetons
+
+        Args:
+            key: Clé du seau
+            rate: Jetons ajoutés par seconde
+            capacity: Capacité du seau
+            cost: Jetons à prélever (négatif: restitution, jamais au-delà de la capacité)
+
+        Returns:
+            0 si la requête est acceptée, sinon délai d'attente en secondes
+        """
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated_at = self.buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated_at) * rate)
+            if tokens < cost:
+                self.buckets[key] = (tokens, now)
+                self.buckets.move_to_end(key)
+                return (cost - tokens) / rate
+            self.buckets[key] = (min(capacity, tokens - cost), now)
+            self.buckets.move_to_end(key)
+            while len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+            return 0.0
+
+
+class MongoBuckets:
+    """Seaux à jetons partagés entre workers (mise à jour conditionnelle dans MongoDB)"""
+
+    MAX_ATTEMPTS = 5
+
+    def __init__(self):
+        self.indexes_ready = False
+
+    def _ensure_indexes(self):
+        if not self.indexes_ready:
+            # Seaux pleins depuis longtemps: supprimés automatiquement
+            db.rate_limits.create_index("expiresAt", expireAfterSeconds=0)
+            self.indexes_ready = True
+
+    def take(self, key: str, rate: float, capacity: float, cost: float = 1.0) -> float:
+        """Prélève des jetons (même contrat que MemoryBuckets.take)"""
+        self._ensure_indexes()
+        for _ in range(self.MAX_ATTEMPTS):
+            now = time.time()
+            bucket = db.rate_limits.find_one({"_id": key})
+            if bucket is None:
+                tokens, updated_at = capacity, now
+            else:
+                tokens, updated_at = bucket["tokens"], bucket["updatedAt"]
+            tokens = min(capacity, tokens + max(0.0, now - updated_at) * rate)
+
+            wait = 0.0 if tokens >= cost else (cost - tokens) / rate
+            remaining = min(capacity, tokens - cost) if wait == 0.0 else tokens
+            update = {"tokens": remaining, "updatedAt": now,
+                      "expiresAt": _expires_at(now + (capacity - remaining) / rate)}
+            try:
+                if bucket is None:
+                    db.rate_limits.insert_one({"_id": key, **update})
+                    return wait
+                # Écriture conditionnelle: échoue si un autre worker a modifié le seau entre-temps
+                if db.rate_limits.find_one_and_update(
+                    {"_id": key, "updatedAt": bucket["updatedAt"]}, {"$set": update},
+                    return_document=ReturnDocument.AFTER
+                ) is not None:
+                    return wait
+            except DuplicateKeyError:
+                pass
+        # Trop de concurrence sur le même seau: refus prudent
+        return 1.0 / rate
+
+
+def _expires_at(timestamp: float) -> datetime:
+    """Date d'expiration d'un seau (une minute après son remplissage complet)"""
+    return datetime.fromtimestamp(timestamp + 60, tz=timezone.utc)
+
+
+_memory_buckets = MemoryBuckets(RATE_LIMIT_MAX_KEYS)
+_mongo_buckets = MongoBuckets()
+
+
+def get_buckets():
+    """Retourne le stockage des seaux configuré"""
+    return _mongo_buckets if RATE_LIMIT_BACKEND == "mongo" else _memory_buckets
+
+
+def client_key() -> str:
+    """Identifie le client: utilisateur du JWT, sinon adresse IP"""
+    auth_header = request.headers.get('Authorization', '')
+    if auth_header.startswith('Bearer '):
+        try:
+            return "user:" + verify_token(auth_header.split(" ")[1])['user_id']
+        except Exception:
+            pass  # Token invalide: limité comme un client anonyme
+    address = request.remote_addr or "unknown"
+    if RATE_LIMIT_TRUST_PROXY and request.headers.get('X-Forwarded-For'):
+        address = request.headers['X-Forwarded-For'].split(',')[0].strip()
+    return "ip:" + address
+
+
+def check_rate_limit(category: str, key: str, cost: float = 1.0) -> Optional[float]:
+    """
+    Applique les limites d'une catégorie à un client
+
+    Le seau du client est consulté en premier: un client qui dépasse sa part
+    n'entame pas le plafond global. Si le plafond global est atteint, les
+    jetons du client lui sont rendus.
+
+    Args:
+        category: Catégorie de routes (clé de RATE_LIMITS)
+        key: Identifiant du client
+        cost: Jetons à prélever (un par document analysé)
+
+    Returns:
+        None si la requête est acceptée, sinon délai d'attente en secondes
+    """
+    buckets = get_buckets()
+    per_minute, burst = RATE_LIMITS[category]
+    if per_minute > 0:
+        wait = buckets.take(f"{category}:{key}", per_minute / 60.0, burst, cost)
+        if wait > 0:
+            return wait
+
+    global_per_minute, global_burst = GLOBAL_LIMITS.get(category, (0, 0))
+    if global_per_minute > 0:
+        wait = buckets.take(f"{category}:*", global_per_minute / 60.0, global_burst, cost)
+        if wait > 0:
+            if per_minute > 0:
+                buckets.take(f"{category}:{key}", per_minute / 60.0, burst, cost=-cost)
+            return wait
+    return None
+
+
+def charge_rate_limit(category: str, key: str) -> Optional[int]:
+    """
+    Prélève un jeton pour un client (limitation désactivée ou en erreur: accepté)
+
+    Args:
+        category: Catégorie de routes (clé de RATE_LIMITS)
+        key: Identifiant du client (voir client_key)
+
+    Returns:
+        None si la requête est acceptée, sinon délai Retry-After en secondes entières
+    """
+    if not RATE_LIMIT_ENABLED:
+        return None
+    try:
+        wait = check_rate_limit(category, key)
+    except Exception as e:
+        print(f"Erreur de limitation de débit (requête acceptée): {e}")
+        return None
+    return max(1, math.ceil(wait)) if wait is not None else None
+
+
+def rate_limit_error(retry_after: int) -> Dict:
+    """Corps d'erreur d'un refus de limitation de débit"""
+    return {
+        "error": f"Trop de requêtes, réessayez dans {retry_after} s",
+        "code": "rate_limited",
+        "details": {"retryAfter": retry_after}
+    }
+
+
+def rate_limited(category: str):
+    """Décorateur: limite le débit d'une route (réponse 429 avec Retry-After)"""
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            retry_after = charge_rate_limit(category, client_key()) if RATE_LIMIT_ENABLED else None
+            if retry_after is not None:
+                response = jsonify(rate_limit_error(retry_after))
+                response.status_code = 429
+                response.headers['Retry-After'] = str(retry_after)
+                return response
+            return f(*args, **kwargs)
+        return decorated
+    return decorator
+
+
+def get_rate_limit_settings() -> Dict:
+    """Limites configurées (pour /api/health)"""
+    return {
+        "enabled": RATE_LIMIT_ENABLED,
+        "backend": RATE_LIMIT_BACKEND,
+        "limits": {category: {"perMinute": limit[0], "burst": limit[1]} for category, limit in RATE_LIMITS.items()},
+        "global": {category: {"perMinute": limit[0], "burst": limit[1]} for category, limit in GLOBAL_LIMITS.items()}
+    }
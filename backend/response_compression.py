@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Module de compression des réponses HTTP
+Compresse en brotli (si disponible) ou gzip, selon l'en-tête Accept-Encoding,
+les réponses volumineuses des routes qui le demandent (historique, lot).
+Les réponses diffusées sont compressées au fil de l'eau: chaque événement
+est vidé immédiatement pour que la progression reste visible.
+"""
+
+import os
+import zlib
+from functools import wraps
+from typing import Callable, Iterator, Optional
+from flask import request, make_response
+from dotenv import load_dotenv
+
+load_dotenv(dotenv_path='../.env')
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Configuration
+RESPONSE_COMPRESSION_ENABLED = os.getenv("RESPONSE_COMPRESSION_ENABLED", "true").lower() == "true"
+RESPONSE_COMPRESSION_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))  # Compromis débit / taux pour du JSON dynamique
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    Choisit l'encodage de contenu accepté par le client
+
+    Args:
+        accept_encoding: Valeur de l'en-tête Accept-Encoding
+
+    Returns:
+        "br", "gzip" ou None
+    """
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.strip().lower()] = quality
+
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", accepted.get("*", 0)) > 0:
+        return "gzip"
+    return None
+
+
+class StreamCompressor:
+    """Compresseur incrémental gzip ou brotli"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self.compressor = brotli.Compressor(mode=brotli.MODE_TEXT, quality=BROTLI_QUALITY)
+        else:
+            self.compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # 31: en-tête gzip
+
+    def compress(self, data: bytes, flush: bool = False) -> bytes:
+        """Compresse un fragment; flush vide le tampon pour l'envoyer tout de suite"""
+        if self.encoding == "br":
+            out = self.compressor.process(data)
+            return out + self.compressor.flush() if flush else out
+        out = self.compressor.compress(data)
+        return out + self.compressor.flush(zlib.Z_SYNC_FLUSH) if flush else out
+
+    def finish(self) -> bytes:
+        """Termine le flux compressé"""
+        if self.encoding == "br":
+            return self.compressor.finish()
+        return self.compressor.flush(zlib.Z_FINISH)
+
+
+def compress_stream(chunks: Iterator, encoding: str) -> Iterator[bytes]:
+    """Compresse une réponse diffusée, fragment par fragment"""
+    compressor = StreamCompressor(encoding)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        out = compressor.compress(chunk, flush=True)
+        if out:
+            yield out
+    yield compressor.finish()
+
+
+def compressed(f: Callable) -> Callable:
+    """Décorateur: compresse la réponse d'une route selon Accept-Encoding"""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        response = make_response(f(*args, **kwargs))
+        if not RESPONSE_COMPRESSION_ENABLED or response.status_code < 200 or response.status_code >= 300:
+            return response
+        response.vary.add("Accept-Encoding")
+        if "Content-Encoding" in response.headers:
+            return response
+
+        encoding = choose_encoding(request.headers.get("Accept-Encoding", ""))
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = compress_stream(response.response, encoding)
+            response.headers.pop("Content-Length", None)
+        else:
+            data = response.get_data()
+            if len(data) < RESPONSE_COMPRESSION_MIN_BYTES:
+                return response
+            compressor = StreamCompressor(encoding)
+            response.set_data(compressor.compress(data) + compressor.finish())
+        response.headers["Content-Encoding"] = encoding
+        # ETag fort propre à chaque encodage (octets différents)
+        etag, weak = response.get_etag()
+        if etag:
+            response.set_etag(f"{etag}-{encoding}", weak)
+        return response
+    return decorated
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Profil de démarrage du backend
+Mesure où passe le temps de démarrage: import de l'application
+(python -X importtime, modules les plus coûteux) puis délai avant la première
+réponse de /api/health d'un serveur lancé pour l'occasion, avec les modules
+différés (lazy_imports) déjà chargés à ce moment
+
+Usage: python startup_profile.py [--top 15] [--port 5055] [--no-server]
+"""
+
+import os
+import re
+import json
+import sys
+import time
+import signal
+import argparse
+import subprocess
+import urllib.request
+from typing import Dict, List, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+IMPORTTIME_PATTERN = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$')
+
+
+def profile_imports(module: str = "app") -> Tuple[int, List[Dict]]:
+    """
+    Importe le module dans un interpréteur neuf avec -X importtime
+
+    Args:
+        module: Module à importer
+
+    Returns:
+        Tuple (durée totale en µs, modules {name, self_us, cumulative_us, depth})
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, timeout=120
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Import de {module} impossible:\n{result.stderr[-2000:]}")
+
+    modules = []
+    total = 0
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_PATTERN.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        depth = (len(indent) - 1) // 2
+        modules.append({
+            "name": name, "self_us": int(self_us), "cumulative_us": int(cumulative_us), "depth": depth
+        })
+        if depth == 0:
+            total += int(cumulative_us)
+    return total, modules
+
+
+def measure_time_to_healthy(port: int, timeout: float = 60.0) -> Tuple[float, Dict]:
+    """
+    Lance le serveur et mesure le délai avant la première réponse de /api/health
+
+    Args:
+        port: Port d'écoute du serveur de test
+        timeout: Délai maximal
+
+    Returns:
+        Tuple (durée en secondes, réponse de /api/health)
+    """
+    env = dict(os.environ, PORT=str(port), OLLAMA_PREWARM="false")
+    started_at = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "app.py"], cwd=BACKEND_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        start_new_session=(os.name == "posix")  # Groupe arrêté avec le processus du rechargeur
+    )
+    url = f"http://127.0.0.1:{port}/api/health"
+    delay = 0.01
+    try:
+        while time.perf_counter() - started_at < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"Le serveur s'est arrêté (code {process.returncode})")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started_at, json.loads(response.read())
+            except OSError:
+                pass
+            time.sleep(delay)
+            delay = min(delay * 2, 0.2)
+        raise TimeoutError(f"/api/health sans réponse après {timeout:.0f} s")
+    finally:
+        if os.name == "posix":
+            os.killpg(process.pid, signal.SIGTERM)
+        else:
+            process.terminate()
+        process.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profil de démarrage du backend")
+    parser.add_argument("--top", type=int, default=15, help="Nombre de modules affichés")
+    parser.add_argument("--port", type=int, default=5055, help="Port du serveur de test")
+    parser.add_argument("--no-server", action="store_true", help="Ne pas mesurer le délai jusqu'à /api/health")
+    args = parser.parse_args()
+
+    total, modules = profile_imports("app")
+    print(f"Imports au démarrage (interpréteur et app): {total / 1000:.0f} ms")
+    print(f"\nModules les plus coûteux (cumulé, {args.top} premiers):")
+    for entry in sorted(modules, key=lambda m: m["cumulative_us"], reverse=True)[:args.top]:
+        print(f"  {entry['cumulative_us'] / 1000:8.1f} ms  {entry['self_us'] / 1000:7.1f} ms propre  "
+              f"{'  ' * entry['depth']}{entry['name']}")
+
+    if not args.no_server:
+        elapsed, health = measure_time_to_healthy(args.port)
+        print(f"\nPremière réponse de /api/health: {elapsed * 1000:.0f} ms après le lancement")
+        lazy_imports = health.get("lazyImports", {})
+        if lazy_imports:
+            print("Modules différés déjà chargés:")
+            for name, load_ms in sorted(lazy_imports.items(), key=lambda item: item[1], reverse=True):
+                print(f"  {load_ms:8d} ms  {name}")
+        else:
+            print("Aucun module différé chargé avant la première requête")
+
+
+if __name__ == "__main__":
+    main()
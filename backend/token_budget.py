@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Module de budget de tokens pour les appels LLM
+Compte les tokens avec un tokenizer local et remplit la fenêtre de contexte
+avec un maximum de pages entières du document, complétées par les premières
+unités entières (paragraphes, titres, tableaux) de la page suivante
+"""
+
+import os
+import re
+import hashlib
+import tempfile
+from functools import lru_cache
+from typing import Dict, List, Tuple
+from dotenv import load_dotenv
+
+load_dotenv(dotenv_path='../.env')
+
+# Configuration
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "8192"))
+LLM_MAX_OUTPUT_TOKENS = int(os.getenv("LLM_MAX_OUTPUT_TOKENS", "1500"))
+LLM_TOKENIZER_PATH = os.getenv("LLM_TOKENIZER_PATH")  # tokenizer.json local (HuggingFace)
+# Répertoire du cache tiktoken: y déposer cl100k_base.tiktoken sous le nom
+# sha1(TIKTOKEN_ENCODING_URL) pour un comptage sans accès réseau
+TIKTOKEN_CACHE_DIR = os.getenv("TIKTOKEN_CACHE_DIR") or os.getenv("DATA_GYM_CACHE_DIR") \
+    or os.path.join(tempfile.gettempdir(), "data-gym-cache")
+TIKTOKEN_ENCODING_URL = "https://openaipublic.blob.core.windows.net/encodings/cl100k_base.tiktoken"
+
+# Taille de la fenêtre de contexte par modèle connu
+MODEL_CONTEXT_WINDOWS = {
+    "llama3-70b-8192": 8192,
+    "llama3-8b-8192": 8192,
+}
+
+# Marge de sécurité pour le gabarit de chat (rôles, séparateurs)
+CHAT_TEMPLATE_OVERHEAD = 32
+
+PAGE_MARKER_PATTERN = re.compile(r'(?=^--- Page \d+ ---$)', re.MULTILINE)
+BLOCK_SEPARATOR_PATTERN = re.compile(r'\n[ \t]*\n\s*')
+HEADING_LINE_PREFIX = "## "
+
+
+def tiktoken_encoding_cached() -> bool:
+    """Le fichier cl100k_base est-il déjà dans le cache tiktoken (pas de téléchargement)"""
+    cache_key = hashlib.sha1(TIKTOKEN_ENCODING_URL.encode("utf-8")).hexdigest()
+    return os.path.exists(os.path.join(TIKTOKEN_CACHE_DIR, cache_key))
+
+
+class TokenCounter:
+    """Compteur de tokens basé sur un tokenizer local"""
+
+    def __init__(self, model: str):
+        """
+        Initialise le compteur pour un modèle
+
+        Args:
+            model: Nom du modèle (OLLAMA_MODEL ou modèle Groq)
+        """
+        self.model = model
+        self.backend = "heuristic"
+        self._encode = None
+
+        # 1. Tokenizer HuggingFace local si fourni (compte exact)
+        if LLM_TOKENIZER_PATH and os.path.exists(LLM_TOKENIZER_PATH):
+            try:
+                from tokenizers import Tokenizer
+                tokenizer = Tokenizer.from_file(LLM_TOKENIZER_PATH)
+                self._encode = lambda text: tokenizer.encode(text, add_special_tokens=False).ids
+                self.backend = "tokenizers"
+                return
+            except Exception as e:
+                print(f"Tokenizer local non chargé ({LLM_TOKENIZER_PATH}): {e}")
+
+        # 2. tiktoken cl100k_base (vocabulaire ~100k de GPT-4): approximation du
+        # tokenizer Llama 3 (128k), utilisée seulement si le fichier est en cache local
+        if not tiktoken_encoding_cached():
+            return  # Estimation heuristique plutôt qu'un téléchargement au premier appel
+        try:
+            import tiktoken
+            encoding = tiktoken.get_encoding("cl100k_base")
+            self._encode = lambda text: encoding.encode(text, disallowed_special=())
+            self.backend = "tiktoken"
+        except Exception:
+            pass  # Repli sur l'estimation heuristique
+
+    def count(self, text: str) -> int:
+        """
+        Compte les tokens d'un texte
+
+        Args:
+            text: Texte à mesurer
+
+        Returns:
+            Nombre de tokens
+        """
+        if not text:
+            return 0
+        if self._encode is not None:
+            return len(self._encode(text))
+        # Estimation prudente: ~3 caractères par token pour le français et les chiffres
+        return len(text) // 3 + 1
+
+
+@lru_cache(maxsize=8)
+def get_token_counter(model: str) -> TokenCounter:
+    """Retourne un compteur de tokens partagé pour le modèle"""
+    return TokenCounter(model)
+
+
+def get_context_window(model: str) -> int:
+    """
+    Retourne la taille de la fenêtre de contexte du modèle
+
+    Args:
+        model: Nom du modèle
+
+    Returns:
+        Nombre de tokens de la fenêtre de contexte
+    """
+    if model in MODEL_CONTEXT_WINDOWS:
+        return MODEL_CONTEXT_WINDOWS[model]
+    # Modèles Ollama: fenêtre fixée par num_ctx
+    return OLLAMA_NUM_CTX
+
+
+def split_pages(text: str) -> List[str]:
+    """
+    Découpe le texte extrait sur les marqueurs de page (--- Page N ---)
+
+    Args:
+        text: Texte produit par extract_text_from_pdf
+
+    Returns:
+        Liste des blocs de page (marqueur inclus)
+    """
+    pages = [page.strip() for page in PAGE_MARKER_PATTERN.split(text)]
+    return [page for page in pages if page]
+
+
+def split_blocks(page: str) -> List[str]:
+    """
+    Découpe un bloc de page en unités séparées par une ligne vide
+
+    Args:
+        page: Bloc de page (le marqueur reste attaché à la première unité)
+
+    Returns:
+        Paragraphes, titres et tableaux de la page
+    """
+    return [block for block in BLOCK_SEPARATOR_PATTERN.split(page.strip()) if block.strip()]
+
+
+def fit_blocks(page: str, max_tokens: int, counter: TokenCounter) -> str:
+    """
+    Premières unités entières d'une page qui tiennent dans max_tokens
+
+    Un titre n'est pas retenu sans le contenu qui le suit.
+
+    Args:
+        page: Bloc de page
+        max_tokens: Budget en tokens
+        counter: Compteur de tokens
+
+    Returns:
+        Début de la page (vide si la première unité ne tient pas)
+    """
+    kept = []
+    used = 0
+    separator_cost = counter.count('\n\n')
+    for block in split_blocks(page):
+        cost = counter.count(block) + (separator_cost if kept else 0)
+        if used + cost > max_tokens:
+            break
+        kept.append(block)
+        used += cost
+    while kept and kept[-1].rsplit('\n', 1)[-1].startswith(HEADING_LINE_PREFIX):
+        kept.pop()
+    return '\n\n'.join(kept)
+
+
+def truncate_to_tokens(text: str, max_tokens: int, counter: TokenCounter) -> str:
+    """
+    Tronque un texte sur une limite de ligne pour tenir dans max_tokens
+
+    Args:
+        text: Texte à tronquer
+        max_tokens: Budget en tokens
+        counter: Compteur de tokens
+
+    Returns:
+        Texte tronqué
+    """
+    kept = []
+    used = 0
+    for line in text.split('\n'):
+        cost = counter.count(line + '\n')
+        if used + cost > max_tokens:
+            break
+        kept.append(line)
+        used += cost
+    return '\n'.join(kept)
+
+
+def pack_document(text: str, model: str, system_prompt: str, user_prefix: str = "",
+                  max_output_tokens: int = LLM_MAX_OUTPUT_TOKENS) -> Tuple[str, Dict]:
+    """
+    Remplit la fenêtre de contexte avec un maximum de pages entières
+
+    Args:
+        text: Texte du document
+        model: Nom du modèle cible
+        system_prompt: Prompt système envoyé avec le document
+        user_prefix: Texte ajouté avant le document dans le message utilisateur
+        max_output_tokens: Tokens réservés pour la réponse
+
+    Returns:
+        Tuple (texte_retenu, statistiques_budget)
+    """
+    counter = get_token_counter(model)
+    context_window = get_context_window(model)
+    prompt_tokens = counter.count(system_prompt) + counter.count(user_prefix) + CHAT_TEMPLATE_OVERHEAD
+    budget = max(context_window - max_output_tokens - prompt_tokens, 0)
+
+    pages = split_pages(text)
+    kept = []
+    used = 0
+    separator_cost = counter.count('\n\n')
+
+    for page in pages:
+        cost = counter.count(page) + (separator_cost if kept else 0)
+        if used + cost > budget:
+            break
+        kept.append(page)
+        used += cost
+
+    whole_pages = len(kept)
+    truncated = False
+    if len(kept) < len(pages):
+        # Page suivante incomplète: ses premières unités entières complètent la fenêtre
+        remaining = budget - used - (separator_cost if kept else 0)
+        partial = fit_blocks(pages[len(kept)], remaining, counter)
+        if partial:
+            used += counter.count(partial) + (separator_cost if kept else 0)
+            kept.append(partial)
+            truncated = True
+    if not kept and pages:
+        # Première unité trop longue: on la coupe sur une fin de ligne
+        kept.append(truncate_to_tokens(pages[0], budget, counter))
+        used = counter.count(kept[0])
+        truncated = True
+
+    stats = {
+        'model': model,
+        'tokenizer': counter.backend,
+        'context_window': context_window,
+        'max_output_tokens': max_output_tokens,
+        'prompt_tokens': prompt_tokens,
+        'document_tokens': used,
+        'estimated_input_tokens': prompt_tokens + used,
+        'pages_total': len(pages),
+        'pages_included': whole_pages,
+        'truncated': truncated or whole_pages < len(pages)
+    }
+
+    return '\n\n'.join(kept), stats
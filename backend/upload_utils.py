@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Module de réception des fichiers envoyés
+Copie les uploads par blocs en appliquant les limites de taille, calcule
+l'empreinte SHA-256 à la volée et bascule sur disque au-delà d'un seuil
+pour que PyMuPDF ouvre le fichier par son chemin plutôt qu'en mémoire
+"""
+
+import io
+import os
+import hashlib
+import tempfile
+from typing import Optional
+from dotenv import load_dotenv
+
+from lazy_imports import lazy_import
+
+load_dotenv(dotenv_path='../.env')
+
+fitz = lazy_import("fitz")  # PyMuPDF, chargé à la première utilisation
+
+# Configuration
+MAX_UPLOAD_BYTES = int(float(os.getenv("MAX_UPLOAD_MB", "50")) * 1024 * 1024)
+MAX_REQUEST_BYTES = int(float(os.getenv("MAX_REQUEST_MB", "300")) * 1024 * 1024)
+SPOOL_THRESHOLD_BYTES = int(float(os.getenv("UPLOAD_SPOOL_THRESHOLD_MB", "4")) * 1024 * 1024)
+MAX_PDF_PAGES = int(os.getenv("MAX_PDF_PAGES", "2000"))
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR") or None  # Répertoire temporaire système par défaut
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class UploadTooLarge(Exception):
+    """Le fichier dépasse la taille maximale autorisée"""
+
+
+class SpooledUpload:
+    """Fichier reçu, conservé en mémoire ou sur disque selon sa taille"""
+
+    def __init__(self, filename: str, sha256: str, size: int,
+                 buffer: Optional[io.BytesIO] = None, path: Optional[str] = None):
+        self.filename = filename
+        self.sha256 = sha256
+        self.size = size
+        self.buffer = buffer
+        self.path = path
+
+    def read_head(self, size: int) -> bytes:
+        """Lit les premiers octets du fichier (inspection de l'en-tête)"""
+        if self.path is not None:
+            with open(self.path, 'rb') as f:
+                return f.read(size)
+        return bytes(self.buffer.getbuffer()[:size])
+
+    def open_pdf(self, check_pages: bool = True) -> "fitz.Document":
+        """
+        Ouvre le PDF sans copie supplémentaire du contenu
+
+        Args:
+            check_pages: Refuser les documents de plus de MAX_PDF_PAGES pages
+
+        Returns:
+            Document PyMuPDF
+
+        Raises:
+            Exception: Si le document dépasse MAX_PDF_PAGES
+        """
+        if self.path is not None:
+            doc = fitz.open(self.path, filetype="pdf")
+        else:
+            doc = fitz.open(stream=self.buffer.getbuffer(), filetype="pdf")
+        if check_pages and doc.page_count > MAX_PDF_PAGES:
+            page_count = doc.page_count
+            doc.close()
+            raise Exception(f"Le PDF contient {page_count} pages (maximum {MAX_PDF_PAGES})")
+        return doc
+
+    def cleanup(self):
+        """Supprime le fichier temporaire éventuel"""
+        if self.path is not None:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+            self.path = None
+        self.buffer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.cleanup()
+
+
+def spool_upload(stream, filename: str, max_bytes: int = MAX_UPLOAD_BYTES,
+                 threshold: int = SPOOL_THRESHOLD_BYTES) -> SpooledUpload:
+    """
+    Copie un flux par blocs en calculant son empreinte
+
+    Args:
+        stream: Flux lisible (FileStorage, entrée d'archive, BytesIO)
+        filename: Nom du fichier
+        max_bytes: Taille maximale autorisée
+        threshold: Taille au-delà de laquelle le contenu est écrit sur disque
+
+    Returns:
+        SpooledUpload
+
+    Raises:
+        UploadTooLarge: Si la taille maximale est dépassée
+    """
+    digest = hashlib.sha256()
+    buffer = io.BytesIO()
+    spool_file = None
+    size = 0
+
+    try:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLarge(
+                    f"Le fichier {filename} dépasse la taille maximale de {max_bytes // (1024 * 1024)} Mo"
+                )
+            digest.update(chunk)
+
+            if spool_file is None and size > threshold:
+                # Bascule sur disque: le contenu déjà lu y est transféré une seule fois
+                spool_file = tempfile.NamedTemporaryFile(
+                    prefix="apocal_upload_", suffix=".pdf", dir=UPLOAD_SPOOL_DIR, delete=False
+                )
+                spool_file.write(buffer.getbuffer())
+                buffer = None
+            if spool_file is not None:
+                spool_file.write(chunk)
+            else:
+                buffer.write(chunk)
+    except BaseException:
+        if spool_file is not None:
+            spool_file.close()
+            os.unlink(spool_file.name)
+        raise
+
+    if spool_file is not None:
+        spool_file.close()
+        return SpooledUpload(filename, digest.hexdigest(), size, path=spool_file.name)
+    return SpooledUpload(filename, digest.hexdigest(), size, buffer=buffer)
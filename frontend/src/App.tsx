@@ -43,8 +43,8 @@ function AppContent() {
           await addAnalysis({
             fileName: file.name,
             summary: response.data.summary,
-            keyPoints: response.data.keyPoints,
-            actions: response.data.actions,
+            keyPointCount: response.data.keyPoints.length,
+            actionCount: response.data.actions.length,
           });
         }
       } else {
@@ -64,14 +64,24 @@ function AppContent() {
     setFileName('');
   }, []);
 
-  const handleViewAnalysis = useCallback((analysis: AnalysisHistory) => {
-    setResult({
-      summary: analysis.summary,
-      keyPoints: analysis.keyPoints,
-      actions: analysis.actions,
-    });
+  const handleViewAnalysis = useCallback(async (analysis: AnalysisHistory) => {
     setFileName(analysis.fileName);
-    setUploadState('success');
+    setError(null);
+    setUploadState('uploading');
+
+    // L'historique ne contient qu'un aperçu: charger l'analyse complète
+    const response = await apiService.getAnalysis(analysis.id);
+    if (response.success && response.data) {
+      setResult({
+        summary: response.data.summary,
+        keyPoints: response.data.keyPoints,
+        actions: response.data.actions,
+      });
+      setUploadState('success');
+    } else {
+      setError(response.error?.message || 'Impossible de charger l\'analyse');
+      setUploadState('error');
+    }
   }, []);
 
   const handleGoHome = useCallback(() => {
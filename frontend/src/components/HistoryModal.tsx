@@ -1,6 +1,7 @@
-import React from 'react';
-import { X, FileText, Calendar, Download, Eye } from 'lucide-react';
+import React, { useEffect, useState } from 'react';
+import { X, FileText, Calendar, Download, Eye, Search } from 'lucide-react';
 import { useAuth } from '../contexts/AuthContext';
+import { apiService } from '../services/api';
 import { AnalysisHistory } from '../types';
 
 interface HistoryModalProps {
@@ -11,9 +12,27 @@ interface HistoryModalProps {
 
 const HistoryModal: React.FC<HistoryModalProps> = ({ isOpen, onClose, onViewAnalysis }) => {
   const { analysisHistory } = useAuth();
+  const [query, setQuery] = useState('');
+  const [searchResults, setSearchResults] = useState<AnalysisHistory[] | null>(null);
+
+  // Recherche côté serveur (toutes les analyses), déclenchée après une courte pause de saisie
+  useEffect(() => {
+    const trimmed = query.trim();
+    if (!trimmed) {
+      setSearchResults(null);
+      return;
+    }
+    const timer = setTimeout(async () => {
+      const response = await apiService.searchAnalyses(trimmed);
+      setSearchResults(response.success && response.data ? response.data.results : []);
+    }, 300);
+    return () => clearTimeout(timer);
+  }, [query]);
 
   if (!isOpen) return null;
 
+  const analyses = searchResults ?? analysisHistory;
+
   const formatDate = (dateString: string) => {
     return new Date(dateString).toLocaleDateString('fr-FR', {
       year: 'numeric',
@@ -39,10 +58,20 @@ const HistoryModal: React.FC<HistoryModalProps> = ({ isOpen, onClose, onViewAnal
               <X className="w-5 h-5 text-gray-500 dark:text-gray-400" />
             </button>
           </div>
+          <div className="relative mt-4">
+            <Search className="w-4 h-4 text-gray-400 absolute left-3 top-1/2 -translate-y-1/2" />
+            <input
+              type="search"
+              value={query}
+              onChange={(e) => setQuery(e.target.value)}
+              placeholder="Rechercher une analyse (nom, résumé, points clés...)"
+              className="w-full pl-9 pr-3 py-2 rounded-lg border border-gray-200 dark:border-gray-600 bg-white dark:bg-gray-700 text-gray-900 dark:text-white"
+            />
+          </div>
         </div>
 
-        <div className="p-6 overflow-y-auto max-h-[calc(90vh-120px)]">
-          {analysisHistory.length === 0 ? (
+        <div className="p-6 overflow-y-auto max-h-[calc(90vh-180px)]">
+          {analyses.length === 0 ? (
             <div className="text-center py-12">
               <FileText className="w-16 h-16 text-gray-300 dark:text-gray-600 mx-auto mb-4" />
               <h3 className="text-lg font-semibold text-gray-900 dark:text-white mb-2">
@@ -54,7 +83,7 @@ const HistoryModal: React.FC<HistoryModalProps> = ({ isOpen, onClose, onViewAnal
             </div>
           ) : (
             <div className="space-y-4">
-              {analysisHistory.map((analysis) => (
+              {analyses.map((analysis) => (
                 <div
                   key={analysis.id}
                   className="bg-gray-50 dark:bg-gray-700/50 rounded-xl p-6 border border-gray-200 dark:border-gray-600 hover:shadow-md transition-shadow duration-200"
@@ -81,9 +110,9 @@ const HistoryModal: React.FC<HistoryModalProps> = ({ isOpen, onClose, onViewAnal
                       </p>
                       
                       <div className="flex items-center space-x-4 text-sm text-gray-600 dark:text-gray-300">
-                        <span>{analysis.keyPoints.length} points clés</span>
+                        <span>{analysis.keyPointCount} points clés</span>
                         <span>•</span>
-                        <span>{analysis.actions.length} actions recommandées</span>
+                        <span>{analysis.actionCount} actions recommandées</span>
                       </div>
                     </div>
                     
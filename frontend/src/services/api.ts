@@ -5,6 +5,11 @@ import {
   User, 
   AnalysisResult,
   AnalysisHistory,
+  AnalysisDetail,
+  AnalysisSearchResponse,
+  BatchEvent,
+  BatchProgressEvent,
+  BatchCompleteEvent,
   ApiResponse,
   ApiError 
 } from '../types';
@@ -111,6 +116,61 @@ class ApiService {
     return this.handleResponse<AnalysisResult>(response);
   }
 
+  async uploadBatch(
+    files: File[],
+    onProgress?: (event: BatchProgressEvent) => void
+  ): Promise<ApiResponse<BatchCompleteEvent>> {
+    const formData = new FormData();
+    files.forEach(file => {
+      const isArchive = file.name.toLowerCase().endsWith('.zip');
+      formData.append(isArchive ? 'archive' : 'files', file);
+    });
+
+    const token = localStorage.getItem('token');
+    const headers: HeadersInit = {};
+    if (token) {
+      headers.Authorization = `Bearer ${token}`;
+    }
+
+    const response = await fetch(`${API_BASE_URL}/analysis/batch`, {
+      method: 'POST',
+      headers,
+      body: formData,
+    });
+
+    if (!response.ok || !response.body) {
+      return this.handleResponse<BatchCompleteEvent>(response);
+    }
+
+    // Lecture du flux NDJSON: un événement de progression par document
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let complete: BatchCompleteEvent | undefined;
+
+    for (;;) {
+      const { done, value } = await reader.read();
+      buffer += decoder.decode(value, { stream: !done });
+      const lines = buffer.split('\n');
+      buffer = lines.pop() ?? '';
+      for (const line of lines) {
+        if (!line.trim()) continue;
+        const event = JSON.parse(line) as BatchEvent;
+        if (event.type === 'complete') {
+          complete = event;
+        } else {
+          onProgress?.(event);
+        }
+      }
+      if (done) break;
+    }
+
+    if (!complete) {
+      return { success: false, error: { message: 'Traitement du lot interrompu' } };
+    }
+    return { success: true, data: complete };
+  }
+
   async getAnalysisHistory(): Promise<ApiResponse<AnalysisHistory[]>> {
     const response = await fetch(`${API_BASE_URL}/analysis/history`, {
       method: 'GET',
@@ -120,6 +180,25 @@ class ApiService {
     return this.handleResponse<AnalysisHistory[]>(response);
   }
 
+  async searchAnalyses(query: string, page = 1): Promise<ApiResponse<AnalysisSearchResponse>> {
+    const params = new URLSearchParams({ q: query, page: String(page) });
+    const response = await fetch(`${API_BASE_URL}/analysis/search?${params}`, {
+      method: 'GET',
+      headers: this.getAuthHeaders(),
+    });
+
+    return this.handleResponse<AnalysisSearchResponse>(response);
+  }
+
+  async getAnalysis(analysisId: string): Promise<ApiResponse<AnalysisDetail>> {
+    const response = await fetch(`${API_BASE_URL}/analysis/${analysisId}`, {
+      method: 'GET',
+      headers: this.getAuthHeaders(),
+    });
+
+    return this.handleResponse<AnalysisDetail>(response);
+  }
+
   async deleteAnalysis(analysisId: string): Promise<ApiResponse<void>> {
     const response = await fetch(`${API_BASE_URL}/analysis/${analysisId}`, {
       method: 'DELETE',
@@ -1,7 +1,19 @@
+export interface SimilarAnalysis {
+  analysisId: string;
+  fileName: string;
+  similarity: number;
+}
+
+export type DocumentProfile = 'default' | 'invoice' | 'contract' | 'long_report' | 'short_memo';
+
 export interface AnalysisResult {
   summary: string;
   keyPoints: string[];
   actions: string[];
+  similarTo?: SimilarAnalysis;
+  revisionOf?: string;
+  changedPages?: number[];
+  profile?: DocumentProfile;
 }
 
 export interface UploadResponse {
@@ -38,15 +50,53 @@ export interface AuthResponse {
   token: string;
 }
 
+// Vue liste de l'historique: aperçu du résumé, le détail est chargé à la demande
 export interface AnalysisHistory {
   id: string;
   fileName: string;
   uploadDate: string;
   summary: string;
-  keyPoints: string[];
-  actions: string[];
+  keyPointCount: number;
+  actionCount: number;
 }
 
+export interface AnalysisSearchResult extends AnalysisHistory {
+  score: number;
+}
+
+export interface AnalysisSearchResponse {
+  results: AnalysisSearchResult[];
+  total: number;
+  page: number;
+  limit: number;
+}
+
+export interface AnalysisDetail extends AnalysisResult {
+  id: string;
+  fileName: string;
+  uploadDate: string;
+}
+
+// Types pour l'analyse par lot
+export interface BatchProgressEvent {
+  type: 'progress';
+  index: number;
+  fileName: string;
+  status: 'done' | 'error';
+  result?: AnalysisResult;
+  error?: string;
+}
+
+export interface BatchCompleteEvent {
+  type: 'complete';
+  total: number;
+  succeeded: number;
+  failed: number;
+  saved: number;
+}
+
+export type BatchEvent = BatchProgressEvent | BatchCompleteEvent;
+
 // Types pour les erreurs API
 export interface ApiError {
   message: string;
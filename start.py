@@ -2,16 +2,30 @@
 """
 Script de démarrage simple pour APOCALIPSSI
 Lance automatiquement le backend et le frontend avec configuration Ollama
+
+Mode rapide (python start.py --fast): étapes indépendantes en parallèle,
+étapes déjà réalisées ignorées (état local indexé par l'empreinte des
+fichiers de dépendances), attentes remplacées par des sondes de disponibilité.
+Option --force pour tout refaire.
 """
 
 import os
 import sys
+import json
+import hashlib
 import subprocess
+import threading
 import time
 import platform
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+OLLAMA_MODEL = "llama3.2:3b"
+OLLAMA_TAGS_URL = "http://localhost:11434/api/tags"
+BACKEND_HEALTH_URL = "http://localhost:5000/api/health"
+STATE_FILE = Path(__file__).resolve().parent / ".cache" / "start_state.json"
+
 def print_step(message):
     """Afficher une étape avec formatage"""
     print(f"\n{'='*50}")
@@ -45,6 +59,54 @@ def run_command(command, cwd=None, shell=True, capture_output=False, timeout=300
     except subprocess.TimeoutExpired:
         return False, "Timeout - commande trop longue"
 
+def wait_for_http(url, timeout=30, label="service"):
+    """Sonder une URL jusqu'à ce qu'elle réponde, avec un délai croissant entre les essais"""
+    deadline = time.monotonic() + timeout
+    delay = 0.1
+    while True:
+        try:
+            if requests.get(url, timeout=2).status_code == 200:
+                return True
+        except requests.RequestException:
+            pass
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            print_error(f"Timeout: {label} ne répond pas ({url})")
+            return False
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, 2.0)
+
+def file_fingerprint(*paths):
+    """Empreinte SHA-256 du contenu de fichiers (fichiers absents inclus)"""
+    digest = hashlib.sha256(sys.executable.encode())
+    for path in paths:
+        digest.update(str(path).encode())
+        if Path(path).exists():
+            digest.update(Path(path).read_bytes())
+    return digest.hexdigest()
+
+def load_state():
+    """Lire l'état des étapes déjà réalisées"""
+    try:
+        return json.loads(STATE_FILE.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+_state_lock = threading.Lock()
+
+def cached_step(state, name, fingerprint, func, artifact=None):
+    """Exécuter une étape sauf si elle a déjà réussi avec la même empreinte"""
+    if state.get(name) == fingerprint and (artifact is None or Path(artifact).exists()):
+        print_success(f"Étape '{name}' à jour, ignorée")
+        return True
+    if not func():
+        return False
+    with _state_lock:
+        state[name] = fingerprint
+        STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        STATE_FILE.write_text(json.dumps(state, indent=2), encoding="utf-8")
+    return True
+
 def check_ollama_installed():
     """Vérifier si Ollama est déjà installé"""
     # Essayer d'abord avec le PATH normal
@@ -136,35 +198,46 @@ def start_ollama_service():
     print_step("Démarrage du service Ollama")
     
     try:
+        # Service déjà lancé (autre terminal, service système)
+        try:
+            if requests.get(OLLAMA_TAGS_URL, timeout=1).status_code == 200:
+                print_success("Service Ollama déjà actif")
+                return True
+        except requests.RequestException:
+            pass
+
         # Démarrer Ollama en arrière-plan
         subprocess.Popen(['ollama', 'serve'], 
                         stdout=subprocess.DEVNULL, 
                         stderr=subprocess.DEVNULL)
         
-        # Attendre que le service soit prêt
-        for i in range(30):  # Attendre max 30 secondes
-            try:
-                response = requests.get("http://localhost:11434/api/tags", timeout=2)
-                if response.status_code == 200:
-                    print_success("Service Ollama démarré avec succès")
-                    return True
-            except:
-                pass
-            time.sleep(1)
-            print(f"⏳ Attente du service Ollama... ({i+1}/30)")
-        
-        print_error("Timeout: Le service Ollama n'a pas démarré")
+        # Attendre que le service soit prêt (max 30 secondes)
+        if wait_for_http(OLLAMA_TAGS_URL, timeout=30, label="le service Ollama"):
+            print_success("Service Ollama démarré avec succès")
+            return True
         return False
         
     except Exception as e:
         print_error(f"Erreur lors du démarrage: {e}")
         return False
 
-def download_ollama_model(model_name="llama3.2:3b"):
+def ollama_model_present(model_name):
+    """Vérifier si le modèle est déjà téléchargé"""
+    try:
+        models = requests.get(OLLAMA_TAGS_URL, timeout=2).json().get("models", [])
+        return any(model.get("name") == model_name for model in models)
+    except (requests.RequestException, ValueError):
+        return False
+
+def download_ollama_model(model_name=OLLAMA_MODEL):
     """Télécharger un modèle Ollama"""
     print_step(f"Téléchargement du modèle {model_name}")
     
     try:
+        if ollama_model_present(model_name):
+            print_success(f"Modèle {model_name} déjà présent")
+            return True
+
         print_info("Téléchargement en cours... (cela peut prendre plusieurs minutes)")
         success, output = run_command(f"ollama pull {model_name}", capture_output=True)
         
@@ -258,8 +331,7 @@ def setup_ollama():
         return False
     
     # Télécharger le modèle
-    model_name = "llama3.2:3b"
-    if not download_ollama_model(model_name):
+    if not download_ollama_model(OLLAMA_MODEL):
         print_error("Téléchargement du modèle échoué")
         print_info("L'application continuera avec l'API externe si configurée")
         return False
@@ -267,28 +339,12 @@ def setup_ollama():
     print_success("Configuration Ollama terminée avec succès")
     return True
 
-def main():
-    """Fonction principale simplifiée"""
-    print("🚀 APOCALIPSSI - Démarrage automatique avec Ollama")
-    print("=" * 60)
-    
-    # Vérifier Python
-    if sys.version_info < (3, 8):
-        print_error("Python 3.8+ requis")
-        sys.exit(1)
-    print_success(f"Python {sys.version.split()[0]} détecté")
-    
-    # Vérifier et créer .env avec configuration Ollama
-    check_env()
-    
-    # Configuration d'Ollama
-    ollama_success = setup_ollama()
-    
-    # Installer les dépendances backend
+def install_backend_dependencies():
+    """Installer les dépendances backend et spaCy"""
     print_step("Installation des dépendances backend")
-    if not run_command("pip install -r backend/requirements.txt")[0]:
+    if not run_command(f'"{sys.executable}" -m pip install -r backend/requirements.txt')[0]:
         print_error("Erreur lors de l'installation des dépendances backend")
-        sys.exit(1)
+        return False
     print_success("Dépendances backend installées")
     
     # Installer spaCy pour l'anonymisation PII
@@ -298,35 +354,100 @@ def main():
         print_success("spaCy déjà installé")
     except ImportError:
         print_info("Installation de spaCy pour l'anonymisation PII...")
-        if not run_command("pip install spacy>=3.7.0")[0]:
+        if not run_command(f'"{sys.executable}" -m pip install "spacy>=3.7.0"')[0]:
             print_error("Erreur lors de l'installation de spaCy")
             print_info("L'anonymisation PII ne sera pas disponible")
         else:
             print_success("spaCy installé pour l'anonymisation PII")
-    
-    # Installer les dépendances frontend
+    return True
+
+def install_frontend_dependencies():
+    """Installer les dépendances frontend"""
     print_step("Installation des dépendances frontend")
     if not run_command("npm install", cwd="frontend")[0]:
         print_error("Erreur lors de l'installation des dépendances frontend")
         print_info("Assurez-vous que Node.js est installé: https://nodejs.org/")
-        sys.exit(1)
+        return False
     print_success("Dépendances frontend installées")
+    return True
+
+def fast_setup(force=False):
+    """Préparer l'environnement en parallèle en ignorant les étapes déjà à jour"""
+    state = {} if force else load_state()
+    
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        ollama_future = pool.submit(setup_ollama)
+        backend_future = pool.submit(
+            cached_step, state, "backend_dependencies",
+            file_fingerprint("backend/requirements.txt"), install_backend_dependencies
+        )
+        frontend_future = pool.submit(
+            cached_step, state, "frontend_dependencies",
+            file_fingerprint("frontend/package-lock.json", "frontend/package.json"),
+            install_frontend_dependencies, artifact="frontend/node_modules"
+        )
+        backend_ok = backend_future.result()
+        frontend_ok = frontend_future.result()
+        ollama_success = ollama_future.result()
+    
+    if not backend_ok or not frontend_ok:
+        sys.exit(1)
+    return ollama_success
+
+def wait_for_first_exit(processes):
+    """Bloquer jusqu'à la fin du premier processus"""
+    finished = threading.Event()
+    for process in processes:
+        threading.Thread(target=lambda p=process: (p.wait(), finished.set()), daemon=True).start()
+    # Attente par tranches pour laisser passer Ctrl+C sous Windows
+    while not finished.wait(timeout=3600):
+        pass
+
+def main():
+    """Fonction principale simplifiée"""
+    fast = "--fast" in sys.argv or os.getenv("APOCALIPSSI_FAST_START", "").lower() in ("1", "true")
+    print("🚀 APOCALIPSSI - Démarrage automatique avec Ollama")
+    print("=" * 60)
+    started_at = time.perf_counter()
+    
+    # Vérifier Python
+    if sys.version_info < (3, 8):
+        print_error("Python 3.8+ requis")
+        sys.exit(1)
+    print_success(f"Python {sys.version.split()[0]} détecté")
+    
+    # Vérifier et créer .env avec configuration Ollama
+    check_env()
+    
+    if fast:
+        # Ollama, dépendances backend et frontend en parallèle
+        ollama_success = fast_setup(force="--force" in sys.argv)
+    else:
+        # Configuration d'Ollama
+        ollama_success = setup_ollama()
+        
+        # Installer les dépendances backend et frontend
+        if not install_backend_dependencies() or not install_frontend_dependencies():
+            sys.exit(1)
     
     # Démarrer le backend
     print_step("Démarrage du backend")
     backend_process = subprocess.Popen([sys.executable, "app.py"], cwd="backend")
-    print_success("Backend démarré sur http://localhost:5000")
     
-    # Attendre un peu
-    time.sleep(2)
-    
-    # Démarrer le frontend
+    # Démarrer le frontend sans attendre le backend
     print_step("Démarrage du frontend")
     frontend_process = subprocess.Popen("npm run dev", cwd="frontend", shell=True)
+    
+    if not wait_for_http(BACKEND_HEALTH_URL, timeout=60, label="le backend"):
+        print_error("Le backend n'a pas démarré: arrêt de l'application")
+        backend_process.terminate()
+        frontend_process.terminate()
+        sys.exit(1)
+    print_success("Backend démarré sur http://localhost:5000")
     print_success("Frontend démarré sur http://localhost:5173")
     
     print("\n" + "=" * 60)
-    print("🎉 Application APOCALIPSSI démarrée avec succès !")
+    print(f"🎉 Application APOCALIPSSI démarrée avec succès ! ({time.perf_counter() - started_at:.1f} s)")
     print("\n📱 Accès:")
     print("   Frontend: http://localhost:5173")
     print("   Backend:  http://localhost:5000")
@@ -342,8 +463,7 @@ def main():
     
     try:
         # Attendre que l'un des processus se termine
-        while backend_process.poll() is None and frontend_process.poll() is None:
-            time.sleep(1)
+        wait_for_first_exit([backend_process, frontend_process])
     except KeyboardInterrupt:
         print("\n🛑 Arrêt de l'application...")
         backend_process.terminate()